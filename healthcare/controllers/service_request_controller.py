@@ -47,7 +47,7 @@ class ServiceRequestController(Document):
 				self.db_set("status", "cancelled-Medication Request Status")
 
 	def set_patient_age(self):
-		patient = frappe.get_doc("Patient", self.patient)
+		patient = self.flags.patient or frappe.get_doc("Patient", self.patient)
 		self.patient_age_data = patient.get_age()
 		self.patient_age = dateutil.relativedelta.relativedelta(getdate(), getdate(patient.dob))
 
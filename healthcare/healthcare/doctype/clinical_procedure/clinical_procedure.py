@@ -11,6 +11,9 @@ from frappe.utils import flt, get_link_to_form, now_datetime, nowdate, nowtime
 from erpnext.stock.get_item_details import get_item_details
 from erpnext.stock.stock_ledger import get_previous_sle
 
+from healthcare.healthcare.doctype.healthcare_billable_item.healthcare_billable_item import (
+	update_billable_items,
+)
 from healthcare.healthcare.doctype.healthcare_settings.healthcare_settings import get_account
 from healthcare.healthcare.doctype.lab_test.lab_test import create_sample_doc
 from healthcare.healthcare.doctype.nursing_task.nursing_task import NursingTask
@@ -170,6 +173,8 @@ class ClinicalProcedure(Document):
 				)
 
 		self.db_set("status", "Completed")
+		# consumables invoiced separately become billable on completion
+		update_billable_items(self)
 
 		if self.service_request:
 			frappe.db.set_value(
@@ -7,7 +7,9 @@ import json
 
 import frappe
 from frappe.model.document import Document
-from frappe.utils import getdate
+from frappe.query_builder import Case
+from frappe.query_builder.functions import Coalesce
+from frappe.utils import getdate, now, today
 
 
 class FeeValidity(Document):
@@ -166,7 +168,9 @@ def get_fee_validity(appointment_name, date, ignore_status=False):
 	:return fee validity name and valid_till values of free visit appointments
 	"""
 	if appointment_name:
-		appointment_doc = frappe.get_doc("Patient Appointment", appointment_name)
+		appointment_doc = frappe.db.get_value(
+			"Patient Appointment", appointment_name, ["patient", "practitioner"], as_dict=True
+		)
 	fee_validity = frappe.qb.DocType("Fee Validity")
 	child = frappe.qb.DocType("Fee Validity Reference")
 
@@ -189,10 +193,25 @@ def get_fee_validity(appointment_name, date, ignore_status=False):
 
 
 def update_validity_status():
-	# update the status of fee validity daily
-	validities = frappe.db.get_all("Fee Validity", {"status": ["not in", ["Expired", "Cancelled"]]})
+	"""Update the status of the open fee validities daily, same rules as FeeValidity.update_status"""
+	fee_validity = frappe.qb.DocType("Fee Validity")
+	status = (
+		Case()
+		.when(fee_validity.valid_till < today(), "Expired")
+		.when(fee_validity.visited == fee_validity.max_visits, "Completed")
+		.else_("Active")
+	)
 
-	for fee_validity in validities:
-		fee_validity_doc = frappe.get_doc("Fee Validity", fee_validity.name)
-		fee_validity_doc.update_status()
-		fee_validity_doc.save()
+	(
+		frappe.qb.update(fee_validity)
+		.set(fee_validity.status, status)
+		.set(fee_validity.modified, now())
+		.where(Coalesce(fee_validity.status, "").notin(["Expired", "Cancelled"]))
+		.where(Coalesce(fee_validity.status, "") != status)
+	).run()
+
+
+def on_doctype_update():
+	frappe.db.add_index(
+		"Fee Validity", ["patient", "practitioner", "status", "valid_till", "start_date"]
+	)
@@ -9,6 +9,7 @@ from frappe.utils import add_days, nowdate
 
 from erpnext.accounts.doctype.pos_profile.test_pos_profile import make_pos_profile
 
+from healthcare.healthcare.doctype.fee_validity.fee_validity import update_validity_status
 from healthcare.healthcare.doctype.patient_appointment.test_patient_appointment import (
 	create_appointment,
 	create_healthcare_docs,
@@ -83,3 +84,44 @@ class TestFeeValidity(FrappeTestCase):
 		# For first appointment cancel should cancel fee validity
 		update_status(appointment.name, "Cancelled")
 		self.assertEqual(frappe.db.get_value("Fee Validity", fee_validity, "status"), "Cancelled")
+
+	def test_update_validity_status(self):
+		patient, practitioner = create_healthcare_docs()
+		validities = {}
+		for key, valid_till, visited, status in (
+			("expired", add_days(nowdate(), -1), 0, "Active"),
+			("completed", add_days(nowdate(), 3), 2, "Active"),
+			("reopened", add_days(nowdate(), 3), 1, "Completed"),
+			("active", add_days(nowdate(), 3), 0, "Active"),
+			("cancelled", add_days(nowdate(), -1), 0, "Cancelled"),
+		):
+			fee_validity = frappe.new_doc("Fee Validity")
+			fee_validity.patient = patient
+			fee_validity.practitioner = practitioner
+			fee_validity.max_visits = 2
+			fee_validity.start_date = add_days(nowdate(), -7)
+			fee_validity.valid_till = add_days(nowdate(), 3)
+			fee_validity.insert(ignore_permissions=True)
+			frappe.db.set_value(
+				"Fee Validity",
+				fee_validity.name,
+				{"valid_till": valid_till, "visited": visited, "status": status},
+				update_modified=False,
+			)
+			validities[key] = fee_validity.name
+
+		active_modified = frappe.db.get_value("Fee Validity", validities["active"], "modified")
+		update_validity_status()
+
+		def get_status(key):
+			return frappe.db.get_value("Fee Validity", validities[key], "status")
+
+		self.assertEqual(get_status("expired"), "Expired")
+		self.assertEqual(get_status("completed"), "Completed")
+		self.assertEqual(get_status("reopened"), "Active")
+		self.assertEqual(get_status("active"), "Active")
+		self.assertEqual(get_status("cancelled"), "Cancelled")
+		# unchanged rows are not written
+		self.assertEqual(
+			frappe.db.get_value("Fee Validity", validities["active"], "modified"), active_modified
+		)
@@ -3,9 +3,13 @@
 # For license information, please see license.txt
 
 
-# import frappe
+import frappe
 from frappe.model.document import Document
 
 
 class FeeValidityReference(Document):
 	pass
+
+
+def on_doctype_update():
+	frappe.db.add_index("Fee Validity Reference", ["appointment"])
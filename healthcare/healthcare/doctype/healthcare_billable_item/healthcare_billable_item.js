@@ -0,0 +1,8 @@
+// Copyright (c) 2026, earthians Health Informatics Pvt. Ltd. and contributors
+// For license information, please see license.txt
+
+// frappe.ui.form.on("Healthcare Billable Item", {
+// 	refresh(frm) {
+
+// 	},
+// });
@@ -0,0 +1,327 @@
+# Copyright (c) 2026, earthians Health Informatics Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import flt, now
+
+
+class HealthcareBillableItem(Document):
+	pass
+
+
+# unbilled services collector in healthcare.healthcare.utils of each source document type
+BILLABLE_SOURCES = {
+	"Patient Appointment": "get_appointments_to_invoice",
+	"Patient Encounter": "get_encounters_to_invoice",
+	"Lab Test": "get_lab_tests_to_invoice",
+	"Observation": "get_observations_to_invoice",
+	"Clinical Procedure": "get_clinical_procedures_to_invoice",
+	"Inpatient Record": "get_inpatient_services_to_invoice",
+	"Therapy Plan": "get_therapy_plans_to_invoice",
+	"Therapy Session": "get_therapy_sessions_to_invoice",
+	"Service Request": "get_service_requests_to_invoice",
+	"Package Subscription": "get_package_subscriptions_to_invoice",
+}
+
+# optional keys of the items returned by the collectors, the rate only when it is an amount of
+# the source document, consultation charges and income accounts are resolved at invoice time
+INVOICE_ITEM_FIELDS = ["service_name", "rate", "qty", "practitioner", "description"]
+
+BILLABLE_ITEM_FIELDS = [
+	"name",
+	"creation",
+	"modified",
+	"owner",
+	"modified_by",
+	"patient",
+	"company",
+	"inpatient_record",
+	"status",
+	"posting_date",
+	"reference_doctype",
+	"reference_name",
+	"source_doctype",
+	"source_name",
+	"service",
+	"service_name",
+	"practitioner",
+	"service_unit",
+	"qty",
+	"rate",
+	"description",
+]
+
+
+def update_billable_items(doc, method=None):
+	"""doc_events handler of the billable documents, keeps their pending ledger rows current"""
+	# documents created in a batch are synced together by their creator
+	if doc.doctype not in BILLABLE_SOURCES or doc.flags.defer_billable_items:
+		return
+
+	if method == "on_trash":
+		frappe.db.delete(
+			"Healthcare Billable Item",
+			{"source_doctype": doc.doctype, "source_name": doc.name, "status": "Pending"},
+		)
+		return
+
+	# synced once the change is committed, the ledger never holds up the document itself
+	frappe.enqueue(
+		"healthcare.healthcare.doctype.healthcare_billable_item.healthcare_billable_item.sync_billable_items",
+		queue="short",
+		enqueue_after_commit=True,
+		now=frappe.flags.in_test,
+		source_doctype=doc.doctype,
+		patient=doc.get("patient"),
+		company=doc.get("company"),
+		names=[doc.name],
+	)
+
+
+def sync_billable_items(source_doctype, patient, company, names=None, lookups=None):
+	"""
+	Replace the pending ledger rows of `source_doctype` documents with the services
+	their unbilled services collector finds now. Collectors read without user permissions
+	so the shared ledger does not depend on the user whose change triggered the sync, and
+	leave out the services whose billing is not configured instead of raising
+	:param names: Sync only these documents, all documents of `patient` in `company` if not set
+	"""
+	from healthcare.healthcare import utils
+
+	filters = {"source_doctype": source_doctype, "status": "Pending"}
+	if names:
+		filters["source_name"] = ("in", names)
+	else:
+		filters.update({"patient": patient, "company": company})
+	frappe.db.delete("Healthcare Billable Item", filters)
+
+	if not (patient and company):
+		return
+
+	collector = getattr(utils, BILLABLE_SOURCES[source_doctype])
+	items = collector(
+		frappe._dict(name=patient), company, lookups or utils.BillingLookups(), names=names
+	)
+	insert_billable_items(source_doctype, patient, company, items)
+
+
+def insert_billable_items(source_doctype, patient, company, items):
+	if not items:
+		return
+
+	sources = get_item_sources(source_doctype, items)
+	timestamp, user = now(), frappe.session.user
+	values = []
+	for item in items:
+		source_name, inpatient_record, service_unit = sources.get(
+			(item["reference_type"], item["reference_name"]), (item["reference_name"], None, None)
+		)
+		values.append(
+			(
+				frappe.generate_hash(length=10),
+				timestamp,
+				timestamp,
+				user,
+				user,
+				patient,
+				company,
+				inpatient_record,
+				"Pending",
+				item.get("date"),
+				item["reference_type"],
+				item["reference_name"],
+				source_doctype,
+				source_name,
+				item.get("service"),
+				item.get("service_name"),
+				item.get("practitioner"),
+				service_unit,
+				flt(item.get("qty")),
+				flt(item.get("rate")),
+				item.get("description"),
+			)
+		)
+
+	frappe.db.bulk_insert("Healthcare Billable Item", BILLABLE_ITEM_FIELDS, values)
+
+
+def get_item_sources(source_doctype, items):
+	"""
+	Return (source name, inpatient record, service unit) of each item, keyed by its reference.
+	Child rows (occupancies, package items) belong to their parent document.
+	"""
+	references = {}
+	for item in items:
+		references.setdefault(item["reference_type"], set()).add(item["reference_name"])
+
+	sources = {}
+	for reference_type, reference_names in references.items():
+		meta = frappe.get_meta(reference_type)
+		fields = ["name", "parent"] if meta.istable else ["name"]
+		fields += [
+			fieldname for fieldname in ("inpatient_record", "service_unit") if meta.has_field(fieldname)
+		]
+		for row in frappe.get_all(
+			reference_type, filters={"name": ("in", list(reference_names))}, fields=fields
+		):
+			source_name = row.get("parent") or row.name
+			inpatient_record = row.get("inpatient_record")
+			if source_doctype == "Inpatient Record":
+				inpatient_record = source_name
+			sources[(reference_type, row.name)] = (source_name, inpatient_record, row.get("service_unit"))
+
+	return sources
+
+
+def set_billable_item_status(
+	reference_doctype, reference_name, invoiced, sales_invoice=None, service=None
+):
+	"""
+	Mark the pending ledger rows of a reference as invoiced by `sales_invoice`, or when the
+	invoice is cancelled drop its rows and rebuild the pending rows of their sources
+	:param service: Item code or filter to tell apart several services of one reference
+	"""
+	filters = {"reference_doctype": reference_doctype, "reference_name": reference_name}
+	if service:
+		filters["service"] = service
+
+	if invoiced:
+		filters["status"] = "Pending"
+		frappe.db.set_value(
+			"Healthcare Billable Item",
+			filters,
+			{"status": "Invoiced", "sales_invoice": sales_invoice},
+			update_modified=False,
+		)
+		return
+
+	filters["status"] = "Invoiced"
+	if sales_invoice:
+		filters["sales_invoice"] = sales_invoice
+	rows = frappe.get_all(
+		"Healthcare Billable Item",
+		filters=filters,
+		fields=["name", "source_doctype", "source_name", "patient", "company"],
+	)
+	if not rows:
+		return
+
+	frappe.db.delete("Healthcare Billable Item", {"name": ("in", [row.name for row in rows])})
+	# the source may have changed while it was invoiced
+	for row in {(row.source_doctype, row.source_name): row for row in rows}.values():
+		source = frappe.db.get_value(
+			row.source_doctype, row.source_name, ["patient", "company"], as_dict=True
+		)
+		if source:
+			sync_billable_items(
+				row.source_doctype, source.patient, source.company, names=[row.source_name]
+			)
+
+
+def get_pending_billable_items(**filters):
+	"""Return the pending ledger rows matching `filters`, newest first"""
+	filters["status"] = "Pending"
+	return frappe.get_all(
+		"Healthcare Billable Item",
+		filters=filters,
+		fields=[
+			"reference_doctype",
+			"reference_name",
+			"inpatient_record",
+			"service",
+			"service_unit",
+			"posting_date",
+			*INVOICE_ITEM_FIELDS,
+		],
+		order_by="posting_date desc, creation desc",
+	)
+
+
+def get_billable_items_to_invoice(patient, company):
+	"""Return the pending services of `patient` shaped like the items of the unbilled services collectors"""
+	from healthcare.healthcare.utils import set_consultation_charges
+
+	frappe.has_permission("Patient", doc=patient, throw=True)
+
+	# the ledger is shared by all users, services are only listed if their source is readable
+	readable = {}
+	items_to_invoice = []
+	for row in get_pending_billable_items(patient=patient, company=company):
+		if row.reference_doctype not in readable:
+			readable[row.reference_doctype] = frappe.has_permission(row.reference_doctype, "read")
+		if readable[row.reference_doctype]:
+			items_to_invoice.append(get_invoice_item(row))
+
+	set_consultation_charges(items_to_invoice)
+	return items_to_invoice
+
+
+def get_invoice_item(row):
+	item = {
+		"reference_type": row.reference_doctype,
+		"reference_name": row.reference_name,
+		"service": row.service,
+	}
+	for fieldname in INVOICE_ITEM_FIELDS:
+		if row.get(fieldname):
+			item[fieldname] = row.get(fieldname)
+	if row.posting_date:
+		item["date"] = row.posting_date
+	return item
+
+
+@frappe.whitelist()
+def get_outstanding_services(patient, company=None):
+	"""Return count and amount of the pending services of `patient` per reference type, services
+	without a rate are billed at price list rate and only counted"""
+	from healthcare.healthcare.utils import set_consultation_charges
+
+	frappe.has_permission("Healthcare Billable Item", throw=True)
+
+	filters = {"patient": patient}
+	if company:
+		filters["company"] = company
+	items = [get_invoice_item(row) for row in get_pending_billable_items(**filters)]
+	set_consultation_charges(items)
+
+	services = {}
+	for item in items:
+		service = services.setdefault(
+			item["reference_type"],
+			frappe._dict(reference_doctype=item["reference_type"], count=0, amount=0),
+		)
+		service.count += 1
+		service.amount += flt(item.get("rate")) * (flt(item.get("qty")) or 1)
+
+	return list(services.values())
+
+
+@frappe.whitelist()
+def rebuild_billable_items(patient=None):
+	"""
+	Rebuild the pending ledger rows from the billable documents (backfill), e.g.
+	bench execute healthcare.healthcare.doctype.healthcare_billable_item.healthcare_billable_item.rebuild_billable_items
+	Services left out for a missing billing configuration are added by a rebuild once it is set
+	:param patient: Rebuild only for this patient, all patients if not set
+	"""
+	from healthcare.healthcare.utils import BillingLookups
+
+	frappe.only_for(["System Manager", "Healthcare Administrator"])
+
+	lookups = BillingLookups()
+	for source_doctype in BILLABLE_SOURCES:
+		for source in frappe.get_all(
+			source_doctype,
+			filters={"patient": patient} if patient else {},
+			fields=["patient", "company"],
+			distinct=True,
+		):
+			sync_billable_items(source_doctype, source.patient, source.company, lookups=lookups)
+
+
+def on_doctype_update():
+	frappe.db.add_index("Healthcare Billable Item", ["patient", "status", "company"])
+	frappe.db.add_index("Healthcare Billable Item", ["inpatient_record", "status"])
+	frappe.db.add_index("Healthcare Billable Item", ["reference_doctype", "reference_name"])
+	frappe.db.add_index("Healthcare Billable Item", ["source_doctype", "source_name"])
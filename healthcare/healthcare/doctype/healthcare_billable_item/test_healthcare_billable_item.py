@@ -0,0 +1,100 @@
+# Copyright (c) 2026, earthians Health Informatics Pvt. Ltd. and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import nowdate
+
+from healthcare.healthcare.doctype.healthcare_billable_item.healthcare_billable_item import (
+	sync_billable_items,
+)
+from healthcare.healthcare.doctype.patient_appointment.test_patient_appointment import (
+	create_healthcare_docs,
+	create_healthcare_service_items,
+)
+from healthcare.healthcare.utils import get_healthcare_services_to_invoice, set_invoiced
+
+
+class TestHealthcareBillableItem(FrappeTestCase):
+	def setUp(self):
+		item = create_healthcare_service_items()
+		frappe.db.set_single_value("Healthcare Settings", "op_consulting_charge_item", item)
+		frappe.db.set_single_value("Healthcare Settings", "do_not_bill_inpatient_encounters", 0)
+
+	def test_billable_item_follows_encounter_and_invoice(self):
+		patient, practitioner = create_healthcare_docs(id=31)
+		encounter = frappe.new_doc("Patient Encounter")
+		encounter.patient = patient
+		encounter.practitioner = practitioner
+		encounter.company = "_Test Company"
+		encounter.encounter_date = nowdate()
+		encounter.save()
+		self.assertFalse(get_encounter_items(patient, encounter.name))
+
+		encounter.submit()
+		items = get_encounter_items(patient, encounter.name)
+		self.assertEqual(len(items), 1)
+		self.assertEqual(items[0]["rate"], 500)
+
+		invoice_item = frappe._dict(
+			reference_dt="Patient Encounter",
+			reference_dn=encounter.name,
+			item_code=items[0]["service"],
+			qty=1,
+		)
+		set_invoiced(invoice_item, "on_submit", "_Test Invoice")
+		self.assertFalse(get_encounter_items(patient, encounter.name))
+		self.assertEqual(
+			frappe.db.get_value(
+				"Healthcare Billable Item", {"reference_name": encounter.name}, "sales_invoice"
+			),
+			"_Test Invoice",
+		)
+
+		set_invoiced(invoice_item, "on_cancel", "_Test Invoice")
+		self.assertEqual(len(get_encounter_items(patient, encounter.name)), 1)
+
+		# a sync triggered by a user who cannot read the encounter keeps its pending service
+		frappe.set_user("Guest")
+		sync_billable_items("Patient Encounter", patient, "_Test Company", names=[encounter.name])
+		frappe.set_user("Administrator")
+		self.assertEqual(len(get_encounter_items(patient, encounter.name)), 1)
+
+		encounter.reload()
+		encounter.cancel()
+		self.assertFalse(frappe.db.exists("Healthcare Billable Item", {"reference_name": encounter.name}))
+
+	def test_billable_item_charge_follows_billing_configuration(self):
+		patient, practitioner = create_healthcare_docs(id=32)
+		frappe.db.set_value("Healthcare Practitioner", practitioner, "op_consulting_charge", 500)
+		encounter = create_encounter(patient, practitioner)
+
+		# the charge is read at invoice time, not when the encounter was submitted
+		frappe.db.set_value("Healthcare Practitioner", practitioner, "op_consulting_charge", 700)
+		items = get_encounter_items(patient, encounter)
+		self.assertEqual(items[0]["rate"], 700)
+		self.assertTrue(items[0]["income_account"])
+
+		# a missing charge leaves the service out instead of blocking the encounter
+		frappe.db.set_value("Healthcare Practitioner", practitioner, "op_consulting_charge", 0)
+		unconfigured = create_encounter(patient, practitioner)
+		self.assertFalse(get_encounter_items(patient, unconfigured))
+		self.assertNotIn("rate", get_encounter_items(patient, encounter)[0])
+
+
+def create_encounter(patient, practitioner):
+	encounter = frappe.new_doc("Patient Encounter")
+	encounter.patient = patient
+	encounter.practitioner = practitioner
+	encounter.company = "_Test Company"
+	encounter.encounter_date = nowdate()
+	encounter.submit()
+	return encounter.name
+
+
+def get_encounter_items(patient, encounter):
+	return [
+		item
+		for item in get_healthcare_services_to_invoice(patient, None, "_Test Company")
+		if item["reference_name"] == encounter
+	]
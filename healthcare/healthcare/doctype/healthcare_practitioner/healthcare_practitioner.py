@@ -15,6 +15,10 @@ from frappe.utils import get_link_to_form
 import re
 from erpnext.accounts.party import validate_party_accounts
 
+from healthcare.healthcare.doctype.practitioner_slot_availability.practitioner_slot_availability import (
+    clear_slot_index,
+)
+
 
 class HealthcarePractitioner(Document):
     def onload(self):
@@ -74,6 +78,9 @@ class HealthcarePractitioner(Document):
         if self.user_id:
             frappe.permissions.add_user_permission("Healthcare Practitioner", self.name, self.user_id)
 
+        # schedules may have changed, indexed slots are rebuilt on next access
+        clear_slot_index(practitioner=self.name)
+
     def set_full_name(self):
         if self.last_name:
             self.practitioner_name = " ".join(filter(None, [self.first_name, self.last_name]))
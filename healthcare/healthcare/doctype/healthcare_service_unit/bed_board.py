@@ -0,0 +1,131 @@
+# Copyright (c) 2026, earthians Health Informatics Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+import pickle
+
+import frappe
+from frappe.utils.nestedset import get_ancestors_of
+
+BED_BOARD_CACHE_KEY = "healthcare_bed_board"
+BED_BOARD_EVENT = "bed_board_update"
+# field of the board hash written with the beds, a board without it is not fully loaded
+BED_BOARD_LOADED = "__loaded__"
+
+
+@frappe.whitelist()
+def get_bed_board(company, ward=None):
+	"""
+	Return the inpatient beds of `company`, or of `ward`, as {service_unit: bed}
+	The board is loaded once from Inpatient Occupancy and then kept current by `set_bed_status`
+	"""
+	frappe.has_permission("Inpatient Record", throw=True)
+	frappe.has_permission("Company", doc=company, throw=True)
+
+	cache_name = get_bed_board_cache_name(company)
+	beds = frappe.cache().hgetall(cache_name)
+	if not beds.pop(BED_BOARD_LOADED, None):
+		beds = load_bed_board(company)
+		cache_bed_board(cache_name, beds)
+
+	if ward:
+		return {service_unit: bed for service_unit, bed in beds.items() if bed.ward == ward}
+	return beds
+
+
+def cache_bed_board(cache_name, beds):
+	"""Write all the beds with the loaded marker in one transaction, readers never see part of it"""
+	cache = frappe.cache()
+	mapping = {service_unit: pickle.dumps(bed) for service_unit, bed in beds.items()}
+	mapping[BED_BOARD_LOADED] = pickle.dumps(True)
+	with cache.pipeline() as pipe:
+		pipe.hset(cache.make_key(cache_name), mapping=mapping)
+		pipe.execute()
+
+
+def load_bed_board(company):
+	unit = frappe.qb.DocType("Healthcare Service Unit")
+	occupancy = frappe.qb.DocType("Inpatient Occupancy")
+	inpatient_record = frappe.qb.DocType("Inpatient Record")
+	rows = (
+		frappe.qb.from_(unit)
+		.left_join(occupancy)
+		.on(
+			(occupancy.service_unit == unit.name)
+			& (occupancy.parenttype == "Inpatient Record")
+			& (occupancy.left == 0)
+		)
+		.left_join(inpatient_record)
+		.on(inpatient_record.name == occupancy.parent)
+		.select(
+			unit.name.as_("service_unit"),
+			unit.parent_healthcare_service_unit.as_("ward"),
+			unit.occupancy_status.as_("status"),
+			inpatient_record.patient,
+			inpatient_record.name.as_("inpatient_record"),
+			occupancy.check_in,
+		)
+		.where(unit.company == company)
+		.where(unit.is_group == 0)
+		.where(unit.inpatient_occupancy == 1)
+	).run(as_dict=True)
+
+	return {row.service_unit: row for row in rows}
+
+
+def set_bed_status(service_unit, status, inpatient_record=None, check_in=None):
+	"""Set the occupancy of `service_unit` and, once committed, push it to the bed boards"""
+	previous_status = frappe.db.get_value("Healthcare Service Unit", service_unit, "occupancy_status")
+	frappe.db.set_value("Healthcare Service Unit", service_unit, "occupancy_status", status)
+
+	company, ward = frappe.get_cached_value(
+		"Healthcare Service Unit", service_unit, ["company", "parent_healthcare_service_unit"]
+	)
+	occupied = status == "Occupied" and inpatient_record
+	bed = frappe._dict(
+		service_unit=service_unit,
+		ward=ward,
+		status=status,
+		patient=inpatient_record.patient if occupied else None,
+		inpatient_record=inpatient_record.name if occupied else None,
+		check_in=check_in if occupied else None,
+	)
+	# the groups holding the bed let displays update their occupancy rollups
+	groups = []
+	if previous_status != status:
+		groups = get_ancestors_of("Healthcare Service Unit", service_unit)
+	frappe.db.after_commit.add(
+		lambda: update_bed_board(company, bed, previous_status=previous_status, groups=groups)
+	)
+
+
+def update_bed_board(company, bed, previous_status=None, groups=None):
+	"""Apply a bed change to the cached board of `company` and publish it as a delta"""
+	cache_name = get_bed_board_cache_name(company)
+	# a board that is not loaded yet will read the change from the database
+	if frappe.cache().exists(cache_name):
+		frappe.cache().hset(cache_name, bed.service_unit, bed)
+
+	# only the status is pushed, patient details are read through get_bed_board
+	frappe.publish_realtime(
+		BED_BOARD_EVENT,
+		{
+			"company": company,
+			"ward": bed.ward,
+			"service_unit": bed.service_unit,
+			"status": bed.status,
+			"previous_status": previous_status,
+			"groups": groups or [],
+		},
+		doctype="Healthcare Service Unit",
+	)
+
+
+def get_bed_board_cache_name(company):
+	return f"{BED_BOARD_CACHE_KEY}:{company}"
+
+
+def clear_bed_board(company=None):
+	if company:
+		frappe.cache().delete_value(get_bed_board_cache_name(company))
+	else:
+		frappe.cache().delete_keys(BED_BOARD_CACHE_KEY)
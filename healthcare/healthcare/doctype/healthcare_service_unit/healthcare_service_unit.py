@@ -11,6 +11,11 @@ from frappe.contacts.address_and_contact import load_address_and_contact
 from frappe.utils import cint, cstr
 from frappe.utils.nestedset import NestedSet
 
+from healthcare.healthcare.doctype.healthcare_service_unit.bed_board import clear_bed_board
+from healthcare.healthcare.doctype.practitioner_slot_availability.practitioner_slot_availability import (
+	clear_slot_index,
+)
+
 
 class HealthcareServiceUnit(NestedSet):
 	nsm_parent_field = "parent_healthcare_service_unit"
@@ -33,12 +38,20 @@ class HealthcareServiceUnit(NestedSet):
 	def on_update(self):
 		super(HealthcareServiceUnit, self).on_update()
 		self.validate_one_root()
+		if self.has_value_changed("overlap_appointments") or self.has_value_changed(
+			"service_unit_capacity"
+		):
+			clear_slot_index(service_unit=self.name)
+		if self.inpatient_occupancy or self.has_value_changed("inpatient_occupancy"):
+			clear_bed_board(self.company)
 
 	def on_trash(self):
 		if self.flags.on_trash_company:
 			NestedSet.on_trash(self, allow_root_deletion=True)
 		else:
 			NestedSet.on_trash(self)
+		if self.inpatient_occupancy:
+			clear_bed_board(self.company)
 
 	def set_service_unit_properties(self):
 		if cint(self.is_group):
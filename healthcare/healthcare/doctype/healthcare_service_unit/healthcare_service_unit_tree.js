@@ -76,6 +76,7 @@ frappe.treeview_settings['Healthcare Service Unit'] = {
 				if (node.data.occupancy_status == 'Occupied') {
 					$("<span class='occupancy-status-area pull-right text-muted'>"
 						+ ' ' + node.data.occupancy_status
+						+ (node.data.patient ? ' (' + node.data.patient + ')' : '')
 						+ '</span>').insertBefore(node.$ul);
 				}
 				if (node.data.occupancy_status == 'Vacant') {
@@ -89,6 +90,31 @@ frappe.treeview_settings['Healthcare Service Unit'] = {
 	post_render: function (treeview) {
 		frappe.treeview_settings['Healthcare Service Unit'].treeview = {};
 		$.extend(frappe.treeview_settings['Healthcare Service Unit'].treeview, treeview);
+
+		// bed changes are pushed as they are committed, update the rendered bed in place
+		frappe.realtime.doctype_subscribe('Healthcare Service Unit');
+		frappe.realtime.off('bed_board_update');
+		frappe.realtime.on('bed_board_update', (bed) => {
+			let node = treeview.tree.nodes[bed.service_unit];
+			if (node && node.data) {
+				// patient details are not pushed, they are shown again on the next load of the ward
+				node.data.occupancy_status = bed.status;
+				node.data.patient = null;
+				node.$ul.siblings('.occupancy-status-area').text(' ' + bed.status);
+			}
+
+			let change = (bed.status == 'Occupied') - (bed.previous_status == 'Occupied');
+			if (!change) return;
+			(bed.groups || []).forEach((group) => {
+				let group_node = treeview.tree.nodes[group];
+				if (!group_node || !group_node.data || !group_node.data.available) return;
+				group_node.data.occupied += change;
+				group_node.data.occupied_of_available = group_node.data.occupied
+					+ ' Occupied of ' + group_node.data.available;
+				group_node.$ul.siblings('.occupancy-status-area')
+					.text(' ' + group_node.data.occupied_of_available);
+			});
+		});
 	},
 	toolbar: [
 		{
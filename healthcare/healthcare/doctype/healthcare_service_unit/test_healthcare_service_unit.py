@@ -22,3 +22,58 @@ class TestHealthcareServiceUnit(FrappeTestCase):
 		filters = {"company": company.name, "parent_healthcare_service_unit": None}
 		root_service_unit = frappe.db.exists("Healthcare Service Unit", filters)
 		self.assertTrue(root_service_unit)
+
+	def test_group_occupancy_rollup(self):
+		from healthcare.healthcare.doctype.inpatient_record.test_inpatient_record import (
+			get_service_unit_type,
+		)
+		from healthcare.healthcare.utils import get_children
+
+		unit_type = get_service_unit_type()
+		root = frappe.db.get_value(
+			"Healthcare Service Unit",
+			{"company": "_Test Company", "parent_healthcare_service_unit": ["is", "not set"]},
+		)
+		hospital = create_service_unit("_Test Rollup Hospital", root, is_group=1)
+		wards = [create_service_unit(f"_Test Rollup Ward {i}", hospital, is_group=1) for i in range(3)]
+		for i, ward in enumerate(wards):
+			for bed in range(4):
+				create_service_unit(
+					f"_Test Rollup Bed {i}-{bed}",
+					ward,
+					service_unit_type=unit_type,
+					occupancy_status="Occupied" if bed < i else "Vacant",
+				)
+		# beds of a nested group roll up into every ancestor
+		room = create_service_unit("_Test Rollup Room", wards[0], is_group=1)
+		create_service_unit("_Test Rollup Bed Room", room, service_unit_type=unit_type)
+
+		# the occupancy of all the groups is rolled up in a single query
+		with self.assertQueryCount(3):
+			nodes = get_children("Healthcare Service Unit", parent=hospital)
+
+		occupancy = {node["value"]: node.get("occupied_of_available") for node in nodes}
+		self.assertEqual(occupancy[wards[0]], "0 Occupied of 5")
+		self.assertEqual(occupancy[wards[1]], "1 Occupied of 4")
+		self.assertEqual(occupancy[wards[2]], "2 Occupied of 4")
+
+
+def create_service_unit(
+	name, parent=None, is_group=0, service_unit_type=None, occupancy_status="Vacant"
+):
+	service_unit = frappe.db.exists("Healthcare Service Unit", {"healthcare_service_unit_name": name})
+	if service_unit:
+		return service_unit
+
+	service_unit = frappe.new_doc("Healthcare Service Unit")
+	service_unit.healthcare_service_unit_name = name
+	service_unit.company = "_Test Company"
+	service_unit.parent_healthcare_service_unit = parent
+	service_unit.is_group = is_group
+	if service_unit_type:
+		service_unit.service_unit_type = service_unit_type
+	service_unit.save(ignore_permissions=True)
+	if service_unit_type:
+		# validate resets the occupancy of a new bed to Vacant
+		service_unit.db_set("occupancy_status", occupancy_status)
+	return service_unit.name
@@ -7,9 +7,8 @@ import datetime
 import frappe
 from frappe import _
 from frappe.model.document import Document
-from frappe.utils import flt, get_link_to_form, get_time, getdate
-
-from erpnext.stock.utils import get_latest_stock_qty
+from frappe.query_builder.functions import Sum
+from frappe.utils import flt, get_link_to_form, get_time, getdate, now
 
 from healthcare.healthcare.doctype.healthcare_settings.healthcare_settings import get_account
 
@@ -65,10 +64,17 @@ class InpatientMedicationEntry(Document):
 		frappe.msgprint(success_msg, title=_("Success"), indicator="green")
 
 	def validate_medication_orders(self):
-		for entry in self.medication_orders:
-			docstatus, is_completed = frappe.db.get_value(
-				"Inpatient Medication Order Entry", entry.against_imoe, ["docstatus", "is_completed"]
+		order_entries = {
+			order_entry.name: order_entry
+			for order_entry in frappe.get_all(
+				"Inpatient Medication Order Entry",
+				filters={"name": ("in", [entry.against_imoe for entry in self.medication_orders])},
+				fields=["name", "docstatus", "is_completed"],
 			)
+		}
+		for entry in self.medication_orders:
+			order_entry = order_entries.get(entry.against_imoe) or frappe._dict()
+			docstatus, is_completed = order_entry.docstatus, order_entry.is_completed
 
 			if docstatus == 2:
 				frappe.throw(
@@ -109,19 +115,30 @@ class InpatientMedicationEntry(Document):
 			{"orders": orders, "is_completed": is_completed},
 		)
 
-		# update status and completed orders count
-		for order, count in order_entry_map.items():
-			medication_order = frappe.get_doc("Inpatient Medication Order", order)
-			completed_orders = flt(count)
-			current_value = frappe.db.get_value("Inpatient Medication Order", order, "completed_orders")
-
-			if on_cancel:
-				completed_orders = flt(current_value) - flt(count)
-			else:
-				completed_orders = flt(current_value) + flt(count)
-
-			medication_order.db_set("completed_orders", completed_orders)
-			medication_order.set_status()
+		# update completed orders count and status of all orders at once, same rules as
+		# InpatientMedicationOrder.set_status
+		frappe.db.sql(
+			"""
+			UPDATE `tabInpatient Medication Order` imo
+			INNER JOIN (
+				SELECT parent, SUM(is_completed) AS completed_orders
+				FROM `tabInpatient Medication Order Entry`
+				WHERE parent IN %(medication_orders)s
+				GROUP BY parent
+			) entry ON entry.parent = imo.name
+			SET
+				imo.completed_orders = entry.completed_orders,
+				imo.status = CASE
+					WHEN imo.docstatus = 0 THEN 'Draft'
+					WHEN imo.docstatus = 2 THEN 'Cancelled'
+					WHEN entry.completed_orders = 0 THEN 'Pending'
+					WHEN entry.completed_orders < imo.total_orders THEN 'In Process'
+					ELSE 'Completed'
+				END,
+				imo.modified = %(modified)s
+		""",
+			{"medication_orders": list(order_entry_map), "modified": now()},
+		)
 
 	def get_order_entry_map(self):
 		# for marking order completion status
@@ -309,15 +326,46 @@ def get_drug_shortage_map(medication_orders, warehouse):
 			drug_requirement[d.drug_code] = 0
 		drug_requirement[d.drug_code] += flt(d.dosage)
 
+	stock_qty_map = get_stock_qty_map(list(drug_requirement), warehouse)
 	drug_shortage = dict()
 	for drug, required_qty in drug_requirement.items():
-		available_qty = get_latest_stock_qty(drug, warehouse) or 0
+		available_qty = stock_qty_map.get(drug) or 0
 		if flt(required_qty) > flt(available_qty):
 			drug_shortage[drug] = flt(flt(required_qty) - flt(available_qty))
 
 	return drug_shortage
 
 
+def get_stock_qty_map(items, warehouse=None):
+	"""
+	Returns a dict like { item_code: actual_qty } with the stock of `items` in `warehouse`,
+	including its child warehouses if it is a group, as get_latest_stock_qty does per item
+	"""
+	if not items:
+		return {}
+
+	stock_bin = frappe.qb.DocType("Bin")
+	query = (
+		frappe.qb.from_(stock_bin)
+		.select(stock_bin.item_code, Sum(stock_bin.actual_qty))
+		.where(stock_bin.item_code.isin(items))
+		.groupby(stock_bin.item_code)
+	)
+	if warehouse:
+		lft, rgt, is_group = frappe.db.get_value("Warehouse", warehouse, ["lft", "rgt", "is_group"])
+		if is_group:
+			wh = frappe.qb.DocType("Warehouse")
+			query = (
+				query.inner_join(wh)
+				.on(wh.name == stock_bin.warehouse)
+				.where((wh.lft >= lft) & (wh.rgt <= rgt))
+			)
+		else:
+			query = query.where(stock_bin.warehouse == warehouse)
+
+	return frappe._dict(query.run())
+
+
 @frappe.whitelist()
 def make_difference_stock_entry(docname):
 	doc = frappe.get_doc("Inpatient Medication Entry", docname)
@@ -92,6 +92,13 @@ class TestInpatientMedicationEntry(FrappeTestCase):
 		)
 		self.assertEqual(is_order_completed, 1)
 
+		# test order counters
+		completed_orders, total_orders, status = frappe.db.get_value(
+			"Inpatient Medication Order", ipmo.name, ["completed_orders", "total_orders", "status"]
+		)
+		self.assertEqual(completed_orders, len(ipme.medication_orders))
+		self.assertEqual(status, "In Process" if completed_orders < total_orders else "Completed")
+
 		# test stock entry
 		stock_entry = frappe.db.exists("Stock Entry", {"inpatient_medication_entry": ipme.name})
 		self.assertTrue(stock_entry)
@@ -103,6 +110,12 @@ class TestInpatientMedicationEntry(FrappeTestCase):
 			stock_entry.items[0].inpatient_medication_entry_child, ipme.medication_orders[0].name
 		)
 
+		ipme.cancel()
+		self.assertEqual(
+			frappe.db.get_value("Inpatient Medication Order", ipmo.name, ["completed_orders", "status"]),
+			(0, "Pending"),
+		)
+
 	def test_drug_shortage_stock_entry(self):
 		ipmo = create_ipmo(self.patient)
 		ipmo.submit()
@@ -11,6 +11,10 @@ from frappe.desk.reportview import get_match_cond
 from frappe.model.document import Document
 from frappe.utils import get_datetime, get_link_to_form, getdate, now_datetime, today
 
+from healthcare.healthcare.doctype.healthcare_billable_item.healthcare_billable_item import (
+	get_pending_billable_items,
+)
+from healthcare.healthcare.doctype.healthcare_service_unit.bed_board import set_bed_status
 from healthcare.healthcare.doctype.nursing_task.nursing_task import NursingTask
 from healthcare.healthcare.utils import validate_nursing_tasks
 
@@ -268,9 +272,7 @@ def check_out_inpatient(inpatient_record):
 			if inpatient_occupancy.left != 1:
 				inpatient_occupancy.left = True
 				inpatient_occupancy.check_out = now_datetime()
-				frappe.db.set_value(
-					"Healthcare Service Unit", inpatient_occupancy.service_unit, "occupancy_status", "Vacant"
-				)
+				set_bed_status(inpatient_occupancy.service_unit, "Vacant")
 
 
 def discharge_patient(inpatient_record):
@@ -322,87 +324,32 @@ def validate_inpatient_invoicing(inpatient_record):
 
 def get_pending_invoices(inpatient_record):
 	pending_invoices = {}
-	if inpatient_record.inpatient_occupancies:
-		service_unit_names = False
-		for inpatient_occupancy in inpatient_record.inpatient_occupancies:
-			if not inpatient_occupancy.invoiced:
-				if is_service_unit_billable(inpatient_occupancy.service_unit):
-					if service_unit_names:
-						service_unit_names += ", " + inpatient_occupancy.service_unit
-					else:
-						service_unit_names = inpatient_occupancy.service_unit
-		if service_unit_names:
-			pending_invoices["Inpatient Occupancy"] = service_unit_names
-
-	docs = ["Patient Appointment", "Patient Encounter", "Lab Test", "Clinical Procedure"]
+	docs = [
+		"Inpatient Occupancy",
+		"Patient Appointment",
+		"Patient Encounter",
+		"Lab Test",
+		"Clinical Procedure",
+	]
+	billable_items = get_pending_billable_items(
+		inpatient_record=inpatient_record.name, reference_doctype=("in", docs)
+	)
 
 	for doc in docs:
-		doc_name_list = get_unbilled_inpatient_docs(doc, inpatient_record)
-		if doc_name_list:
-			pending_invoices = get_pending_doc(doc, doc_name_list, pending_invoices)
-
-	return pending_invoices
-
-
-def get_pending_doc(doc, doc_name_list, pending_invoices):
-	if doc_name_list:
-		doc_ids = False
-		for doc_name in doc_name_list:
-			doc_link = get_link_to_form(doc, doc_name.name)
-			if doc_ids:
-				doc_ids += ", " + doc_link
+		pending = []
+		for item in billable_items:
+			if item.reference_doctype != doc:
+				continue
+			if doc == "Inpatient Occupancy":
+				pending.append(item.service_unit)
 			else:
-				doc_ids = doc_link
-		if doc_ids:
-			pending_invoices[doc] = doc_ids
+				pending.append(get_link_to_form(doc, item.reference_name))
+		if pending:
+			pending_invoices[doc] = ", ".join(pending)
 
 	return pending_invoices
 
 
-def get_unbilled_inpatient_docs(doc, inpatient_record):
-	filters = {
-		"patient": inpatient_record.patient,
-		"inpatient_record": inpatient_record.name,
-		"docstatus": 1,
-	}
-	if doc in ["Service Request", "Medication Request"]:
-		filters.update(
-			{
-				"billing_status": "Pending",
-			}
-		)
-	else:
-		if doc == "Patient Encounter":
-			filters.update(
-				{
-					"appointment": "",
-				}
-			)
-		else:
-			del filters["docstatus"]
-		filters.update(
-			{
-				"invoiced": 0,
-			}
-		)
-	if doc in ["Lab Test", "Clinical Procedure"]:
-		filters.update(
-			{
-				"service_request": "",
-			}
-		)
-
-	return frappe.db.get_list(
-		doc,
-		filters={
-			"patient": inpatient_record.patient,
-			"inpatient_record": inpatient_record.name,
-			"docstatus": 1,
-			"invoiced": 0,
-		},
-	)
-
-
 def admit_patient(inpatient_record, service_unit, check_in, expected_discharge=None):
 	validate_nursing_tasks(inpatient_record)
 
@@ -427,7 +374,7 @@ def transfer_patient(inpatient_record, service_unit, check_in):
 
 	inpatient_record.save(ignore_permissions=True)
 
-	frappe.db.set_value("Healthcare Service Unit", service_unit, "occupancy_status", "Occupied")
+	set_bed_status(service_unit, "Occupied", inpatient_record, check_in)
 
 
 def patient_leave_service_unit(inpatient_record, check_out, leave_from):
@@ -436,9 +383,7 @@ def patient_leave_service_unit(inpatient_record, check_out, leave_from):
 			if inpatient_occupancy.left != 1 and inpatient_occupancy.service_unit == leave_from:
 				inpatient_occupancy.left = True
 				inpatient_occupancy.check_out = check_out
-				frappe.db.set_value(
-					"Healthcare Service Unit", inpatient_occupancy.service_unit, "occupancy_status", "Vacant"
-				)
+				set_bed_status(inpatient_occupancy.service_unit, "Vacant")
 	inpatient_record.save(ignore_permissions=True)
 
 
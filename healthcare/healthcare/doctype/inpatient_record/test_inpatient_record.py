@@ -8,13 +8,17 @@ from frappe.tests.utils import FrappeTestCase
 from frappe.utils import now_datetime, today
 from frappe.utils.make_random import get_random
 
+from healthcare.healthcare.doctype.healthcare_service_unit.bed_board import (
+	clear_bed_board,
+	get_bed_board,
+)
 from healthcare.healthcare.doctype.inpatient_record.inpatient_record import (
 	admit_patient,
 	discharge_patient,
 	schedule_discharge,
 )
 from healthcare.healthcare.doctype.lab_test.test_lab_test import create_patient_encounter
-from healthcare.healthcare.utils import get_encounters_to_invoice
+from healthcare.healthcare.utils import get_children, get_encounters_to_invoice
 
 
 class TestInpatientRecord(FrappeTestCase):
@@ -127,6 +131,47 @@ class TestInpatientRecord(FrappeTestCase):
 		self.assertRaises(frappe.ValidationError, ip_record_new.save)
 		frappe.db.sql("""delete from `tabInpatient Record`""")
 
+	def test_bed_board(self):
+		frappe.db.sql("""delete from `tabInpatient Record`""")
+		clear_bed_board("_Test Company")
+		self.addCleanup(clear_bed_board, "_Test Company")
+		patient = create_patient()
+		ip_record = create_inpatient(patient)
+		ip_record.expected_length_of_stay = 0
+		ip_record.save(ignore_permissions=True)
+		service_unit = get_healthcare_service_unit()
+		ward = frappe.db.get_value(
+			"Healthcare Service Unit", service_unit, "parent_healthcare_service_unit"
+		)
+
+		# the board is loaded from the open inpatient occupancies
+		admit_patient(ip_record, service_unit, now_datetime())
+		bed = get_bed_board("_Test Company", ward)[service_unit]
+		self.assertEqual(bed.status, "Occupied")
+		self.assertEqual(bed.patient, patient)
+		self.assertEqual(bed.inpatient_record, ip_record.name)
+
+		# the service unit tree reads its beds from the board
+		nodes = {
+			node["value"]: node for node in get_children("Healthcare Service Unit", parent=ward)
+		}
+		self.assertEqual(nodes[service_unit]["occupancy_status"], "Occupied")
+		self.assertEqual(nodes[service_unit]["patient"], patient)
+
+		# once committed, changes patch the loaded board which is then read without queries
+		schedule_discharge(frappe.as_json({"patient": patient}))
+		frappe.db.after_commit.run()
+		with self.assertQueryCount(0):
+			bed = get_bed_board("_Test Company", ward)[service_unit]
+		self.assertEqual(bed.status, "Vacant")
+		self.assertIsNone(bed.patient)
+
+		# patients on the board are only shown to users who can read inpatient records
+		frappe.set_user("Guest")
+		self.addCleanup(frappe.set_user, "Administrator")
+		self.assertRaises(frappe.PermissionError, get_bed_board, "_Test Company", ward)
+		frappe.db.sql("""delete from `tabInpatient Record`""")
+
 
 def mark_invoiced_inpatient_occupancy(ip_record):
 	if ip_record.inpatient_occupancies:
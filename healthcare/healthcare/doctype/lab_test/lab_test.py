@@ -6,6 +6,7 @@
 import frappe
 from frappe import _
 from frappe.model.document import Document
+from frappe.query_builder import Case
 from frappe.utils import get_link_to_form, getdate, now_datetime
 
 from healthcare.healthcare.doctype.nursing_task.nursing_task import NursingTask
@@ -14,6 +15,10 @@ from healthcare.healthcare.doctype.service_request.service_request import (
 )
 
 
+# lab tests created per commit and progress update by the background job
+LAB_TEST_BATCH_SIZE = 10
+
+
 class LabTest(Document):
 	def validate(self):
 		if not self.is_new():
@@ -53,8 +58,10 @@ class LabTest(Document):
 				self.db_set("invoiced", True)
 
 		if self.template:
-			self.load_test_from_template()
-			self.reload()
+			# result format is loaded before insert for tests created in a batch
+			if not self.flags.template_loaded:
+				self.load_test_from_template()
+				self.reload()
 
 			# create nursing tasks
 			template = frappe.db.get_value("Lab Test Template", self.template, "nursing_checklist_template")
@@ -116,9 +123,15 @@ def before_insert(self):
 
 
 def create_test_from_template(lab_test):
-	template = frappe.get_doc("Lab Test Template", lab_test.template)
+	template = frappe.get_cached_doc("Lab Test Template", lab_test.template)
 	patient = frappe.get_doc("Patient", lab_test.patient)
 
+	set_test_details_from_template(lab_test, template, patient)
+	if template.lab_test_template_type != "No Result":
+		lab_test.save(ignore_permissions=True)  # Insert the result
+
+
+def set_test_details_from_template(lab_test, template, patient):
 	lab_test.lab_test_name = template.lab_test_name
 	lab_test.result_date = getdate()
 	lab_test.department = template.department
@@ -128,7 +141,7 @@ def create_test_from_template(lab_test):
 	lab_test.worksheet_instructions = template.worksheet_instructions
 
 	lab_test = create_sample_collection(lab_test, template, patient, None)
-	load_result_format(lab_test, template, None, None)
+	set_result_format(lab_test, template)
 
 
 @frappe.whitelist()
@@ -157,6 +170,23 @@ def create_multiple(doctype, docname):
 		)
 
 
+def create_lab_tests_from_invoice_submit(sales_invoice):
+	"""Create the lab tests of a submitted invoice, in a background job if so configured"""
+	if not frappe.db.get_single_value("Healthcare Settings", "create_lab_tests_in_background"):
+		create_multiple("Sales Invoice", sales_invoice)
+		return
+
+	frappe.enqueue(
+		"healthcare.healthcare.doctype.lab_test.lab_test.create_lab_tests_in_background",
+		queue="short",
+		job_id=f"create_lab_tests::{sales_invoice}",
+		deduplicate=True,
+		enqueue_after_commit=True,
+		sales_invoice=sales_invoice,
+	)
+	frappe.msgprint(_("Lab Tests will be created in the background"), alert=True)
+
+
 def create_lab_test_from_encounter(encounter):
 	lab_test_created = False
 	encounter = frappe.get_doc("Patient Encounter", encounter)
@@ -194,42 +224,120 @@ def create_lab_test_from_encounter(encounter):
 	return lab_test_created
 
 
-def create_lab_test_from_invoice(sales_invoice):
+def create_lab_test_from_invoice(sales_invoice, publish_progress=False):
+	"""
+	Create the lab tests of the invoice items that have a Lab Test Template
+	:param publish_progress: Commit and report progress after each batch, for the background job
+	"""
 	lab_tests_created = False
 	invoice = frappe.get_doc("Sales Invoice", sales_invoice)
-	if invoice and invoice.patient:
-		patient = frappe.get_doc("Patient", invoice.patient)
-		for item in invoice.items:
-			lab_test_created = 0
+	if not (invoice and invoice.patient):
+		return lab_tests_created
+
+	service_requests = [
+		item.reference_dn for item in invoice.items if item.reference_dt == "Service Request"
+	]
+	tested_service_requests = set()
+	if service_requests:
+		tested_service_requests = set(
+			frappe.get_all(
+				"Lab Test", filters={"service_request": ("in", service_requests)}, pluck="service_request"
+			)
+		)
+
+	templates = get_lab_test_templates_by_item([item.item_code for item in invoice.items])
+	items = [
+		item
+		for item in invoice.items
+		if item.reference_dt != "Lab Test"
+		and not (
+			item.reference_dt == "Service Request" and item.reference_dn in tested_service_requests
+		)
+		and templates.get(item.item_code)
+	]
+	if not items:
+		return lab_tests_created
+
+	patient = frappe.get_doc("Patient", invoice.patient)
+	lab_tests = []
+	for start in range(0, len(items), LAB_TEST_BATCH_SIZE):
+		item_lab_tests = {}
+		for item in items[start : start + LAB_TEST_BATCH_SIZE]:
+			template = frappe.get_cached_doc("Lab Test Template", templates[item.item_code])
+			lab_test = create_lab_test_doc(
+				invoice.ref_practitioner, patient, template, invoice.company, True, item.service_unit
+			)
 			if item.reference_dt == "Service Request":
+				lab_test.service_request = item.reference_dn
+			else:
+				item_lab_tests[item.name] = lab_test
+
+			# load the result format before insert to save the test once
+			set_test_details_from_template(lab_test, template, patient)
+			lab_test.flags.template_loaded = True
+			lab_test.insert(ignore_permissions=True)
+			lab_tests.append(lab_test.name)
+
+		set_invoice_item_references(
+			{item_name: lab_test.name for item_name, lab_test in item_lab_tests.items()}
+		)
+		if publish_progress:
+			frappe.db.commit()
+			frappe.publish_progress(
+				len(lab_tests) * 100 / len(items),
+				title=_("Creating Lab Tests"),
+				doctype="Sales Invoice",
+				docname=invoice.name,
+				description=_("{0} of {1} Lab Tests created").format(len(lab_tests), len(items)),
+			)
 
-				lab_test_created = (
-					1 if frappe.db.exists("Lab Test", {"service_request": item.reference_dn}) else 0
-				)
-			elif item.reference_dt == "Lab Test":
-				lab_test_created = 1
-			if lab_test_created != 1:
-				template = get_lab_test_template(item.item_code)
-				if template:
-					lab_test = create_lab_test_doc(
-						invoice.ref_practitioner, patient, template, invoice.company, True, item.service_unit
-					)
-					if item.reference_dt == "Service Request":
-						lab_test.service_request = item.reference_dn
-					lab_test.save(ignore_permissions=True)
-					if item.reference_dt != "Service Request":
-						frappe.db.set_value(
-							"Sales Invoice Item",
-							item.name,
-							{"reference_dt": "Lab Test", "reference_dn": lab_test.name},
-						)
-					if not lab_tests_created:
-						lab_tests_created = lab_test.name
-					else:
-						lab_tests_created += ", " + lab_test.name
+	lab_tests_created = ", ".join(lab_tests)
 	return lab_tests_created
 
 
+def create_lab_tests_in_background(sales_invoice):
+	lab_tests_created = create_lab_test_from_invoice(sales_invoice, publish_progress=True)
+	if lab_tests_created:
+		frappe.publish_realtime(
+			"msgprint",
+			_("Lab Test(s) {0} created successfully").format(lab_tests_created),
+			user=frappe.session.user,
+		)
+
+
+def get_lab_test_templates_by_item(items):
+	"""Returns a dict like { item_code: lab_test_template }"""
+	if not items:
+		return {}
+
+	return dict(
+		frappe.get_all(
+			"Lab Test Template",
+			filters={"item": ("in", list(set(items)))},
+			fields=["item", "name"],
+			as_list=True,
+		)
+	)
+
+
+def set_invoice_item_references(item_lab_tests):
+	"""Point the invoice items to the lab tests created for them, { invoice_item: lab_test }"""
+	if not item_lab_tests:
+		return
+
+	invoice_item = frappe.qb.DocType("Sales Invoice Item")
+	lab_test = Case()
+	for item_name, lab_test_name in item_lab_tests.items():
+		lab_test = lab_test.when(invoice_item.name == item_name, lab_test_name)
+
+	(
+		frappe.qb.update(invoice_item)
+		.set(invoice_item.reference_dt, "Lab Test")
+		.set(invoice_item.reference_dn, lab_test)
+		.where(invoice_item.name.isin(list(item_lab_tests)))
+	).run()
+
+
 def get_lab_test_template(item):
 	template_id = frappe.db.exists("Lab Test Template", {"item": item})
 	if template_id:
@@ -367,6 +475,20 @@ def create_sample_collection(lab_test, template, patient, invoice):
 
 
 def load_result_format(lab_test, template, prescription, invoice):
+	set_result_format(lab_test, template)
+
+	if template.lab_test_template_type != "No Result":
+		if prescription:
+			lab_test.prescription = prescription
+			if invoice:
+				frappe.db.set_value(
+					"Service Request", lab_test.service_request, "status", "completed-Request Status"
+				)
+		lab_test.save(ignore_permissions=True)  # Insert the result
+		return lab_test
+
+
+def set_result_format(lab_test, template):
 	if template.lab_test_template_type == "Single":
 		create_normals(template, lab_test)
 
@@ -384,7 +506,9 @@ def load_result_format(lab_test, template, prescription, invoice):
 		for lab_test_group in template.lab_test_groups:
 			# Template_in_group = None
 			if lab_test_group.lab_test_template:
-				template_in_group = frappe.get_doc("Lab Test Template", lab_test_group.lab_test_template)
+				template_in_group = frappe.get_cached_doc(
+					"Lab Test Template", lab_test_group.lab_test_template
+				)
 				if template_in_group:
 					if template_in_group.lab_test_template_type == "Single":
 						create_normals(template_in_group, lab_test)
@@ -416,16 +540,6 @@ def load_result_format(lab_test, template, prescription, invoice):
 				normal.require_result_value = 1
 				normal.template = template.name
 
-	if template.lab_test_template_type != "No Result":
-		if prescription:
-			lab_test.prescription = prescription
-			if invoice:
-				frappe.db.set_value(
-					"Service Request", lab_test.service_request, "status", "completed-Request Status"
-				)
-		lab_test.save(ignore_permissions=True)  # Insert the result
-		return lab_test
-
 
 @frappe.whitelist()
 def get_employee_by_user_id(user_id):
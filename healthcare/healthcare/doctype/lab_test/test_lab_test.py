@@ -11,7 +11,10 @@ from healthcare.healthcare.doctype.healthcare_settings.healthcare_settings impor
 	get_income_account,
 	get_receivable_account,
 )
-from healthcare.healthcare.doctype.lab_test.lab_test import create_multiple
+from healthcare.healthcare.doctype.lab_test.lab_test import (
+	create_lab_test_from_invoice,
+	create_multiple,
+)
 from healthcare.healthcare.doctype.patient_appointment.test_patient_appointment import (
 	create_patient,
 )
@@ -79,6 +82,19 @@ class TestLabTest(FrappeTestCase):
 		self.assertIsNotNone(sales_invoice.items[0].reference_dn)
 		self.assertIsNotNone(sales_invoice.items[1].reference_dn)
 
+		# result rows are loaded from the template before the test is inserted
+		for item in sales_invoice.items:
+			self.assertEqual(item.reference_dt, "Lab Test")
+			lab_test = frappe.get_doc("Lab Test", item.reference_dn)
+			self.assertEqual(
+				lab_test.lab_test_name,
+				frappe.db.get_value("Lab Test Template", lab_test.template, "lab_test_name"),
+			)
+			self.assertTrue(lab_test.normal_test_items or lab_test.descriptive_test_items)
+
+		# items already pointing to a lab test are skipped
+		self.assertFalse(create_lab_test_from_invoice(sales_invoice.name))
+
 	def test_create_lab_tests_from_patient_encounter(self):
 		patient_encounter = create_patient_encounter()
 		create_multiple("Patient Encounter", patient_encounter.name)
@@ -28,7 +28,7 @@ class MedicationRequest(ServiceRequestController):
 
 	def set_order_details(self):
 		if self.medication:
-			medication = frappe.get_doc("Medication", self.medication)
+			medication = self.flags.template or frappe.get_doc("Medication", self.medication)
 			# set item code
 			self.item_code = medication.get("item")
 
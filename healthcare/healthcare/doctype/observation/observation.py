@@ -1,6 +1,7 @@
 # Copyright (c) 2023, healthcare and contributors
 # For license information, please see license.txt
 
+import ast
 import json
 import re
 
@@ -8,13 +9,86 @@ import frappe
 from frappe import _
 from frappe.model.document import Document
 from frappe.model.workflow import get_workflow_name, get_workflow_state_field
-from frappe.utils import flt, get_link_to_form, getdate, now_datetime, nowdate
+from frappe.query_builder import Case
+from frappe.utils import cint, flt, get_link_to_form, getdate, now_datetime, nowdate
 
 from erpnext.setup.doctype.terms_and_conditions.terms_and_conditions import (
 	get_terms_and_conditions,
 )
 
 
+FORMULA_FUNCTIONS = {
+	"abs": abs,
+	"min": min,
+	"max": max,
+	"round": round,
+	"int": int,
+	"float": float,
+	"flt": flt,
+	"cint": cint,
+}
+FORMULA_GLOBALS = {"__builtins__": {}, **FORMULA_FUNCTIONS}
+FORMULA_NODES = (
+	ast.Expression,
+	ast.BoolOp,
+	ast.BinOp,
+	ast.UnaryOp,
+	ast.Compare,
+	ast.IfExp,
+	ast.Call,
+	ast.Name,
+	ast.Attribute,
+	ast.Subscript,
+	ast.Constant,
+	ast.Tuple,
+	ast.List,
+	ast.Load,
+	ast.boolop,
+	ast.operator,
+	ast.unaryop,
+	ast.cmpop,
+)
+
+# columns of the observations shown in Diagnostic Reports, their print and medical records
+OBSERVATION_FIELDS = [
+	"name",
+	"patient",
+	"observation_template",
+	"observation_category",
+	"preferred_display_name",
+	"has_component",
+	"parent_observation",
+	"observation_idx",
+	"permitted_data_type",
+	"permitted_unit",
+	"options",
+	"status",
+	"docstatus",
+	"result_data",
+	"result_text",
+	"result_float",
+	"result_select",
+	"result_interpretation",
+	"result_template",
+	"interpretation_template",
+	"reference",
+	"note",
+	"description",
+	"method",
+	"sample",
+	"specimen",
+	"time_of_result",
+	"sales_invoice",
+	"service_request",
+	"healthcare_practitioner",
+	"practitioner_name",
+	"disapproval_reason",
+]
+
+# { (site, observation_template): (modified, compiled formulas) }
+compiled_formulas = {}
+
+
 class Observation(Document):
 	def validate(self):
 		self.set_age()
@@ -24,6 +98,9 @@ class Observation(Document):
 		self.validate_input()
 
 	def on_update(self):
+		if self.flags.defer_recalculation:
+			return
+
 		set_diagnostic_report_status(self)
 		if (
 			self.parent_observation
@@ -111,17 +188,7 @@ def get_observation_details(docname):
 	observation = []
 
 	if reference.get("ref_doctype") == "Sales Invoice":
-		observation = frappe.get_list(
-			"Observation",
-			fields=["*"],
-			filters={
-				"sales_invoice": reference.get("docname"),
-				"parent_observation": "",
-				"status": ["!=", "Cancelled"],
-				"docstatus": ["!=", 2],
-			},
-			order_by="creation",
-		)
+		observation = get_report_observations({"sales_invoice": reference.get("docname")})
 	elif reference.get("ref_doctype") == "Patient Encounter":
 		service_requests = frappe.get_all(
 			"Service Request",
@@ -134,27 +201,37 @@ def get_observation_details(docname):
 			order_by="creation",
 			pluck="name",
 		)
-		observation = frappe.get_list(
-			"Observation",
-			fields=["*"],
-			filters={
-				"service_request": ["in", service_requests],
-				"parent_observation": "",
-				"status": ["!=", "Cancelled"],
-				"docstatus": ["!=", 2],
-			},
-			order_by="creation",
-		)
+		observation = get_report_observations({"service_request": ["in", service_requests]})
 
 	out_data, obs_length = aggregate_and_return_observation_data(observation)
 
 	return out_data, obs_length
 
 
+def get_report_observations(filters):
+	"""Top level observations (single and grouped) of a report"""
+	return frappe.get_list(
+		"Observation",
+		fields=OBSERVATION_FIELDS,
+		filters={
+			**filters,
+			"parent_observation": "",
+			"status": ["!=", "Cancelled"],
+			"docstatus": ["!=", 2],
+		},
+		order_by="creation",
+	)
+
+
 def aggregate_and_return_observation_data(observations):
 	out_data = []
 	obs_length = 0
 
+	child_observations = get_child_observations(
+		[obs.get("name") for obs in observations if obs.get("has_component")]
+	)
+	set_received_time(observations + sum(child_observations.values(), []))
+
 	for obs in observations:
 
 		if not obs.get("has_component"):
@@ -164,14 +241,12 @@ def aggregate_and_return_observation_data(observations):
 			if obs.get("permitted_data_type") == "Select" and obs.get("options"):
 				obs["options_list"] = obs.get("options").split("\n")
 
-			if obs.get("observation_template") and obs.get("specimen"):
-				obs["received_time"] = frappe.get_value("Specimen", obs.get("specimen"), "received_time")
-
 			out_data.append({"observation": obs})
 
 		else:
-			child_observations = get_child_observations(obs)
-			obs_dict = return_child_observation_data_as_dict(child_observations, obs, obs_length)
+			obs_dict = return_child_observation_data_as_dict(
+				child_observations.get(obs.get("name"), []), obs, obs_length
+			)
 
 			if len(obs_dict) > 0:
 				out_data.append(obs_dict)
@@ -179,17 +254,42 @@ def aggregate_and_return_observation_data(observations):
 	return out_data, obs_length
 
 
-def get_child_observations(obs):
-	return frappe.get_list(
+def get_child_observations(parent_observations):
+	"""Component observations of all `parent_observations` in one query, { parent: [children] }"""
+	if not parent_observations:
+		return {}
+
+	out = {}
+	for child in frappe.get_list(
 		"Observation",
-		fields=["*"],
+		fields=OBSERVATION_FIELDS,
 		filters={
-			"parent_observation": obs.get("name"),
+			"parent_observation": ["in", parent_observations],
 			"status": ["!=", "Cancelled"],
 			"docstatus": ["!=", 2],
 		},
 		order_by="observation_idx",
+	):
+		out.setdefault(child.parent_observation, []).append(child)
+	return out
+
+
+def set_received_time(observations):
+	specimens = {obs.get("specimen") for obs in observations if obs.get("specimen")}
+	if not specimens:
+		return
+
+	received_time = dict(
+		frappe.get_all(
+			"Specimen",
+			filters={"name": ["in", list(specimens)]},
+			fields=["name", "received_time"],
+			as_list=True,
+		)
 	)
+	for obs in observations:
+		if obs.get("specimen") and obs.get("observation_template"):
+			obs["received_time"] = received_time.get(obs.get("specimen"))
 
 
 def return_child_observation_data_as_dict(child_observations, obs, obs_length=0):
@@ -202,8 +302,6 @@ def return_child_observation_data_as_dict(child_observations, obs, obs_length=0)
 			obs_length += 1
 		if child.get("permitted_data_type") == "Select" and child.get("options"):
 			child["options_list"] = child.get("options").split("\n")
-		if child.get("specimen"):
-			child["received_time"] = frappe.get_value("Specimen", child.get("specimen"), "received_time")
 		observation_data = {"observation": child}
 		obs_list.append(observation_data)
 
@@ -320,87 +418,110 @@ def add_observation(**args):
 
 @frappe.whitelist()
 def record_observation_result(values):
-	values = json.loads(values)
-	if values:
-		values = [dict(t) for t in {tuple(d.items()) for d in values}]
-		for val in values:
-			if not val.get("observation"):
-				return
-			observation_doc = frappe.get_doc("Observation", val["observation"])
-			if observation_doc.get("permitted_data_type") in [
-				"Range",
-				"Ratio",
-				"Quantity",
-				"Numeric",
-			]:
-				if (
-					observation_doc.get("permitted_data_type")
-					in [
-						"Quantity",
-						"Numeric",
-					]
-					and val.get("result")
-					and not is_numbers_with_exceptions(val.get("result"))
-				):
-					frappe.msgprint(
-						_("Non numeric result {0} is not allowed for Permitted Type {1}").format(
-							frappe.bold(val.get("result")),
-							frappe.bold(observation_doc.get("permitted_data_type")),
-						),
-						indicator="orange",
-						alert=True,
-					)
-					return
-
-				if val.get("result") != observation_doc.get("result_data"):
-					if val.get("result"):
-						observation_doc.result_data = val.get("result")
-					if val.get("note"):
-						observation_doc.note = val.get("note")
-					if observation_doc.docstatus == 0:
-						observation_doc.save()
-					elif observation_doc.docstatus == 1:
-						observation_doc.save("Update")
-			elif observation_doc.get("permitted_data_type") == "Text":
-				if val.get("result") != observation_doc.get("result_text"):
-					if val.get("result"):
-						observation_doc.result_text = val.get("result")
-					if val.get("note"):
-						observation_doc.note = val.get("note")
-					if observation_doc.docstatus == 0:
-						observation_doc.save()
-					elif observation_doc.docstatus == 1:
-						observation_doc.save("Update")
-			elif observation_doc.get("permitted_data_type") == "Select":
-				if val.get("result") != observation_doc.get("result_select"):
-					if val.get("result"):
-						observation_doc.result_select = val.get("result")
-					if val.get("note"):
-						observation_doc.note = val.get("note")
-					if observation_doc.docstatus == 0:
-						observation_doc.save()
-					elif observation_doc.docstatus == 1:
-						observation_doc.save("Update")
-
-			if observation_doc.get("observation_category") == "Imaging":
-				if val.get("result"):
-					observation_doc.result_text = val.get("result")
-				if val.get("interpretation"):
-					observation_doc.result_interpretation = val.get("interpretation")
-				if val.get("result") or val.get("interpretation"):
-					if val.get("note"):
-						observation_doc.note = val.get("note")
-					if observation_doc.docstatus == 0:
-						observation_doc.save()
-					elif observation_doc.docstatus == 1:
-						observation_doc.save("Update")
-
-			if not val.get("result") and val.get("note"):
-				observation_doc.note = val.get("note")
-				if observation_doc.docstatus == 0:
-					observation_doc.save()
-				elif observation_doc.docstatus == 1:
-					observation_doc.save("Update")
+	"""Record results entered against several observations, each observation is saved once
+	and the formula and Diagnostic Report updates run once per parent and per invoice
+
+	:param values: JSON list of {observation, result, interpretation, note}
+	"""
+	values = get_result_values_by_observation(json.loads(values) if values else [])
+	if not values:
+		return
+
+	observations = [frappe.get_doc("Observation", name) for name in values]
+	if not validate_result_values(observations, values):
+		return
+
+	parents, invoices = {}, {}
+	for observation_doc in observations:
+		if not set_result_values(observation_doc, values[observation_doc.name]):
+			continue
+
+		observation_doc.flags.defer_recalculation = True
+		if observation_doc.docstatus == 0:
+			observation_doc.save()
+		elif observation_doc.docstatus == 1:
+			observation_doc.save("Update")
+			continue
+
+		if (
+			observation_doc.parent_observation
+			and observation_doc.result_data
+			and observation_doc.permitted_data_type in ["Quantity", "Numeric"]
+		):
+			parents.setdefault(observation_doc.parent_observation, []).append(observation_doc)
+		if (
+			observation_doc.sales_invoice
+			and not observation_doc.has_component
+			and observation_doc.has_result()
+		):
+			invoices.setdefault(observation_doc.sales_invoice, observation_doc)
+
+	for docs in parents.values():
+		set_calculated_result(docs[0], [d.observation_template for d in docs])
+
+	for observation_doc in invoices.values():
+		set_diagnostic_report_status(observation_doc)
+
+
+def get_result_values_by_observation(values):
+	"""Merge the entered values per observation, later entries win"""
+	out = {}
+	for val in values:
+		if not val.get("observation"):
+			continue
+		merged = out.setdefault(val["observation"], {})
+		merged.update({key: value for key, value in val.items() if value or key not in merged})
+	return out
+
+
+def validate_result_values(observations, values):
+	invalid = [
+		_("Non numeric result {0} is not allowed for Permitted Type {1}").format(
+			frappe.bold(values[d.name].get("result")), frappe.bold(d.permitted_data_type)
+		)
+		for d in observations
+		if d.permitted_data_type in ["Quantity", "Numeric"]
+		and values[d.name].get("result")
+		and not is_numbers_with_exceptions(values[d.name].get("result"))
+	]
+	if invalid:
+		frappe.msgprint("<br>".join(invalid), indicator="orange", alert=True)
+		return False
+
+	return True
+
+
+def set_result_values(observation_doc, val):
+	"""Set the entered result, interpretation and note on the observation,
+	returns True if the observation has to be saved"""
+	result, note = val.get("result"), val.get("note")
+	result_field = {
+		"Range": "result_data",
+		"Ratio": "result_data",
+		"Quantity": "result_data",
+		"Numeric": "result_data",
+		"Text": "result_text",
+		"Select": "result_select",
+	}.get(observation_doc.permitted_data_type)
+
+	changed = False
+	if result_field and result != observation_doc.get(result_field):
+		if result:
+			observation_doc.set(result_field, result)
+		changed = True
+
+	if observation_doc.observation_category == "Imaging":
+		if result:
+			observation_doc.result_text = result
+		if val.get("interpretation"):
+			observation_doc.result_interpretation = val.get("interpretation")
+		changed = changed or bool(result or val.get("interpretation"))
+
+	if note and (changed or not result):
+		observation_doc.note = note
+		changed = True
+
+	return changed
 
 
 @frappe.whitelist()
@@ -491,147 +612,231 @@ def set_diagnostic_report_status(doc):
 			)
 
 
-def set_calculated_result(doc):
-	if doc.parent_observation:
-		parent_template = frappe.db.get_value(
-			"Observation", doc.parent_observation, "observation_template"
-		)
-		parent_template_doc = frappe.get_cached_doc("Observation Template", parent_template)
-
-		data = frappe._dict()
-		patient_doc = frappe.get_cached_doc("Patient", doc.patient).as_dict()
-		settings = frappe.get_cached_doc("Healthcare Settings").as_dict()
-
-		data.update(doc.as_dict())
-		data.update(parent_template_doc.as_dict())
-		data.update(patient_doc)
-		data.update(settings)
-
-		for component in parent_template_doc.observation_component:
-			"""
-			Data retrieval from observations has been moved into the loop
-			to accommodate component observations, which may contain formulas
-			utilizing results from previous iterations.
-
-			"""
-			if component.based_on_formula and component.formula:
-				obs_data = get_data(doc, parent_template_doc)
-			else:
-				continue
+def set_calculated_result(doc, observation_templates=None):
+	"""Recompute the formula components of the parent observation that depend on `doc`
+	(or on all of `observation_templates`) and write the changed results in one update"""
+	if not doc.parent_observation:
+		return
 
-			if obs_data and len(obs_data) > 0:
-				data.update(obs_data)
-				result = eval_condition_and_formula(component, data)
-				if not result:
-					continue
-
-				result_observation_name, result_data = frappe.db.get_value(
-					"Observation",
-					{
-						"parent_observation": doc.parent_observation,
-						"observation_template": component.get("observation_template"),
-					},
-					["name", "result_data"],
-				)
-				if result_observation_name and result_data != str(result):
-					frappe.db.set_value(
-						"Observation",
-						result_observation_name,
-						"result_data",
-						str(result),
-					)
+	parent_template = frappe.db.get_value(
+		"Observation", doc.parent_observation, "observation_template"
+	)
+	if not parent_template:
+		return
 
+	parent_template_doc = frappe.get_cached_doc("Observation Template", parent_template)
+	formulas = get_compiled_formulas(parent_template_doc)
+	components = get_affected_formula_components(
+		formulas, *(observation_templates or [doc.observation_template])
+	)
+	if not components:
+		return
 
-def get_data(doc, parent_template_doc):
-	data = frappe._dict()
-	observation_details = frappe.get_all(
+	observations = {}
+	for observation in frappe.get_all(
 		"Observation",
 		{"parent_observation": doc.parent_observation},
-		["observation_template", "result_data"],
+		["name", "observation_template", "result_data"],
+		order_by="creation",
+	):
+		observations.setdefault(observation.observation_template, observation)
+
+	data = get_formula_context(doc, parent_template_doc, formulas.external_names)
+	for template, abbrs in formulas.abbrs_by_template.items():
+		observation = observations.get(template)
+		value = flt(observation.result_data) if observation and observation.result_data else 0
+		data.update(dict.fromkeys(abbrs, value))
+
+	results = {}
+	for component in components:
+		result = eval_condition_and_formula(component, data)
+		observation = observations.get(component.observation_template)
+		if not result or not observation:
+			continue
+
+		# results feed the components evaluated after this one
+		data.update(dict.fromkeys(formulas.abbrs_by_template[component.observation_template], result))
+		if observation.result_data != str(result):
+			observation.result_data = str(result)
+			results[observation.name] = str(result)
+
+	update_calculated_results(results)
+
+
+def get_compiled_formulas(template_doc):
+	"""Formulas and conditions of the template parsed once, cached per process and
+	keyed on the template's modified timestamp so that edits invalidate it"""
+	cache_key = (frappe.local.site, template_doc.name)
+	cached = compiled_formulas.get(cache_key)
+	if cached and cached[0] == str(template_doc.modified):
+		return cached[1]
+
+	abbrs_by_template = {}
+	for row in template_doc.observation_component:
+		abbrs = abbrs_by_template.setdefault(row.observation_template, set())
+		if row.abbr:
+			abbrs.add(row.abbr)
+
+	components = []
+	for row in template_doc.observation_component:
+		if not (row.based_on_formula and row.formula):
+			continue
+		component = frappe._dict(row.as_dict())
+		try:
+			component.formula_code, component.formula_names = compile_expression(row.formula)
+			component.condition_code, condition_names = compile_expression(row.condition)
+		except Exception as err:
+			throw_formula_error(component, err)
+		component.depends_on = component.formula_names | condition_names
+		component.outputs = abbrs_by_template.get(row.observation_template, set())
+		components.append(component)
+
+	all_abbrs = set().union(*abbrs_by_template.values())
+	formulas = frappe._dict(
+		components=sort_formula_components(components),
+		abbrs_by_template=abbrs_by_template,
+		external_names=set().union(*(c.depends_on for c in components)) - all_abbrs,
 	)
+	compiled_formulas[cache_key] = (str(template_doc.modified), formulas)
+	return formulas
+
+
+def compile_expression(expression):
+	"""Parse a formula or condition, returns the code object and the names it reads
 
-	# to get all result_data to map against abbs of all table rows
-	for component in parent_template_doc.observation_component:
-		result = [
-			d["result_data"]
-			for d in observation_details
-			if (d["observation_template"] == component.get("observation_template") and d["result_data"])
+	:param expression: formula or condition as entered in the Observation Component
+	"""
+	expression = " ".join(expression.strip().splitlines()) if expression else None
+	if not expression:
+		return None, frozenset()
+
+	tree = ast.parse(expression, mode="eval")
+	names = set()
+	for node in ast.walk(tree):
+		if (
+			not isinstance(node, FORMULA_NODES)
+			or (isinstance(node, ast.Attribute) and node.attr.startswith("_"))
+			or (isinstance(node, ast.Call) and getattr(node.func, "id", None) not in FORMULA_FUNCTIONS)
+		):
+			raise SyntaxError(_("{0} is not allowed in formulas").format(type(node).__name__))
+		if isinstance(node, ast.Name):
+			names.add(node.id)
+
+	return compile(tree, "<formula>", "eval"), frozenset(names - set(FORMULA_FUNCTIONS))
+
+
+def sort_formula_components(components):
+	"""Order components so that each one is evaluated after the components it reads,
+	keeping the table order otherwise (cyclic references fall back to table order)"""
+	ordered, pending = [], list(components)
+	while pending:
+		ready = [
+			c
+			for c in pending
+			if not any(c.depends_on & other.outputs for other in pending if other is not c)
 		]
-		data[component.get("abbr")] = flt(result[0]) if (result and len(result) > 0 and result[0]) else 0
+		ordered.extend(ready or pending)
+		pending = [c for c in pending if c not in ready] if ready else []
+	return ordered
+
+
+def get_affected_formula_components(formulas, *observation_templates):
+	"""Formula components downstream of the results of `observation_templates`"""
+	changed = set().union(
+		*(formulas.abbrs_by_template.get(template) or [] for template in observation_templates)
+	)
+	if not changed:
+		return formulas.components
+
+	affected = []
+	for component in formulas.components:
+		if component.depends_on & changed:
+			affected.append(component)
+			changed |= component.outputs
+	return affected
+
+
+def get_formula_context(doc, template_doc, names):
+	"""Values of the non-component names used in formulas, looked up in Healthcare Settings,
+	Patient, the parent Observation Template and the Observation, in that order"""
+	data = frappe._dict()
+	if not names:
+		return data
+
+	sources = (
+		frappe.get_cached_doc("Healthcare Settings"),
+		frappe.get_cached_doc("Patient", doc.patient),
+		template_doc,
+		doc,
+	)
+	for name in names:
+		# unresolved names are bound to None so that conditions on them evaluate false
+		data[name] = next(
+			(source.get(name) for source in sources if source.get(name) is not None), None
+		)
+
+	dob = sources[1].dob
+	if "age" in names and dob:
+		today, dob = getdate(nowdate()), getdate(dob)
+		age = today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
+		if age > 0:
+			data["age"] = age
+
 	return data
 
 
 def eval_condition_and_formula(d, data):
+	"""Evaluate a compiled formula component (see `get_compiled_formulas`) against `data`"""
 	try:
-		if d.get("condition"):
-			cond = d.get("condition")
-			parts = cond.strip().splitlines()
-			condition = " ".join(parts)
-			if condition:
-				if not frappe.safe_eval(condition, data):
-					return None
-
-		if d.based_on_formula:
-			amount = None
-			formula = d.formula.strip().replace("\n", " ") if d.formula else None
-			operands = re.split(r"\W+", formula)
-			abbrs = [operand for operand in operands if re.search(r"[a-zA-Z]", operand)]
-			if "age" in abbrs and data.get("dob"):
-				age = (
-					getdate(nowdate()).year
-					- data.get("dob").year
-					- (
-						(getdate(nowdate()).month, getdate(nowdate()).day)
-						< (data.get("dob").month, data.get("dob").day)
-					)
-				)
-				if age > 0:
-					data["age"] = age
-
-			# check the formula abbrs has result value
-			abbrs_present = all(abbr in data and data[abbr] != 0 for abbr in abbrs)
-			if formula and abbrs_present:
-				amount = flt(frappe.safe_eval(formula, {}, data))
+		if d.condition_code and not eval(d.condition_code, dict(FORMULA_GLOBALS), data):
+			return None
 
-		return amount
+		# check the formula abbrs has result value
+		if all(data.get(name) not in (None, 0) for name in d.formula_names):
+			return flt(eval(d.formula_code, dict(FORMULA_GLOBALS), data))
 
 	except Exception as err:
-		description = _("This error can be due to invalid formula.")
-		message = _(
-			"""Error while evaluating the {0} {1} at row {2}. <br><br> <b>Error:</b> {3}
-			<br><br> <b>Hint:</b> {4}"""
-		).format(d.parenttype, get_link_to_form(d.parenttype, d.parent), d.idx, err, description)
-		frappe.throw(message, title=_("Error in formula"))
+		throw_formula_error(d, err)
 
 
-def get_observations_for_medical_record(observation, parent_observation=None):
-	if not observation:
-		return
+def throw_formula_error(d, err):
+	description = _("This error can be due to invalid formula.")
+	message = _(
+		"""Error while evaluating the {0} {1} at row {2}. <br><br> <b>Error:</b> {3}
+		<br><br> <b>Hint:</b> {4}"""
+	).format(d.parenttype, get_link_to_form(d.parenttype, d.parent), d.idx, err, description)
+	frappe.throw(message, title=_("Error in formula"))
 
-	if parent_observation:
-		obs_doc = frappe.get_doc("Observation", parent_observation)
-	else:
-		obs_doc = frappe.get_doc("Observation", observation)
 
-	obs_doc = obs_doc.as_dict()
-	out_data = []
+def update_calculated_results(results):
+	"""Write calculated results, { observation: result_data }"""
+	if not results:
+		return
 
-	if not obs_doc.get("has_component"):
-		if obs_doc.get("permitted_data_type") == "Select" and obs_doc.get("options"):
-			obs_doc["options_list"] = obs_doc.get("options").split("\n")
+	observation = frappe.qb.DocType("Observation")
+	result_data = Case()
+	for name, result in results.items():
+		result_data = result_data.when(observation.name == name, result)
 
-		if obs_doc.get("observation_template") and obs_doc.get("specimen"):
-			obs_doc["received_time"] = frappe.get_value(
-				"Specimen", obs_doc.get("specimen"), "received_time"
-			)
+	(
+		frappe.qb.update(observation)
+		.set(observation.result_data, result_data)
+		.set(observation.modified, now_datetime())
+		.set(observation.modified_by, frappe.session.user)
+		.where(observation.name.isin(list(results)))
+	).run()
 
-		out_data.append({"observation": obs_doc})
 
-	else:
-		child_observations = get_child_observations(obs_doc)
-		obs_dict = return_child_observation_data_as_dict(child_observations, obs_doc)
+def get_observations_for_medical_record(observation, parent_observation=None):
+	if not observation:
+		return
+
+	observations = frappe.get_all(
+		"Observation", filters={"name": parent_observation or observation}, fields=OBSERVATION_FIELDS
+	)
+	if not observations:
+		return
 
-		if len(obs_dict) > 0:
-			out_data.append(obs_dict)
+	out_data, obs_length = aggregate_and_return_observation_data(observations)
 
 	return out_data
@@ -11,6 +11,16 @@ from healthcare.healthcare.doctype.healthcare_settings.healthcare_settings impor
 	get_receivable_account,
 )
 from healthcare.healthcare.doctype.lab_test.test_lab_test import create_practitioner
+from healthcare.healthcare.doctype.observation.observation import (
+	compile_expression,
+	eval_condition_and_formula,
+	get_affected_formula_components,
+	get_formula_context,
+	get_observation_details,
+	get_observations_for_medical_record,
+	record_observation_result,
+	sort_formula_components,
+)
 from healthcare.healthcare.doctype.observation_template.test_observation_template import (
 	create_grouped_observation_template,
 	create_observation_template,
@@ -117,14 +127,30 @@ class TestObservation(FrappeTestCase):
 			)
 		)
 
-		self.assertTrue(
-			frappe.db.exists(
-				"Diagnostic Report",
-				{
-					"docname": sales_invoice.name,
-					"patient": patient,
-				},
-			)
+		diagnostic_report = frappe.db.exists(
+			"Diagnostic Report",
+			{
+				"docname": sales_invoice.name,
+				"patient": patient,
+			},
+		)
+		self.assertTrue(diagnostic_report)
+
+		# grouped observation is returned with its components
+		out_data, obs_length = get_observation_details(diagnostic_report)
+		self.assertEqual(len(out_data), 1)
+		parent_observation = out_data[0]["observation"]
+		self.assertTrue(out_data[0]["has_component"])
+		self.assertEqual(out_data[0]["display_name"], obs_template.name)
+		self.assertEqual(
+			[d["observation"]["observation_template"] for d in out_data[0][parent_observation]],
+			[obs_name + str(idx + 1)],
+		)
+		self.assertEqual(
+			get_observations_for_medical_record(parent_observation)[0][parent_observation][0][
+				"observation"
+			]["name"],
+			out_data[0][parent_observation][0]["observation"]["name"],
 		)
 
 		# observation with sample
@@ -195,6 +221,92 @@ class TestObservation(FrappeTestCase):
 		with_custom_field_in_patient(self, patient)
 		with_condition_patient(self, patient)
 
+	def test_bulk_result_entry(self):
+		patient = create_patient()
+		obs_template = create_grouped_observation_template("Test Observation", 1)
+		first_component = obs_template.observation_component[0]
+		second_template = create_observation_template("Observation Comp ", 3)
+		result_template = create_observation_template("Observation Comp ", 4)
+		obs_template.append("observation_component", {"observation_template": second_template.name})
+		obs_template.append(
+			"observation_component",
+			{
+				"observation_template": result_template.name,
+				"based_on_formula": True,
+				"formula": f"{first_component.abbr}*{second_template.abbr}",
+			},
+		)
+		obs_template.save()
+		create_sales_invoice(patient, obs_template.name)
+
+		def get_observation(template):
+			return frappe.db.get_value("Observation", {"observation_template": template}, "name")
+
+		first, second = get_observation(first_component.observation_template), get_observation(
+			second_template.name
+		)
+		# invalid values reject the whole batch
+		record_observation_result(
+			frappe.as_json(
+				[{"observation": first, "result": "6"}, {"observation": second, "result": "x"}]
+			)
+		)
+		self.assertFalse(frappe.db.get_value("Observation", first, "result_data"))
+
+		record_observation_result(
+			frappe.as_json(
+				[
+					{"observation": first, "result": "6"},
+					{"observation": first, "result": "6"},
+					{"observation": second, "result": "4", "note": "Rechecked"},
+				]
+			)
+		)
+		self.assertEqual(frappe.db.get_value("Observation", second, "note"), "Rechecked")
+		self.assertEqual(
+			flt(
+				frappe.db.get_value(
+					"Observation", {"observation_template": result_template.name}, "result_data"
+				)
+			),
+			24,
+		)
+
+	def test_formula_dependencies(self):
+		code, names = compile_expression("round(HB * 3, 1) +\nage")
+		self.assertEqual(names, {"HB", "age"})
+		self.assertEqual(eval(code, {"round": round}, {"HB": 4, "age": 2}), 14)
+		self.assertRaises(SyntaxError, compile_expression, "HB.__class__")
+		self.assertRaises(SyntaxError, compile_expression, "__import__('os')")
+
+		# MCHC reads HCT which is itself calculated, HCT must be evaluated first
+		mchc = frappe._dict(depends_on={"HB", "HCT"}, outputs={"MCHC"})
+		hct = frappe._dict(depends_on={"RBC", "MCV"}, outputs={"HCT"})
+		ratio = frappe._dict(depends_on={"WBC"}, outputs={"RATIO"})
+		formulas = frappe._dict(
+			components=sort_formula_components([mchc, hct, ratio]),
+			abbrs_by_template={"RBC Count": {"RBC"}, "WBC Count": {"WBC"}},
+		)
+		self.assertEqual(formulas.components, [hct, ratio, mchc])
+		self.assertEqual(get_affected_formula_components(formulas, "RBC Count"), [hct, mchc])
+		self.assertEqual(get_affected_formula_components(formulas, "WBC Count"), [ratio])
+
+	def test_formula_with_unresolved_names(self):
+		patient = create_patient()
+		template = create_observation_template("_Test Formula Context Template", "_Test")
+		observation = frappe._dict(patient=patient)
+		data = get_formula_context(observation, template, {"missing_field"})
+		self.assertEqual(data, {"missing_field": None})
+
+		# a condition on a value that is not set evaluates false instead of failing
+		component = frappe._dict(abbr="HB")
+		component.condition_code, names = compile_expression("missing_field == 'Male'")
+		component.formula_code, component.formula_names = compile_expression("int(HB) * 2")
+		self.assertIsNone(eval_condition_and_formula(component, dict(data, HB=4.5)))
+
+		component.condition_code = None
+		self.assertEqual(eval_condition_and_formula(component, dict(data, HB=4.5)), 8)
+
 
 def create_sales_invoice(patient, item):
 	sales_invoice = frappe.new_doc("Sales Invoice")
@@ -9,6 +9,7 @@ from healthcare.healthcare.doctype.clinical_procedure_template.clinical_procedur
 	make_item_price,
 	update_item_and_item_price,
 )
+from healthcare.healthcare.doctype.observation.observation import compile_expression
 
 
 class ObservationTemplate(Document):
@@ -35,9 +36,25 @@ class ObservationTemplate(Document):
 
 		if self.has_component:
 			self.abbr = ""
+			self.validate_formulas()
 		else:
 			self.validate_abbr()
 
+	def validate_formulas(self):
+		for component in self.observation_component:
+			for fieldname in ["formula", "condition"]:
+				if not component.based_on_formula or not component.get(fieldname):
+					continue
+				try:
+					compile_expression(component.get(fieldname))
+				except Exception as err:
+					frappe.throw(
+						_("Row #{0}: Invalid {1} {2}").format(
+							component.idx, _(component.meta.get_label(fieldname)), err
+						),
+						title=_("Error in formula"),
+					)
+
 	def validate_abbr(self):
 		if not self.abbr:
 			self.abbr = frappe.utils.get_abbr(self.observation)
@@ -0,0 +1,229 @@
+# Copyright (c) 2026, earthians Health Informatics Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+from datetime import timedelta
+
+import frappe
+from frappe.utils import cint, flt, get_time, getdate
+
+CLOSED_STATUSES = ("Closed", "Cancelled")
+
+
+class IntervalTree:
+	"""
+	Static augmented interval tree over half-open [start, end) intervals.
+
+	Intervals are kept sorted by start as an implicit balanced tree, each node
+	storing the maximum end of its subtree, so overlap queries run in O(log n + k).
+	"""
+
+	def __init__(self, intervals):
+		self.intervals = sorted(intervals, key=lambda interval: (interval.start, interval.end))
+		self.max_end = [0] * len(self.intervals)
+		self._build(0, len(self.intervals) - 1)
+
+	def __len__(self):
+		return len(self.intervals)
+
+	def _build(self, low, high):
+		if low > high:
+			return float("-inf")
+
+		mid = (low + high) // 2
+		self.max_end[mid] = max(
+			self.intervals[mid].end, self._build(low, mid - 1), self._build(mid + 1, high)
+		)
+		return self.max_end[mid]
+
+	def overlapping(self, start, end):
+		"""Return intervals overlapping [start, end)"""
+		result = []
+		self._search(0, len(self.intervals) - 1, start, end, result)
+		return result
+
+	def _search(self, low, high, start, end, result):
+		if low > high:
+			return
+
+		mid = (low + high) // 2
+		if self.max_end[mid] <= start:
+			# nothing in this subtree ends after the queried start
+			return
+
+		self._search(low, mid - 1, start, end, result)
+		interval = self.intervals[mid]
+		if interval.start < end:
+			if interval.end > start:
+				result.append(interval)
+			# right subtree starts at or after this interval
+			self._search(mid + 1, high, start, end, result)
+
+
+class AppointmentIntervals:
+	"""
+	Open appointments of one day touching a practitioner and a patient,
+	loaded with a single query and indexed per resource for conflict checks.
+	"""
+
+	def __init__(
+		self,
+		date,
+		practitioner=None,
+		patient=None,
+		exclude=None,
+		for_update=False,
+		appointments=None,
+	):
+		self.date = getdate(date)
+		self.practitioner = practitioner
+		self.patient = patient
+
+		if appointments is None:
+			appointments = self.load(exclude, for_update)
+		self.by_practitioner = IntervalTree(
+			[d for d in appointments if practitioner and d.practitioner == practitioner]
+		)
+		self.by_patient = IntervalTree([d for d in appointments if patient and d.patient == patient])
+
+	def load(self, exclude=None, for_update=False):
+		or_filters = {}
+		for fieldname in ("practitioner", "patient"):
+			if self.get(fieldname):
+				or_filters[fieldname] = self.get(fieldname)
+
+		if not or_filters:
+			return []
+
+		filters = {"appointment_date": self.date, "status": ("not in", CLOSED_STATUSES)}
+		if exclude:
+			filters["name"] = ("!=", exclude)
+
+		return load_appointments(filters, or_filters, for_update)
+
+	def get(self, key):
+		return getattr(self, key, None)
+
+	def get_conflicts(self, start, end):
+		"""Return open appointments of the practitioner or the patient overlapping [start, end)"""
+		conflicts = {}
+		for tree in (self.by_practitioner, self.by_patient):
+			for appointment in tree.overlapping(start, end):
+				conflicts[appointment.name] = appointment
+
+		return sorted(conflicts.values(), key=lambda appointment: appointment.start)
+
+	def get_unavailability(self, start, end):
+		"""Return unavailability blocks of the practitioner overlapping [start, end)"""
+		return [
+			appointment
+			for appointment in self.by_practitioner.overlapping(start, end)
+			if is_unavailability(appointment)
+		]
+
+
+def get_series_intervals(dates, practitioner=None, patient=None):
+	"""
+	Return {date: AppointmentIntervals} for all `dates` of a recurring series, loaded with one
+	locking query so that the whole series is validated against the same set of appointments
+	"""
+	dates = sorted({getdate(date) for date in dates})
+	or_filters = {
+		fieldname: value
+		for fieldname, value in (
+			("practitioner", practitioner),
+			("patient", patient),
+		)
+		if value
+	}
+	appointments = {}
+	if dates and or_filters:
+		for appointment in load_appointments(
+			{
+				"appointment_date": ("in", dates),
+				"status": ("not in", CLOSED_STATUSES),
+			},
+			or_filters,
+			for_update=True,
+		):
+			appointments.setdefault(getdate(appointment.appointment_date), []).append(appointment)
+
+	return {
+		date: AppointmentIntervals(
+			date,
+			practitioner=practitioner,
+			patient=patient,
+			appointments=appointments.get(date, []),
+		)
+		for date in dates
+	}
+
+
+def load_appointments(filters, or_filters, for_update=False):
+	# a locking read sees appointments committed by concurrent bookings
+	# even under repeatable read
+	appointments = frappe.get_all(
+		"Patient Appointment",
+		filters=filters,
+		or_filters=or_filters,
+		fields=[
+			"name",
+			"practitioner",
+			"patient",
+			"service_unit",
+			"appointment_date",
+			"appointment_time",
+			"duration",
+			"end_time",
+			"status",
+			"appointment_type",
+		],
+		for_update=for_update,
+	)
+
+	for appointment in appointments:
+		appointment.start, appointment.end = get_interval(
+			appointment.appointment_time, appointment.duration, appointment.end_time
+		)
+
+	return appointments
+
+
+def get_interval(appointment_time, duration=None, end_time=None):
+	"""Return (start, end) seconds since midnight of an appointment, zero length appointments occupy their start"""
+	start = get_seconds(appointment_time)
+	if end_time:
+		end = get_seconds(end_time)
+	else:
+		end = start + flt(duration) * 60
+
+	return start, max(end, start + 1)
+
+
+def get_seconds(value):
+	if isinstance(value, timedelta):
+		return value.total_seconds()
+	value = get_time(value)
+	return value.hour * 3600 + value.minute * 60 + value.second
+
+
+def is_unavailability(appointment):
+	return appointment.status == "Unavailable" and appointment.appointment_type == "Unavailable"
+
+
+def lock_booking_resources(practitioner=None, patient=None):
+	"""
+	Serialize concurrent bookings of the same practitioner and patient with row level
+	locks held until the transaction ends. Locks are always taken in the same order
+	(practitioner, then patient) so two bookings cannot deadlock each other.
+	"""
+	if practitioner:
+		frappe.db.get_value("Healthcare Practitioner", practitioner, "name", for_update=True)
+	if patient:
+		frappe.db.get_value("Patient", patient, "name", for_update=True)
+
+
+def get_service_unit_capacity(service_unit):
+	allow_overlap, capacity = frappe.get_cached_value(
+		"Healthcare Service Unit", service_unit, ["overlap_appointments", "service_unit_capacity"]
+	) or (0, 0)
+	return cint(allow_overlap), cint(capacity) or 1
@@ -1086,7 +1086,6 @@ let check_and_set_availability = function(frm) {
 
 	function get_slots(slot_details, fee_validity, appointment_date) {
 		let slot_html = '';
-		let appointment_count = 0;
 		let disabled = false;
 		let start_str, slot_start_time, slot_end_time, interval, count, count_class, tool_tip, available_slots;
 
@@ -1117,7 +1116,6 @@ let check_and_set_availability = function(frm) {
 				slot_html += '</div><br>';
 
 				slot_html += slot_info.avail_slot.map(slot => {
-						appointment_count = 0;
 						disabled = false;
 						count_class = tool_tip = '';
 						start_str = slot.from_time;
@@ -1125,92 +1123,26 @@ let check_and_set_availability = function(frm) {
 						slot_end_time = moment(slot.to_time, 'HH:mm:ss');
 						interval = (slot_end_time - slot_start_time) / 60000 | 0;
 
+						// free, occupied and unavailable are precomputed by the slot availability index
 						let now = moment();
-						let booked_moment = "";
 						if((now.format("YYYY-MM-DD") == appointment_date) && (slot_start_time.isBefore(now) && !slot.maximum_appointments)){
 							disabled = true;
-						} else {
-							slot_info.appointments.forEach((booked) => {
-								// Get the start time of the booked appointment
-								booked_moment = moment(booked.appointment_time, 'HH:mm:ss');
-								
-								// Get the end time - either from explicit end_time or calculated from duration
-								let end_time;
-								if (booked.end_time) {
-									// Use explicit end time if available (block appointments)
-									end_time = moment(booked.end_time, 'HH:mm:ss');
-								} else {
-									// Otherwise calculate from duration
-									end_time = booked_moment.clone().add(booked.duration, 'minutes');
-								}
-
-								// Special handling for Unavailable appointments
-								if (booked.status === "Unavailable" && booked.appointment_type === "Unavailable") {
-									if (slot_start_time.isBefore(end_time) && slot_end_time.isAfter(booked_moment)) {
-										disabled = true;
-										tool_tip = __("Practitioner unavailable at this time");
-										return false;
-									}
-								}
-
-								// Handle maximum appointments capacity
-								if (slot.maximum_appointments) {
-									if (booked.appointment_date == appointment_date) {
-										appointment_count++;
-									}
-								}
-								
-								// Check if the slot time matches exactly with a booked appointment
-								if (booked_moment.isSame(slot_start_time) || booked_moment.isBetween(slot_start_time, slot_end_time)) {
-									if (booked.duration == 0) {
-										disabled = true;
-										return false;
-									}
-								}
-
-								// Overlap checks
-								if (slot_info.allow_overlap != 1) {
-									// Check if the current slot overlaps with any booked appointment
-									// This handles the case where a block appointment might span multiple slots
-									let slot_overlaps_with_booked = (
-										// Slot starts during the booked appointment
-										(slot_start_time.isSameOrAfter(booked_moment) && slot_start_time.isBefore(end_time)) ||
-										// Slot ends during the booked appointment
-										(slot_end_time.isAfter(booked_moment) && slot_end_time.isSameOrBefore(end_time)) ||
-										// Slot completely contains the booked appointment
-										(slot_start_time.isSameOrBefore(booked_moment) && slot_end_time.isSameOrAfter(end_time))
-									);
-									
-									if (slot_overlaps_with_booked) {
-										disabled = true;
-										return false;
-									}
-								} else {
-									if (slot_start_time.isBefore(end_time) && slot_end_time.isAfter(booked_moment)) {
-										appointment_count++;
-									}
-									if (appointment_count >= slot_info.service_unit_capacity) {
-										disabled = true;
-										return false;
-									}
-								}
-							});
+						} else if (slot.unavailable) {
+							disabled = true;
+							tool_tip = __("Practitioner unavailable at this time");
+						} else if (!slot.free) {
+							disabled = true;
 						}
 						if (slot_info.allow_overlap == 1 && slot_info.service_unit_capacity > 1) {
-							available_slots = slot_info.service_unit_capacity - appointment_count;
+							available_slots = slot.free;
 							count = `${(available_slots > 0 ? available_slots : __('Full'))}`;
 							count_class = `${(available_slots > 0 ? 'badge-success' : 'badge-danger')}`;
 							tool_tip =`${available_slots} ${__('slots available for booking')}`;
 						}
 
 						if (slot.maximum_appointments) {
-							if (appointment_count >= slot.maximum_appointments) {
-								disabled = true;
-							}
-							else {
-								disabled = false;
-							}
-							available_slots = slot.maximum_appointments - appointment_count;
+							disabled = slot.unavailable || !slot.free;
+							available_slots = slot.free;
 							count = `${(available_slots > 0 ? available_slots : __('Full'))}`;
 							count_class = `${(available_slots > 0 ? 'badge-success' : 'badge-danger')}`;
 							return `<button class="btn btn-secondary" data-name=${start_str}
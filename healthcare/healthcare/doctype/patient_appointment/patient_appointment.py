@@ -20,10 +20,23 @@ from healthcare.healthcare.doctype.fee_validity.fee_validity import (
 	get_fee_validity,
 	manage_fee_validity,
 )
+from healthcare.healthcare.doctype.healthcare_billable_item.healthcare_billable_item import (
+	update_billable_items,
+)
 from healthcare.healthcare.doctype.healthcare_settings.healthcare_settings import (
 	get_income_account,
 	get_receivable_account,
 )
+from healthcare.healthcare.doctype.patient_appointment.appointment_overlap import (
+	AppointmentIntervals,
+	get_interval,
+	get_service_unit_capacity,
+	lock_booking_resources,
+)
+from healthcare.healthcare.doctype.practitioner_slot_availability.practitioner_slot_availability import (
+	get_slot_index,
+	update_slot_index,
+)
 from healthcare.healthcare.utils import get_appointment_billing_item_and_rate
 
 
@@ -76,6 +89,8 @@ class PatientAppointment(Document):
 		self.set_appointment_datetime()
 
 	def on_update(self):
+		self.update_slot_availability()
+
 		# Skip fee validity updates for unavailability appointments
 		if self.is_unavailability:
 			return
@@ -86,16 +101,45 @@ class PatientAppointment(Document):
 		):
 			update_fee_validity(self)
 
+	def after_delete(self):
+		update_slot_index(self.appointment_date, self.practitioner, self.service_unit)
+
+	def update_slot_availability(self):
+		old_doc = self.get_doc_before_save()
+		if old_doc and not any(
+			old_doc.get(field) != self.get(field)
+			for field in (
+				"practitioner",
+				"service_unit",
+				"appointment_date",
+				"appointment_time",
+				"duration",
+				"end_time",
+				"status",
+			)
+		):
+			return
+
+		update_slot_index(self.appointment_date, self.practitioner, self.service_unit)
+		if old_doc and (
+			old_doc.appointment_date,
+			old_doc.practitioner,
+			old_doc.service_unit,
+		) != (self.appointment_date, self.practitioner, self.service_unit):
+			update_slot_index(old_doc.appointment_date, old_doc.practitioner, old_doc.service_unit)
+
 	def after_insert(self):
 		# Create calendar events for all appointments, including unavailability
 		if self.appointment_type == "Unavailable":
 			# Special case for unavailability events
 			self.insert_unavailability_calendar_event()
 		else:
-			# Normal appointments
-			self.insert_calendar_event()
-			# Send confirmation only for normal appointments
-			send_confirmation_msg(self)
+			# Normal appointments, events of a recurring series are inserted together afterwards
+			if not self.flags.defer_calendar_event:
+				self.insert_calendar_event()
+			# Send confirmation only for normal appointments, a recurring series confirms once booked
+			if not self.flags.defer_confirmation:
+				send_confirmation_msg(self)
 		
 		self.update_prescription_details()
 		self.set_payment_details()
@@ -396,188 +440,50 @@ class PatientAppointment(Document):
 		if not self.practitioner:
 			return
 
-		# Calculate end time based on duration or directly from end_time field
-		if self.end_time:
-			# Use the end_time directly if it's set
-			end_time = datetime.combine(
-				getdate(self.appointment_date), get_time(self.end_time)
+		# appointments of a recurring series are validated against intervals preloaded for the series
+		intervals = (self.flags.series_intervals or {}).get(getdate(self.appointment_date))
+		if not intervals:
+			# hold the practitioner and patient until commit so concurrent bookings are checked one after another
+			lock_booking_resources(self.practitioner, self.patient)
+			intervals = AppointmentIntervals(
+				self.appointment_date,
+				practitioner=self.practitioner,
+				patient=self.patient,
+				exclude=self.name,
+				for_update=True,
 			)
-		else:
-			# Otherwise calculate from duration
-			end_time = datetime.combine(
-				getdate(self.appointment_date), get_time(self.appointment_time)
-			) + timedelta(minutes=flt(self.duration))
-
-		# Check for overlaps with unavailable time slots (block appointments marked as Unavailable)
-		unavailable_appointments = frappe.get_all(
-			"Patient Appointment",
-			filters={
-				"appointment_date": self.appointment_date,
-				"name": ["!=", self.name],
-				"status": "Unavailable",
-				"appointment_type": "Unavailable",
-				"practitioner": self.practitioner,
-			},
-			fields=["name", "appointment_time", "duration", "end_time"]
-		)
-		
-		for existing in unavailable_appointments:
-			if not self.status == "Unavailable":  # Only regular appointments need to avoid unavailable slots
-				# Get existing appointment time boundaries
-				existing_start_time = get_time(existing.appointment_time)
-				
-				# Calculate or get end time
-				if existing.end_time:
-					existing_end_time = get_time(existing.end_time)
-				else:
-					existing_start_dt = datetime.combine(getdate(self.appointment_date), existing_start_time)
-					existing_end_dt = existing_start_dt + timedelta(minutes=flt(existing.duration or 0))
-					existing_end_time = existing_end_dt.time()
-				
-				# Get current appointment time boundaries
-				current_start_time = get_time(self.appointment_time)
-				current_end_time = end_time.time()
-				
-				# Check for overlap conditions
-				overlap = False
-				
-				# Condition 1: Current appointment starts during existing appointment
-				if (existing_start_time <= current_start_time < existing_end_time):
-					overlap = True
-				
-				# Condition 2: Current appointment ends during existing appointment
-				elif (existing_start_time < current_end_time <= existing_end_time):
-					overlap = True
-				
-				# Condition 3: Current appointment contains existing appointment
-				elif (current_start_time <= existing_start_time and current_end_time >= existing_end_time):
-					overlap = True
-				
-				# Condition 4: Start times are exactly the same
-				elif (current_start_time == existing_start_time):
-					overlap = True
-				
-				if overlap:
-					frappe.throw(
-						_("The practitioner {0} is already marked as unavailable during this time (see appointment {1})").format(
-							frappe.bold(self.practitioner),
-							frappe.bold(existing.name)
-						),
-						OverlapError,
-					)
+		start, end = get_interval(self.appointment_time, self.duration, self.end_time)
 
-		# Modified SQL query to include end_time check for better overlap detection
-		# This will check for overlaps using a range comparison that handles block appointments properly
-		overlapping_appointments = frappe.db.sql(
-			"""
-			SELECT
-				name, practitioner, patient, appointment_time, duration, service_unit, status, appointment_type,
-				end_time
-			FROM
-				`tabPatient Appointment`
-			WHERE
-				appointment_date=%(appointment_date)s AND name!=%(name)s AND status NOT IN ("Closed", "Cancelled") AND
-				(
-					/* Regular overlap check for patient and practitioner with end_time support */
-					(
-						(practitioner=%(practitioner)s OR patient=%(patient)s) AND
-						(
-							/* Case 1: Using explicitly set end_time if available */
-							(
-								end_time IS NOT NULL AND (
-									/* Our start is during their time block */
-									(%(appointment_time)s >= appointment_time AND %(appointment_time)s < end_time) OR
-									/* Their start is during our time block */
-									(appointment_time >= %(appointment_time)s AND appointment_time < %(end_time)s) OR
-									/* Exactly matching start times */
-									(appointment_time = %(appointment_time)s)
-								)
-							)
-							OR
-							/* Case 2: Using duration-based calculation when end_time not available */
-							(
-								end_time IS NULL AND (
-									(appointment_time<%(appointment_time)s AND appointment_time + INTERVAL duration MINUTE>%(appointment_time)s) OR
-									(appointment_time>%(appointment_time)s AND appointment_time<%(end_time)s) OR
-									(appointment_time=%(appointment_time)s)
-								)
-							)
-						)
-					)
-					OR
-					/* Special check for unavailable slots for this practitioner with end_time support */
-					(
-						practitioner=%(practitioner)s AND status="Unavailable" AND appointment_type="Unavailable" AND
-						(
-							/* Case 1: Using explicitly set end_time if available */
-							(
-								end_time IS NOT NULL AND (
-									/* Our start is during their time block */
-									(%(appointment_time)s >= appointment_time AND %(appointment_time)s < end_time) OR
-									/* Their start is during our time block */
-									(appointment_time >= %(appointment_time)s AND appointment_time < %(end_time)s) OR
-									/* Exactly matching start times */
-									(appointment_time = %(appointment_time)s)
-								)
-							)
-							OR
-							/* Case 2: Using duration-based calculation when end_time not available */
-							(
-								end_time IS NULL AND (
-									(appointment_time<%(appointment_time)s AND appointment_time + INTERVAL duration MINUTE>%(appointment_time)s) OR
-									(appointment_time>%(appointment_time)s AND appointment_time<%(end_time)s) OR
-									(appointment_time=%(appointment_time)s)
-								)
-							)
-						)
-					)
+		if not self.is_unavailability:
+			# regular appointments cannot be booked in a time marked as unavailable
+			unavailable_appointments = intervals.get_unavailability(start, end)
+			if unavailable_appointments:
+				frappe.throw(
+					_(
+						"The practitioner {0} is not available during this time due to an unavailability record {1}"
+					).format(
+						frappe.bold(self.practitioner),
+						frappe.bold(", ".join([appointment.name for appointment in unavailable_appointments])),
+					),
+					OverlapError,
 				)
-			""",
-			{
-				"appointment_date": self.appointment_date,
-				"name": self.name,
-				"practitioner": self.practitioner,
-				"patient": self.patient,
-				"appointment_time": self.appointment_time,
-				"end_time": end_time.time().strftime("%H:%M:%S")
-			},
-			as_dict=True,
-		)
 
+		overlapping_appointments = intervals.get_conflicts(start, end)
 		if not overlapping_appointments:
 			return  # No overlaps, nothing to validate!
 
-		# Check for unavailable appointments specifically
-		unavailable_appointments = [appt for appt in overlapping_appointments 
-									if appt.status == "Unavailable" and appt.appointment_type == "Unavailable"
-									and appt.practitioner == self.practitioner]
-		
-		if unavailable_appointments and self.appointment_type != "Unavailable":
-			# This is a regular appointment overlapping with an unavailability period
-			frappe.throw(
-				_("The practitioner {0} is not available during this time due to an unavailability record {1}").format(
-					frappe.bold(self.practitioner), 
-					frappe.bold(", ".join([appointment["name"] for appointment in unavailable_appointments]))
-				),
-				OverlapError,
-			)
-
 		if self.service_unit:  # validate service unit capacity if overlap enabled
-			allow_overlap, service_unit_capacity = frappe.get_value(
-				"Healthcare Service Unit", self.service_unit, ["overlap_appointments", "service_unit_capacity"]
-			)
+			allow_overlap, service_unit_capacity = get_service_unit_capacity(self.service_unit)
 			if allow_overlap:
-				service_unit_appointments = list(
-					filter(
-						lambda appointment: appointment["service_unit"] == self.service_unit
-						and appointment["patient"] != self.patient,
-						overlapping_appointments,
-					)
-				)
-				if len(service_unit_appointments) >= (service_unit_capacity or 1):
+				service_unit_appointments = [
+					appointment
+					for appointment in overlapping_appointments
+					if appointment.service_unit == self.service_unit and appointment.patient != self.patient
+				]
+				if len(service_unit_appointments) >= service_unit_capacity:
 					frappe.throw(
 						_("Not allowed, {} cannot exceed maximum capacity {}").format(
-							frappe.bold(self.service_unit), frappe.bold(service_unit_capacity or 1)
+							frappe.bold(self.service_unit), frappe.bold(service_unit_capacity)
 						),
 						MaximumCapacityError,
 					)
@@ -591,7 +497,7 @@ class PatientAppointment(Document):
 		if overlapping_appointments:
 			frappe.throw(
 				_("Not allowed, cannot overlap appointment {}").format(
-					frappe.bold(", ".join([appointment["name"] for appointment in overlapping_appointments]))
+					frappe.bold(", ".join([appointment.name for appointment in overlapping_appointments]))
 				),
 				OverlapError,
 			)
@@ -1072,19 +978,13 @@ def get_availability_data(date, practitioner, appointment):
 	date = getdate(date)
 	weekday = date.strftime("%A")
 
-	practitioner_doc = frappe.get_doc("Healthcare Practitioner", practitioner)
+	practitioner_doc = frappe.db.get_value(
+		"Healthcare Practitioner", practitioner, ["name", "employee", "user_id"], as_dict=True
+	)
 
 	check_employee_wise_availability(date, practitioner_doc)
 
-	if practitioner_doc.practitioner_schedules:
-		slot_details = get_available_slots(practitioner_doc, date)
-	else:
-		frappe.throw(
-			_(
-				"{0} does not have a Healthcare Practitioner Schedule. Add it in Healthcare Practitioner master"
-			).format(practitioner),
-			title=_("Practitioner Schedule Not Found"),
-		)
+	slot_details = get_indexed_slot_details(practitioner, date)
 
 	if not slot_details:
 		# TODO: return available slots in nearby dates
@@ -1242,6 +1142,44 @@ def get_available_slots(practitioner_doc, date):
 	return slot_details
 
 
+def get_indexed_slot_details(practitioner, date):
+	"""
+	Group the practitioner's indexed slots on `date` per schedule and service unit,
+	each slot carries its capacity, occupied and free counts
+	"""
+	slot_details = {}
+	for slot in get_slot_index(practitioner, date):
+		key = (slot.practitioner_schedule, slot.service_unit)
+		if key not in slot_details:
+			slot_details[key] = {
+				"slot_name": slot.practitioner_schedule,
+				"service_unit": slot.service_unit,
+				"avail_slot": [],
+				"appointments": [],
+				"allow_overlap": slot.allow_overlap,
+				"service_unit_capacity": 0,
+				"tele_conf": slot.tele_conf,
+			}
+
+		if slot.allow_overlap and not slot.maximum_appointments:
+			slot_details[key]["service_unit_capacity"] = slot.capacity
+
+		slot_details[key]["avail_slot"].append(
+			{
+				"from_time": slot.from_time,
+				"to_time": slot.to_time,
+				"duration": slot.duration,
+				"maximum_appointments": slot.maximum_appointments,
+				"capacity": slot.capacity,
+				"occupied": slot.occupied,
+				"free": slot.free,
+				"unavailable": slot.unavailable,
+			}
+		)
+
+	return list(slot_details.values())
+
+
 def validate_practitioner_schedules(schedule_entry, practitioner):
 	if schedule_entry.schedule:
 		if not schedule_entry.service_unit:
@@ -1276,6 +1214,10 @@ def update_status(appointment_id, status):
 			# Instead of saving the document which tries to modify set_only_once fields,
 			# directly update the status in the database
 			frappe.db.set_value("Patient Appointment", appointment_id, "status", "Cancelled")
+			update_slot_index(
+				appointment_doc.appointment_date, appointment_doc.practitioner, appointment_doc.service_unit
+			)
+			update_billable_items(appointment_doc)
 
 			# Update the calendar event if it exists
 			if appointment_doc.event:
@@ -1338,29 +1280,75 @@ def make_encounter(source_name, target_doc=None):
 	return doc
 
 
+# upper bounds so a backlog of due reminders is spread over several scheduler ticks
+REMINDER_BATCH_SIZE = 50
+MAX_REMINDERS_PER_TICK = 500
+
+
 def send_appointment_reminder():
-	if frappe.db.get_single_value("Healthcare Settings", "send_appointment_reminder"):
-		remind_before = datetime.strptime(
-			frappe.db.get_single_value("Healthcare Settings", "remind_before"), "%H:%M:%S"
-		)
-		reminder_dt = datetime.now() + timedelta(
-			hours=remind_before.hour, minutes=remind_before.minute, seconds=remind_before.second
+	settings = frappe.get_cached_doc("Healthcare Settings")
+	if not settings.send_appointment_reminder:
+		return
+
+	remind_before = get_time(settings.remind_before or "00:00:00")
+	reminder_dt = datetime.now() + timedelta(
+		hours=remind_before.hour, minutes=remind_before.minute, seconds=remind_before.second
+	)
+
+	# due appointments with their patient's mobile in one query
+	appointment = frappe.qb.DocType("Patient Appointment")
+	patient = frappe.qb.DocType("Patient")
+	appointments = (
+		frappe.qb.from_(appointment)
+		.left_join(patient)
+		.on(patient.name == appointment.patient)
+		.select(appointment.star, patient.mobile.as_("patient_mobile"))
+		.where(appointment.appointment_datetime.between(datetime.now(), reminder_dt))
+		.where(appointment.reminded == 0)
+		.where(appointment.status.notin(["Cancelled", "Needs Rescheduling", "Unavailable"]))
+		.orderby(appointment.appointment_datetime)
+		.limit(MAX_REMINDERS_PER_TICK)
+	).run(as_dict=True)
+
+	if not appointments:
+		return
+
+	template = settings.appointment_reminder_msg or ""
+	messages = []
+	for doc in appointments:
+		if not doc.patient_mobile:
+			continue
+
+		context = {"doc": doc, "alert": doc, "comments": None}
+		if doc.get("_comments"):
+			context["comments"] = json.loads(doc.get("_comments"))
+		messages.append(
+			{"number": doc.patient_mobile, "message": frappe.render_template(template, context)}
 		)
 
-		appointment_list = frappe.db.get_all(
-			"Patient Appointment",
-			{
-				"appointment_datetime": ["between", (datetime.now(), reminder_dt)],
-				"reminded": 0,
-				"status": ["not in", ["Cancelled", "Needs Rescheduling", "Unavailable"]],
-			},
+	# marked before sending so the next tick never picks them up again
+	(
+		frappe.qb.update(appointment)
+		.set(appointment.reminded, 1)
+		.where(appointment.name.isin([doc.name for doc in appointments]))
+	).run()
+
+	for i in range(0, len(messages), REMINDER_BATCH_SIZE):
+		frappe.enqueue(
+			"healthcare.healthcare.doctype.patient_appointment.patient_appointment.send_reminder_batch",
+			queue="short",
+			messages=messages[i : i + REMINDER_BATCH_SIZE],
+			enqueue_after_commit=True,
 		)
 
-		for appointment in appointment_list:
-			doc = frappe.get_doc("Patient Appointment", appointment.name)
-			message = frappe.db.get_single_value("Healthcare Settings", "appointment_reminder_msg")
-			send_message(doc, message)
-			frappe.db.set_value("Patient Appointment", doc.name, "reminded", 1)
+
+def send_reminder_batch(messages):
+	"""Send rendered appointment reminders from a background job, one failing number does not stop the batch"""
+	for message in messages:
+		try:
+			send_sms([message.get("number")], message.get("message"), success_msg=False)
+		except Exception:
+			frappe.log_error(frappe.get_traceback(), _("Appointment Reminder Message Not Sent"))
 
 
 def send_message(doc, message):
@@ -1530,60 +1518,48 @@ def create_therapy_sessions(appointment, therapy_types):
 
 
 def update_appointment_status():
-	def set_status(appointment_doc):
-		today = getdate()
-		appointment_date = getdate(appointment_doc.appointment_date)
-
-		# If this is an unavailability appointment, always keep it as "Unavailable"
-		if appointment_doc.appointment_type == "Unavailable":
-			if appointment_doc.status != "Cancelled" and appointment_doc.status != "Unavailable":
-				return"Unavailable"
-			return
-		
-		# For new appointments, set default status based on date
-		if appointment_doc.is_new():
-			if appointment_date == today:
-				return "Confirmed"
-			elif appointment_date > today:
-				return "Scheduled"
-			else:
-				return "No Show"
-			return
-			
-		# If appointment is already marked as "Needs Rescheduling", we should check if it has been rescheduled
-		if appointment_doc.status == "Needs Rescheduling" and appointment_doc.status != "Cancelled" and appointment_doc.status != 'Closed':
-			# If this has been modified and saved, it means the appointment was rescheduled
-			if appointment_doc.modified != appointment_doc.creation:
-				if appointment_date > today:
-					return "Scheduled"
-				elif appointment_date == today:
-					return "Confirmed"
-				return
-			return
-
-		# If appointment is created for today set status as Open else Scheduled
-		if appointment_date == today and appointment_doc.status != 'Closed':
-			return "Confirmed"
-
-		elif appointment_date > today and appointment_doc.status not in ["Scheduled", "Confirmed", "Cancelled"]:
-			return "Scheduled"
-
-		elif appointment_date < today and appointment_doc.status not in ["No Show", "Cancelled"]:
-			return "No Show"
+	"""
+	Move open appointments to the status matching their date with a few set based updates,
+	only rows whose status actually changes are written
+	:return: dict of number of appointments moved to each status
+	"""
+	appointment = frappe.qb.DocType("Patient Appointment")
+	today = getdate()
 
-	
-	# update the status of appointments daily
-	appointments = frappe.get_all(
-		"Patient Appointment", {"status": ("not in", ["Closed", "Cancelled", "Needs Rescheduling", "Unavailable"])}
+	open_appointment = appointment.status.notin(
+		["Closed", "Cancelled", "Needs Rescheduling", "Unavailable"]
 	)
+	regular_appointment = open_appointment & (
+		appointment.appointment_type.isnull() | (appointment.appointment_type != "Unavailable")
+	)
+	transitions = {
+		"Unavailable": open_appointment & (appointment.appointment_type == "Unavailable"),
+		"Confirmed": regular_appointment
+		& (appointment.appointment_date == today)
+		& (appointment.status != "Confirmed"),
+		"Scheduled": regular_appointment
+		& (appointment.appointment_date > today)
+		& appointment.status.notin(["Scheduled", "Confirmed"]),
+		"No Show": regular_appointment
+		& (appointment.appointment_date < today)
+		& (appointment.status != "No Show"),
+	}
 
-	for appointment in appointments:
-		appointment_doc = frappe.get_doc("Patient Appointment", appointment.name)
-		status = set_status(appointment_doc)
-		if status:
-			appointment_doc.db_set("status" , status, update_modified=False)
+	moved = {}
+	for status, condition in transitions.items():
+		names = frappe.qb.from_(appointment).select(appointment.name).where(condition).run(pluck=True)
+		for i in range(0, len(names), 1000):
+			# condition is repeated in case an appointment was updated meanwhile
+			(
+				frappe.qb.update(appointment)
+				.set(appointment.status, status)
+				.where(appointment.name.isin(names[i : i + 1000]) & condition)
+			).run()
+		moved[status] = len(names)
+
+	frappe.logger("healthcare").info(f"Daily appointment status update: {moved}")
+	return moved
 
-	
 
 # Unavailability related methods
 
@@ -1733,6 +1709,7 @@ def cancel_unavailability_appointment(appointment_name):
 	# Instead of saving the document which tries to modify set_only_once fields,
 	# directly update the status in the database
 	frappe.db.set_value("Patient Appointment", appointment_name, "status", "Cancelled")
+	update_slot_index(appointment.appointment_date, appointment.practitioner, appointment.service_unit)
 	
 	# Cancel the linked event if it exists
 	if appointment.event:
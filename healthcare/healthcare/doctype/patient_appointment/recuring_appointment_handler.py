@@ -1,58 +1,204 @@
 import frappe
 import json
-from frappe.utils import getdate, add_days, add_months, add_years, date_diff
+from frappe import _
+from frappe.model.naming import make_autoname
+from frappe.query_builder import Case
+from frappe.utils import getdate, add_days, add_months, add_years, date_diff, flt, get_time, now
 from datetime import timedelta
 from healthcare.healthcare.doctype.patient_appointment.patient_appointment import (
-    check_employee_wise_availability,
     validate_practitioner_schedules,
     check_sales_invoice_exists,
-    cancel_sales_invoice
+    cancel_sales_invoice,
+    send_confirmation_msg,
 
 )
 from datetime import datetime, timedelta
-from happiest_frappe.happiest_frappe.api.api import get_available_slots
 from frappe.email.doctype.notification.notification import Notification, get_context
+from erpnext.setup.doctype.employee.employee import get_holiday_list_for_employee
+from healthcare.healthcare.doctype.patient_appointment.appointment_overlap import (
+    IntervalTree,
+    get_interval,
+    get_series_intervals,
+    lock_booking_resources,
+)
+from healthcare.healthcare.doctype.practitioner_slot_availability.practitioner_slot_availability import (
+    get_practitioner_schedules,
+)
 
 
 @frappe.whitelist()
 def create_recurring_appointments(data):
     data = frappe._dict(json.loads(data))
-
-    repeat_on = data.repeat_on
-    repeat_interval = data.repeat_interval or 1
-    repeat_till = getdate(data.repeat_till)
-    base_date = getdate(data.from_date)
-    max_occurrences = data.max_occurrences
-    created = []
     schedule_details = get_recurring_appointment_dates(data)
 
     if not schedule_details.get("dates"):
         frappe.throw("Slots are not available")
-    for row in schedule_details.get("dates"):
-        if not row.get("booking_flage"):
-            doc = frappe.get_doc({
-                "doctype" : "Patient Appointment",
-                "appointment_date" : row.get("date"),
-                "patient" : data.patient,
-                "practitioner" : data.practitioner,
-                "appointment_time" : row.get("from_time"),
-                "end_time" : row.get("to_time"),
-                "service_unit" : data.service_unit,
-                "recurring_appointments" : 1,
-                "appointment_type" : data.appointment_type,
-                "therapy_plan" : data.therapy_plan if data.appointment_type == 'Therapy Session' else ''
-            })
-
-            if data.appointment_type == 'Therapy Session' and data.therapy_plan:
-                therapy = frappe.get_doc("Therapy Plan", data.therapy_plan)
-                for d in therapy.therapy_plan_details:
-                    doc.append("therapy_types", {
-                        "therapy_type" : d.therapy_type,
-                        "no_of_sessions" : d.no_of_sessions
-                    })
+
+    results = insert_recurring_series(data, schedule_details.get("dates"))
+    frappe.publish_realtime(
+        "recurring_appointments_booked", {"results": results}, user=frappe.session.user
+    )
+    return results
+
+
+def insert_recurring_series(data, dates):
+    """
+    Insert the appointments of a recurring series as one unit. All dates are validated
+    against intervals preloaded for the series, if any date fails the whole series is
+    rolled back. Calendar Events and confirmations are only made once every date is booked.
+    :return: list of {date, status, appointment, message} per date
+    """
+    results = []
+    rows = []
+    for row in dates:
+        if row.get("booking_flage"):
+            results.append({"date": row.get("date"), "status": "Skipped", "message": _("Already booked")})
+        else:
+            rows.append(row)
+
+    therapy_types = []
+    if data.appointment_type == "Therapy Session" and data.therapy_plan:
+        therapy_types = frappe.get_all(
+            "Therapy Plan Detail",
+            filters={"parent": data.therapy_plan, "parenttype": "Therapy Plan"},
+            fields=["therapy_type", "no_of_sessions"],
+            order_by="idx",
+        )
+
+    lock_booking_resources(data.practitioner, data.patient)
+    series_intervals = get_series_intervals(
+        [row.get("date") for row in rows], practitioner=data.practitioner, patient=data.patient
+    )
+
+    frappe.db.savepoint("recurring_series")
+    appointments, failed = [], False
+    for i, row in enumerate(rows, 1):
+        doc = frappe.get_doc({
+            "doctype" : "Patient Appointment",
+            "appointment_date" : row.get("date"),
+            "patient" : data.patient,
+            "practitioner" : data.practitioner,
+            "appointment_time" : row.get("from_time"),
+            "end_time" : row.get("to_time"),
+            "service_unit" : data.service_unit,
+            "recurring_appointments" : 1,
+            "appointment_type" : data.appointment_type,
+            "therapy_plan" : data.therapy_plan if data.appointment_type == 'Therapy Session' else '',
+            "therapy_types" : [
+                {"therapy_type" : d.therapy_type, "no_of_sessions" : d.no_of_sessions}
+                for d in therapy_types
+            ],
+        })
+        doc.flags.series_intervals = series_intervals
+        doc.flags.defer_calendar_event = True
+        doc.flags.defer_confirmation = True
+        try:
             doc.insert(ignore_permissions=True)
+            appointments.append(doc)
+            results.append({"date": row.get("date"), "status": "Created", "appointment": doc.name})
+        except frappe.ValidationError as e:
+            # keep validating the remaining dates to report every failure at once
+            failed = True
+            frappe.clear_messages()
+            results.append({"date": row.get("date"), "status": "Failed", "message": str(e)})
+
+        frappe.publish_progress(
+            i * 100 / len(rows),
+            title=_("Booking Appointments"),
+            description=_("{0} of {1} dates processed").format(i, len(rows)),
+        )
+
+    if failed:
+        frappe.db.rollback(save_point="recurring_series")
+        for result in results:
+            if result["status"] == "Created":
+                result.update({"status": "Rolled Back", "appointment": None})
+    else:
+        insert_calendar_events(appointments)
+        for appointment in appointments:
+            send_confirmation_msg(appointment)
+
+    return sorted(results, key=lambda result: getdate(result["date"]))
+
+
+def insert_calendar_events(appointments):
+    """Insert the calendar Events of the appointments of a series with one bulk insert each
+    for the events and their participants, same values as PatientAppointment.insert_calendar_event"""
+    appointments = [d for d in appointments if d.practitioner and d.appointment_type != "Unavailable"]
+    if not appointments:
+        return
+
+    practitioner = appointments[0].practitioner
+    google_calendar = frappe.db.get_value(
+        "Healthcare Practitioner", practitioner, "google_calendar"
+    ) or frappe.db.get_single_value("Healthcare Settings", "default_google_calendar")
+    colors = {}
+    timestamp, user = now(), frappe.session.user
+    autoname = frappe.get_meta("Event").autoname or "hash"
+    events, participants, event_names = [], [], {}
+
+    for appointment in appointments:
+        if appointment.appointment_type not in colors:
+            colors[appointment.appointment_type] = (
+                frappe.db.get_value("Appointment Type", appointment.appointment_type, "color")
+                if appointment.appointment_type
+                else ""
+            )
+
+        starts_on = datetime.combine(
+            getdate(appointment.appointment_date), get_time(appointment.appointment_time)
+        )
+        if appointment.end_time:
+            ends_on = datetime.combine(getdate(appointment.appointment_date), get_time(appointment.end_time))
+        else:
+            ends_on = starts_on + timedelta(minutes=flt(appointment.duration))
+
+        event = make_autoname(autoname, "Event")
+        event_names[appointment.name] = event
+        subject = f"{appointment.title} - {appointment.company}"
+        events.append((
+            event, timestamp, timestamp, user, user, subject, "Private",
+            colors[appointment.appointment_type], 1, starts_on, ends_on, "Open", 0, 0, 0,
+            google_calendar, subject, 0,
+        ))
+
+        references = [("Healthcare Practitioner", appointment.practitioner)]
+        if appointment.patient:
+            references.append(("Patient", appointment.patient))
+        for idx, (reference_doctype, reference_docname) in enumerate(references, 1):
+            participants.append((
+                frappe.generate_hash(length=10), timestamp, timestamp, user, user, event, "Event",
+                "event_participants", idx, reference_doctype, reference_docname,
+            ))
+
+    frappe.db.bulk_insert(
+        "Event",
+        [
+            "name", "creation", "modified", "owner", "modified_by", "subject", "event_type",
+            "color", "send_reminder", "starts_on", "ends_on", "status", "all_day",
+            "sync_with_google_calendar", "add_video_conferencing", "google_calendar",
+            "description", "pulled_from_google_calendar",
+        ],
+        events,
+    )
+    frappe.db.bulk_insert(
+        "Event Participants",
+        [
+            "name", "creation", "modified", "owner", "modified_by", "parent", "parenttype",
+            "parentfield", "idx", "reference_doctype", "reference_docname",
+        ],
+        participants,
+    )
 
-    return True
+    appointment = frappe.qb.DocType("Patient Appointment")
+    event = Case()
+    for appointment_name, event_name in event_names.items():
+        event = event.when(appointment.name == appointment_name, event_name)
+    (
+        frappe.qb.update(appointment)
+        .set(appointment.event, event)
+        .where(appointment.name.isin(list(event_names)))
+    ).run()
 
     
 def prepare_payload_for_email(self, doc, context):
@@ -90,14 +236,12 @@ def get_recurring_appointment_dates(data):
     repeat_till = getdate(data.repeat_till) if data.repeat_till else None
     base_date = getdate(data.from_date) 
     max_occurrences = data.max_occurrences
-    practitioner_doc = frappe.get_doc("Healthcare Practitioner", data.practitioner)
-    
+
     practitioner_schedule_list = []
-    for row in practitioner_doc.practitioner_schedules:
-        if row.service_unit == data.service_unit:
-            practitioner_schedule = frappe.get_doc("Practitioner Schedule", row.schedule)
-            for log in practitioner_schedule.time_slots:
-                practitioner_schedule_list.append(log)
+    for schedule in get_schedules(data.practitioner):
+        if schedule.service_unit == data.service_unit:
+            practitioner_schedule_list.extend(schedule.time_slots)
+    is_holiday = get_holiday_checker()
 
     week_checks = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday" ]
     week_day = {
@@ -161,7 +305,6 @@ def get_recurring_appointment_dates(data):
         if not available:
             next_date += timedelta(days=1)
             if repeat_till and getdate(next_date) >= getdate(repeat_till):
-                print(repeat_till, "repeat_till")
                 break
             
             weekday_name = next_date.strftime("%A")
@@ -177,17 +320,7 @@ def get_recurring_appointment_dates(data):
             continue
 
         # Check if the date is a holiday
-        holiday_list = frappe.db.sql(f"""
-                    Select hdl.name
-                    From `tabHoliday List` as hdl
-                    Left Join `tabHoliday` as hl ON hl.parent = hdl.name
-                    Where 
-                        hdl.from_date <= '{str(next_date)}' 
-                        and hdl.to_date >= '{str(next_date)}' 
-                        and hl.holiday_date = '{str(next_date)}'
-        """, as_dict=1)
-
-        if holiday_list:
+        if is_holiday(next_date):
             next_date += timedelta(days=1)
             continue
 
@@ -273,60 +406,174 @@ def get_recurring_appointment_dates(data):
 
 
 
+def get_schedules(practitioner):
+    """Enabled schedules of the practitioner with their time slots, empty if it has none"""
+    if not frappe.db.exists("Practitioner Service Unit Schedule", {"parent": practitioner}):
+        return []
+    return get_practitioner_schedules(practitioner)
+
+
+def get_holiday_checker():
+    """
+    Return a function telling whether a date is a holiday in any Holiday List,
+    holidays are loaded one year at a time as the planner reaches it
+    """
+    holidays, loaded_years = set(), set()
+
+    def is_holiday(date):
+        if date.year not in loaded_years:
+            holidays.update(get_holiday_dates(f"{date.year}-01-01", f"{date.year}-12-31"))
+            loaded_years.add(date.year)
+        return date in holidays
+
+    return is_holiday
+
+
+def get_holiday_dates(from_date, to_date, holiday_list=None):
+    """Return the holidays between from_date and to_date of holiday_list or of any Holiday List"""
+    holiday = frappe.qb.DocType("Holiday")
+    holiday_list_doctype = frappe.qb.DocType("Holiday List")
+    query = (
+        frappe.qb.from_(holiday)
+        .inner_join(holiday_list_doctype)
+        .on(holiday.parent == holiday_list_doctype.name)
+        .select(holiday.holiday_date)
+        .distinct()
+        .where(
+            holiday.holiday_date[getdate(from_date) : getdate(to_date)]
+            & (holiday_list_doctype.from_date <= holiday.holiday_date)
+            & (holiday_list_doctype.to_date >= holiday.holiday_date)
+        )
+    )
+    if holiday_list:
+        query = query.where(holiday_list_doctype.name == holiday_list)
+
+    return {getdate(d[0]) for d in query.run()}
+
+
 @frappe.whitelist()
 def get_availability(scheduled_details, practitioner, service_unit=None):
     """
-    requirement parameters : date, practitioner, appointment
-    Get availability data of 'practitioner' on 'date'
-    :param date: Date to check in schedule
+    Flag the dates of scheduled_details that are already booked for the practitioner.
+    Holidays, leaves, schedules and appointments of the whole range are loaded once
+    and the conflicts are computed in memory
+    :param scheduled_details: list of dicts with date, from_time and to_time
     :param practitioner: Name of the practitioner
-    :return: dict containing a list of available slots, list of appointments and time of appointments
+    :return: scheduled_details with booking_flage set on each row
     """
+    if not scheduled_details:
+        return scheduled_details
+
+    dates = sorted({getdate(schedule.get("date")) for schedule in scheduled_details})
+    check_employee_wise_availability_for_range(practitioner, dates)
+    appointments = get_appointment_intervals(practitioner, dates[0], dates[-1])
+
     for schedule in scheduled_details:
-        date = getdate(schedule.get("date"))
-        weekday = date.strftime("%A")
-
-        practitioner_doc = frappe.get_doc("Healthcare Practitioner", practitioner)
-
-        check_employee_wise_availability(date, practitioner_doc)
-
-        if practitioner_doc.practitioner_schedules:
-            service_unit = None
-            slot_details = get_available_slots(practitioner_doc, date, service_unit=service_unit)
-        
-        appointments = []
-        for row in slot_details:
-            for d in row.get("appointments"):
-                appointments.append(d)
-        
-        if appointments:
-            booked = False
-            for row in appointments:
-                time_obj = datetime.strptime(schedule.get("from_time"), "%H:%M").time()
-                from_time = timedelta(hours=time_obj.hour, minutes=time_obj.minute, seconds=time_obj.second)
-                time_obj = datetime.strptime(schedule.get("to_time"), "%H:%M").time()
-                to_time = timedelta(hours=time_obj.hour, minutes=time_obj.minute, seconds=time_obj.second)
-                
-                if (from_time <= row.get("appointment_time") < to_time):
-                    booked=True
-                if (from_time < row.get("end_time") <= to_time):
-                    booked=True 
-                if (from_time >= row.get("appointment_time") < to_time and 
-                    from_time < row.get("end_time") > to_time):
-                    booked=True
-                if (from_time >= row.get("appointment_time") < to_time and 
-                    from_time < row.get("end_time") <= to_time):
-                    booked=True
-                if booked:
-                    schedule.update({"booking_flage" : True})
-                    break
-            if not booked:
-                schedule.update({"booking_flage" : False})
-        else:
-            schedule.update({"booking_flage" : False})
-    
+        start, end = get_interval(schedule.get("from_time"), end_time=schedule.get("to_time"))
+        booked = appointments.get(getdate(schedule.get("date")))
+        schedule.update({"booking_flage": bool(booked and booked.overlapping(start, end))})
+
     return scheduled_details
 
+
+def check_employee_wise_availability_for_range(practitioner, dates):
+    """Same checks as check_employee_wise_availability for each of dates, in two queries"""
+    employee, user_id = frappe.db.get_value(
+        "Healthcare Practitioner", practitioner, ["employee", "user_id"]
+    )
+    if not employee and user_id:
+        employee = frappe.db.get_value("Employee", {"user_id": user_id}, "name")
+    if not employee:
+        return
+
+    holiday_list = get_holiday_list_for_employee(employee, raise_exception=False)
+    holidays = get_holiday_dates(dates[0], dates[-1], holiday_list) if holiday_list else set()
+
+    leaves = []
+    if "hrms" in frappe.get_installed_apps():
+        leaves = frappe.get_all(
+            "Leave Application",
+            filters={
+                "employee": employee,
+                "docstatus": 1,
+                "from_date": ["<=", dates[-1]],
+                "to_date": [">=", dates[0]],
+            },
+            fields=["from_date", "to_date", "half_day"],
+        )
+
+    for date in dates:
+        if date in holidays:
+            frappe.throw(_("{0} is a holiday").format(date), title=_("Not Available"))
+
+        for leave in leaves:
+            if getdate(leave.from_date) <= date <= getdate(leave.to_date):
+                if leave.half_day:
+                    frappe.throw(
+                        _("{0} is on a Half day Leave on {1}").format(practitioner, date),
+                        title=_("Not Available"),
+                    )
+                frappe.throw(
+                    _("{0} is on Leave on {1}").format(practitioner, date), title=_("Not Available")
+                )
+
+
+def get_appointment_intervals(practitioner, from_date, to_date):
+    """
+    Return {date: IntervalTree} of the appointments blocking the practitioner's schedules:
+    the practitioner's own appointments and, in service units that do not allow overlap,
+    the appointments of every practitioner. Days without a schedule slot are left out.
+    """
+    schedules = get_schedules(practitioner)
+    exclusive_units = {
+        schedule.service_unit
+        for schedule in schedules
+        if schedule.service_unit and not schedule.allow_overlap
+    }
+
+    or_filters = {"practitioner": practitioner}
+    if exclusive_units:
+        or_filters["service_unit"] = ["in", list(exclusive_units)]
+
+    appointments = {}
+    for appointment in frappe.get_all(
+        "Patient Appointment",
+        filters={
+            "appointment_date": ["between", [from_date, to_date]],
+            "status": ["!=", "Cancelled"],
+        },
+        or_filters=or_filters,
+        fields=[
+            "name",
+            "practitioner",
+            "service_unit",
+            "appointment_date",
+            "appointment_time",
+            "duration",
+            "end_time",
+        ],
+    ):
+        weekday = getdate(appointment.appointment_date).strftime("%A")
+        active_units = {
+            schedule.service_unit
+            for schedule in schedules
+            if any(slot.day == weekday for slot in schedule.time_slots)
+        }
+        if not active_units:
+            continue
+        if appointment.practitioner != practitioner and not (
+            appointment.service_unit in active_units and appointment.service_unit in exclusive_units
+        ):
+            continue
+
+        appointment.start, appointment.end = get_interval(
+            appointment.appointment_time, appointment.duration, appointment.end_time
+        )
+        appointments.setdefault(getdate(appointment.appointment_date), []).append(appointment)
+
+    return {date: IntervalTree(rows) for date, rows in appointments.items()}
+
+
 @frappe.whitelist()
 def get_service_unit_values(selected_practitioner):
     query=frappe.db.sql(
@@ -4,6 +4,7 @@
 
 
 import datetime
+from unittest.mock import patch
 
 import frappe
 from frappe.tests.utils import FrappeTestCase
@@ -16,6 +17,8 @@ from healthcare.healthcare.doctype.patient_appointment.patient_appointment impor
 	check_payment_reqd,
 	invoice_appointment,
 	make_encounter,
+	send_appointment_reminder,
+	update_appointment_status,
 	update_status,
 )
 
@@ -45,6 +48,45 @@ class TestPatientAppointment(FrappeTestCase):
 		encounter.cancel()
 		self.assertEqual(frappe.db.get_value("Patient Appointment", appointment.name, "status"), "Open")
 
+	def test_daily_appointment_status_update(self):
+		patient, practitioner = create_healthcare_docs()
+		frappe.db.set_single_value("Healthcare Settings", "show_payment_popup", 0)
+		past = create_appointment(patient, practitioner, add_days(nowdate(), -2))
+		future = create_appointment(patient, practitioner, add_days(nowdate(), 2))
+		frappe.db.set_value("Patient Appointment", past.name, "status", "Scheduled")
+		frappe.db.set_value("Patient Appointment", future.name, "status", "No Show")
+
+		moved = update_appointment_status()
+		self.assertEqual(moved["No Show"], 1)
+		self.assertEqual(moved["Scheduled"], 1)
+		self.assertEqual(frappe.db.get_value("Patient Appointment", past.name, "status"), "No Show")
+		self.assertEqual(frappe.db.get_value("Patient Appointment", future.name, "status"), "Scheduled")
+
+		# nothing left to move on the next run
+		self.assertFalse(any(update_appointment_status().values()))
+
+	def test_appointment_reminder_marks_due_appointments_in_bulk(self):
+		patient, practitioner = create_healthcare_docs()
+		frappe.db.set_single_value("Healthcare Settings", "show_payment_popup", 0)
+		frappe.db.set_single_value("Healthcare Settings", "send_appointment_reminder", 1)
+		frappe.db.set_single_value("Healthcare Settings", "remind_before", "02:00:00")
+		frappe.db.set_single_value(
+			"Healthcare Settings", "appointment_reminder_msg", "Reminder for {{ doc.patient_name }}"
+		)
+		due_datetime = now_datetime() + datetime.timedelta(hours=1)
+		due = create_appointment(
+			patient,
+			practitioner,
+			due_datetime.date(),
+			appointment_time=due_datetime.strftime("%H:%M:%S"),
+		)
+		later = create_appointment(patient, practitioner, add_days(nowdate(), 3))
+
+		send_appointment_reminder()
+		self.assertEqual(frappe.db.get_value("Patient Appointment", due.name, "reminded"), 1)
+		self.assertEqual(frappe.db.get_value("Patient Appointment", later.name, "reminded"), 0)
+		frappe.db.set_single_value("Healthcare Settings", "send_appointment_reminder", 0)
+
 	def test_start_encounter(self):
 		patient, practitioner = create_healthcare_docs()
 		frappe.db.set_single_value("Healthcare Settings", "show_payment_popup", 1)
@@ -515,6 +557,110 @@ class TestPatientAppointment(FrappeTestCase):
 		)
 		self.assertRaises(MaximumCapacityError, appointment.save)
 
+	def test_interval_tree_overlaps(self):
+		from healthcare.healthcare.doctype.patient_appointment.appointment_overlap import (
+			IntervalTree,
+			get_interval,
+		)
+
+		intervals = []
+		for name, start_time, duration in [
+			("A", "09:00:00", 15),
+			("B", "09:10:00", 30),
+			("C", "10:00:00", 0),
+			("D", "11:00:00", 60),
+		]:
+			start, end = get_interval(start_time, duration)
+			intervals.append(frappe._dict(name=name, start=start, end=end))
+		tree = IntervalTree(intervals)
+
+		def overlapping(start_time, duration):
+			return sorted(d.name for d in tree.overlapping(*get_interval(start_time, duration)))
+
+		self.assertEqual(overlapping("09:05:00", 10), ["A", "B"])
+		self.assertEqual(overlapping("09:40:00", 20), [])
+		# zero length appointments still occupy their start time
+		self.assertEqual(overlapping("10:00:00", 15), ["C"])
+		self.assertEqual(overlapping("08:00:00", 600), ["A", "B", "C", "D"])
+
+	def test_recurring_appointment_availability(self):
+		from healthcare.healthcare.doctype.patient_appointment.recuring_appointment_handler import (
+			get_availability,
+		)
+		from healthcare.healthcare.doctype.practitioner_slot_availability.test_practitioner_slot_availability import (
+			add_practitioner_schedule,
+		)
+
+		patient, practitioner = create_healthcare_docs(id=7)
+		service_unit = create_service_unit(id=7)
+		add_practitioner_schedule(practitioner, service_unit)
+		dates = [add_days(nowdate(), days) for days in (1, 2, 3)]
+		create_appointment(
+			patient, practitioner, dates[1], service_unit=service_unit, appointment_time="09:00"
+		)
+
+		scheduled_details = get_availability(
+			[{"date": date, "from_time": "09:10", "to_time": "09:25"} for date in dates], practitioner
+		)
+		self.assertEqual([d["booking_flage"] for d in scheduled_details], [False, True, False])
+
+	def test_recurring_series_is_atomic(self):
+		from healthcare.healthcare.doctype.patient_appointment.recuring_appointment_handler import (
+			insert_recurring_series,
+		)
+
+		frappe.db.set_single_value("Healthcare Settings", "show_payment_popup", 0)
+		frappe.db.set_single_value("Healthcare Settings", "send_appointment_confirmation", 1)
+		self.addCleanup(
+			frappe.db.set_single_value, "Healthcare Settings", "send_appointment_confirmation", 0
+		)
+		patient, practitioner = create_healthcare_docs(id=8)
+		data = frappe._dict(
+			patient=patient,
+			practitioner=practitioner,
+			appointment_type=create_appointment_type().name,
+		)
+		dates = [add_days(nowdate(), days) for days in (1, 2, 3)]
+		create_appointment(patient, practitioner, dates[1], appointment_time="09:00")
+
+		# one conflicting date rolls back the whole series, before any patient is notified
+		with patch(
+			"healthcare.healthcare.doctype.patient_appointment.patient_appointment.send_message"
+		) as send_message:
+			results = insert_recurring_series(
+				data, [{"date": date, "from_time": "09:00", "to_time": "09:15"} for date in dates]
+			)
+		send_message.assert_not_called()
+		self.assertEqual([d["status"] for d in results], ["Rolled Back", "Failed", "Rolled Back"])
+		self.assertEqual(
+			frappe.db.count(
+				"Patient Appointment", {"practitioner": practitioner, "recurring_appointments": 1}
+			),
+			0,
+		)
+
+		with patch(
+			"healthcare.healthcare.doctype.patient_appointment.patient_appointment.send_message"
+		) as send_message:
+			results = insert_recurring_series(
+				data,
+				[
+					{"date": date, "from_time": "09:00", "to_time": "09:15", "booking_flage": date == dates[1]}
+					for date in dates
+				],
+			)
+		self.assertEqual(send_message.call_count, 2)
+		self.assertEqual([d["status"] for d in results], ["Created", "Skipped", "Created"])
+		for result in (results[0], results[2]):
+			event = frappe.db.get_value("Patient Appointment", result["appointment"], "event")
+			self.assertTrue(event)
+			self.assertEqual(
+				frappe.get_all(
+					"Event Participants", {"parent": event}, pluck="reference_docname", order_by="idx"
+				),
+				[practitioner, patient],
+			)
+
 	def test_teleconsultation(self):
 		patient, practitioner = create_healthcare_docs()
 		appointment = create_appointment(patient, practitioner, nowdate())
@@ -3,16 +3,36 @@
 # For license information, please see license.txt
 
 
+import hashlib
 import json
 
 import frappe
 from frappe import _
+from frappe.model import no_value_fields
 from frappe.model.document import Document
 from frappe.model.mapper import get_mapped_doc
-from frappe.utils import add_days, getdate
+from frappe.utils import add_days, cint, getdate
 
+from healthcare.healthcare.doctype.healthcare_billable_item.healthcare_billable_item import (
+	BILLABLE_SOURCES,
+	sync_billable_items,
+)
 from healthcare.healthcare.utils import get_medical_codes
 
+# template fields read while building Service and Medication Requests
+ORDER_TEMPLATE_FIELDS = [
+	"item",
+	"staff_role",
+	"description",
+	"lab_test_description",
+	"patient_care_type",
+	"sample_collection_required",
+]
+
+MEDICATION_SEARCH_CACHE_KEY = "medication_search"
+# every searched prefix is cached under its own key, expired ones are dropped by redis
+MEDICATION_SEARCH_CACHE_TTL = 10 * 60
+
 
 class PatientEncounter(Document):
 	def validate(self):
@@ -182,53 +202,76 @@ class PatientEncounter(Document):
 				)
 
 	def make_service_request(self):
-		if self.lab_test_prescription:
-			for lab_test in self.lab_test_prescription:
-				if lab_test.observation_template:
-					template_doc = "Observation Template"
-					template = "observation_template"
-				elif lab_test.lab_test_code:
-					template_doc = "Lab Test Template"
-					template = "lab_test_code"
-				else:
-					continue
-				if not lab_test.service_request:
-					lab_template = frappe.get_doc(template_doc, lab_test.get(template))
-					order = self.get_order_details(lab_template, lab_test)
-					order.insert(ignore_permissions=True, ignore_mandatory=True)
-					order.submit()
-					lab_test.service_request = order.name
-
-		if self.procedure_prescription:
-			for procedure in self.procedure_prescription:
-				if not procedure.service_request:
-					procedure_template = frappe.get_doc("Clinical Procedure Template", procedure.procedure)
-					order = self.get_order_details(procedure_template, procedure)
-					order.insert(ignore_permissions=True, ignore_mandatory=True)
-					order.submit()
-					procedure.service_request = order.name
+		prescriptions = []
+		for lab_test in self.lab_test_prescription:
+			if lab_test.service_request:
+				continue
+			if lab_test.observation_template:
+				prescriptions.append((lab_test, "Observation Template", lab_test.observation_template))
+			elif lab_test.lab_test_code:
+				prescriptions.append((lab_test, "Lab Test Template", lab_test.lab_test_code))
 
-		if self.therapies:
-			for therapy in self.therapies:
-				if not therapy.service_request:
-					therapy_type = frappe.get_doc("Therapy Type", therapy.therapy_type)
-					order = self.get_order_details(therapy_type, therapy)
-					order.insert(ignore_permissions=True, ignore_mandatory=True)
-					order.submit()
-					therapy.service_request = order.name
+		for procedure in self.procedure_prescription:
+			if not procedure.service_request:
+				prescriptions.append((procedure, "Clinical Procedure Template", procedure.procedure))
+
+		for therapy in self.therapies:
+			if not therapy.service_request:
+				prescriptions.append((therapy, "Therapy Type", therapy.therapy_type))
+
+		templates = get_order_templates(prescriptions)
+		orders = [
+			(
+				line_item,
+				self.get_order_details(get_order_template(templates, template_dt, template), line_item),
+			)
+			for line_item, template_dt, template in prescriptions
+		]
+		self.submit_orders(orders, "service_request")
 
 	def make_medication_request(self):
-		if self.drug_prescription:
-			# make_medication_request
-			for drug in self.drug_prescription:
-				if (drug.medication or drug.drug_code) and not drug.medication_request:
-					medication = ""
-					if drug.medication:
-						medication = frappe.get_doc("Medication", drug.medication)
-					order = self.get_order_details(medication, drug, True)
-					order.insert(ignore_permissions=True, ignore_mandatory=True)
-					order.submit()
-					drug.medication_request = order.name
+		prescriptions = [
+			(drug, "Medication", drug.medication)
+			for drug in self.drug_prescription
+			if (drug.medication or drug.drug_code) and not drug.medication_request
+		]
+
+		templates = get_order_templates(prescriptions)
+		orders = [
+			(
+				drug,
+				self.get_order_details(
+					get_order_template(templates, "Medication", medication) if medication else "", drug, True
+				),
+			)
+			for drug, _template_dt, medication in prescriptions
+		]
+		self.submit_orders(orders, "medication_request")
+
+	def submit_orders(self, orders, fieldname):
+		"""
+		Insert the orders of the prescription rows as submitted documents and link them to the rows,
+		the billable items of the orders are synced once for the whole batch
+		:param orders: list of (prescription row, order)
+		:param fieldname: Field of the prescription rows to set the order name to
+		"""
+		if not orders:
+			return
+
+		patient = frappe.get_doc("Patient", self.patient)
+		for line_item, order in orders:
+			order.flags.patient = patient
+			order.flags.defer_billable_items = True
+			# submit on insert, one write per order
+			order.docstatus = 1
+			order.insert(ignore_permissions=True, ignore_mandatory=True)
+			line_item.set(fieldname, order.name)
+
+		doctype = orders[0][1].doctype
+		if doctype in BILLABLE_SOURCES:
+			sync_billable_items(
+				doctype, self.patient, self.company, names=[order.name for _line_item, order in orders]
+			)
 
 	def get_order_details(self, template_doc, line_item, medication_request=False):
 		order = frappe.get_doc(
@@ -295,6 +338,8 @@ class PatientEncounter(Document):
 			)
 
 		order.update({"order_description": description})
+		if template_doc:
+			order.flags.template = template_doc
 		return order
 
 	@frappe.whitelist()
@@ -597,6 +642,52 @@ class PatientEncounter(Document):
 				self.get(field).pop(idx)
 
 
+def get_order_templates(prescriptions):
+	"""
+	Load the order templates of the prescription rows with one query per template doctype, along
+	with the codification rows that are copied to the orders
+	:param prescriptions: list of (prescription row, template doctype, template name)
+	:return: dict of (template doctype, template name) and template
+	"""
+	template_names = {}
+	for _line_item, template_dt, template in prescriptions:
+		if template:
+			template_names.setdefault(template_dt, set()).add(template)
+
+	codification_fields = [
+		df.fieldname
+		for df in frappe.get_meta("Codification Table").fields
+		if df.fieldtype not in no_value_fields
+	]
+	templates = {}
+	for template_dt, names in template_names.items():
+		meta = frappe.get_meta(template_dt)
+		fields = ["name"] + [
+			fieldname for fieldname in ORDER_TEMPLATE_FIELDS if meta.has_field(fieldname)
+		]
+		for template in frappe.get_all(
+			template_dt, filters={"name": ("in", list(names))}, fields=fields
+		):
+			template.update({"doctype": template_dt, "codification_table": []})
+			templates[(template_dt, template.name)] = template
+
+		for row in frappe.get_all(
+			"Codification Table",
+			filters={"parenttype": template_dt, "parent": ("in", list(names))},
+			fields=["parent"] + codification_fields,
+			order_by="idx",
+		):
+			row.doctype = "Codification Table"
+			templates[(template_dt, row.pop("parent"))].codification_table.append(row)
+
+	return templates
+
+
+def get_order_template(templates, template_dt, template):
+	# raise the usual missing document error for templates that could not be loaded
+	return templates.get((template_dt, template)) or frappe.get_doc(template_dt, template)
+
+
 @frappe.whitelist()
 def make_ip_medication_order(source_name, target_doc=None):
 	def set_missing_values(source, target):
@@ -730,42 +821,88 @@ def create_medication_request(encounter):
 @frappe.whitelist()
 @frappe.validate_and_sanitize_search_inputs
 def get_medications_query(doctype, txt, searchfield, start, page_len, filters):
-	medication_name = filters.get("medication")
+	default_warehouse = frappe.get_cached_value("Stock Settings", None, "default_warehouse")
+	if not frappe.db.get_single_value("Healthcare Settings", "cache_medication_search"):
+		return search_medications(txt, start, page_len, filters, default_warehouse)
+
+	search_key = json.dumps([txt, cint(start), cint(page_len), filters], sort_keys=True, default=str)
+	cache_key = get_medication_search_cache_name(default_warehouse) + hashlib.sha1(
+		search_key.encode()
+	).hexdigest()
+	result = frappe.cache().get_value(cache_key)
+	if result is None:
+		result = search_medications(txt, start, page_len, filters, default_warehouse)
+		frappe.cache().set_value(cache_key, result, expires_in_sec=MEDICATION_SEARCH_CACHE_TTL)
+
+	return result
 
+
+def search_medications(txt, start, page_len, filters, warehouse=None):
+	"""
+	Return a page of the items linked to medications matching `txt`, with their stock in `warehouse`
+	:param filters: `medication` and `is_stock_item` of the items
+	"""
 	medication_child = frappe.qb.DocType("Medication Linked Item")
-	medication = frappe.qb.DocType("Medication")
 	item = frappe.qb.DocType("Item")
 	query = (
-		frappe.qb.select(medication_child.brand, medication_child.manufacturer, medication_child.item)
-		.from_(medication_child)
-		.left_join(medication)
-		.on(medication.name == medication_child.parent)
-		.left_join(item)
+		frappe.qb.from_(medication_child)
+		.inner_join(item)
 		.on(item.name == medication_child.item)
+		.select(medication_child.item, medication_child.brand, medication_child.manufacturer)
 		.where(item.disabled == 0)
+		.orderby(medication_child.item)
+		.limit(cint(page_len))
+		.offset(cint(start))
 	)
-	if medication_name:
-		query = query.where(medication.name == medication_name)
+	if filters.get("medication"):
+		query = query.where(medication_child.parent == filters.get("medication"))
+	if filters.get("is_stock_item") is not None:
+		query = query.where(item.is_stock_item == cint(filters.get("is_stock_item")))
+	if txt:
+		txt = f"%{txt}%"
+		query = query.where(
+			medication_child.item.like(txt)
+			| medication_child.brand.like(txt)
+			| medication_child.manufacturer.like(txt)
+			| item.item_name.like(txt)
+		)
+	if warehouse:
+		stock_bin = frappe.qb.DocType("Bin")
+		query = (
+			query.left_join(stock_bin)
+			.on((stock_bin.item_code == medication_child.item) & (stock_bin.warehouse == warehouse))
+			.select(stock_bin.actual_qty)
+		)
 
-	data = query.run(as_dict=True)
 	data_list = []
-	for d in data:
-		display_list = []
-		if d.get("item"):
-			display_list.append(d.get("item"))
-		if d.get("brand"):
-			display_list.append(d.get("brand"))
-		if d.get("manufacturer"):
-			display_list.append(d.get("manufacturer"))
-		default_warehouse = frappe.get_cached_value("Stock Settings", None, "default_warehouse")
-		if default_warehouse:
-			actual_qty = frappe.db.get_value(
-				"Bin", {"warehouse": default_warehouse, "item_code": d.get("item")}, "actual_qty"
-			)
-			display_list.append("<br>Actual Qty : " + (str(actual_qty) if actual_qty else "0"))
+	for d in query.run(as_dict=True):
+		display_list = [
+			d.get(fieldname) for fieldname in ("item", "brand", "manufacturer") if d.get(fieldname)
+		]
+		if warehouse:
+			display_list.append("<br>Actual Qty : " + (str(d.actual_qty) if d.actual_qty else "0"))
 		data_list.append(display_list)
-	res = tuple(tuple(sub) for sub in data_list)
-	return res
+
+	return tuple(tuple(sub) for sub in data_list)
+
+
+def get_medication_search_cache_name(warehouse):
+	"""Prefix of the cached medication searches of `warehouse`"""
+	return f"{MEDICATION_SEARCH_CACHE_KEY}:{warehouse or ''}:"
+
+
+def clear_medication_search_cache(doc=None, method=None):
+	"""
+	doc_events handler of stock and medication changes, drops the cached medication search results
+	of the warehouse of `doc`, or of all warehouses if `doc` has no warehouse, once committed so
+	that a concurrent search cannot cache the stock of before the change
+	"""
+	prefix = (
+		get_medication_search_cache_name(doc.warehouse)
+		if doc and doc.get("warehouse")
+		else MEDICATION_SEARCH_CACHE_KEY
+	)
+	frappe.db.after_commit.add(lambda: frappe.cache().delete_keys(prefix))
 
 
 @frappe.whitelist()
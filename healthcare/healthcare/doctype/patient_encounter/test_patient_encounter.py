@@ -6,7 +6,15 @@
 import frappe
 from frappe.tests.utils import FrappeTestCase
 
-from healthcare.healthcare.doctype.patient_encounter.patient_encounter import PatientEncounter
+from healthcare.healthcare.doctype.medication_request.test_medication_request import (
+	create_medication,
+)
+from healthcare.healthcare.doctype.patient_encounter.patient_encounter import (
+	PatientEncounter,
+	clear_medication_search_cache,
+	get_medication_search_cache_name,
+	get_medications_query,
+)
 
 
 class TestPatientEncounter(FrappeTestCase):
@@ -90,3 +98,32 @@ class TestPatientEncounter(FrappeTestCase):
 		).insert()
 		plans = PatientEncounter.get_applicable_treatment_plans(encounter.as_dict())
 		self.assertEqual(plans[0]["name"], self.care_plan_female.template_name)
+
+	def test_medications_query(self):
+		medication = create_medication()
+		item = medication.linked_items[0].item
+
+		def search(txt, start=0, page_len=20, **filters):
+			filters.setdefault("medication", medication.name)
+			return get_medications_query("Item", txt, "name", start, page_len, filters)
+
+		self.assertEqual([row[0] for row in search("PL Item")], [item])
+		self.assertFalse(search("no such medication"))
+		self.assertFalse(search("", start=1))
+		self.assertFalse(search("", is_stock_item=1))
+
+		frappe.db.set_single_value("Healthcare Settings", "cache_medication_search", 1)
+		warehouse = frappe.get_cached_value("Stock Settings", None, "default_warehouse")
+		cache_name = get_medication_search_cache_name(warehouse)
+		try:
+			result = search("PL Item")
+			self.assertEqual([row[0] for row in result], [item])
+			self.assertTrue(frappe.cache().get_keys(cache_name))
+
+			# cached results are only dropped once the stock change is committed
+			clear_medication_search_cache(frappe._dict(warehouse=warehouse))
+			self.assertTrue(frappe.cache().get_keys(cache_name))
+			frappe.db.after_commit.run()
+			self.assertFalse(frappe.cache().get_keys(cache_name))
+		finally:
+			frappe.db.set_single_value("Healthcare Settings", "cache_medication_search", 0)
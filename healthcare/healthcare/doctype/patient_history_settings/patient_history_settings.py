@@ -8,10 +8,19 @@ import json
 import frappe
 from frappe import _
 from frappe.model.document import Document
-from frappe.utils import cint, cstr
+from frappe.utils import add_days, cint, cstr, now_datetime
 from frappe.utils.formatters import format_value
 
-from healthcare.healthcare.page.patient_history.patient_history import get_patient_history_doctypes
+PATIENT_HISTORY_CONFIG_KEY = "patient_history_config_map"
+MEDICAL_RECORD_HOOK_STATS_KEY = "patient_history_hook_stats"
+MEDICAL_RECORD_QUEUE_KEY = "patient_medical_record_queue"
+MEDICAL_RECORD_BATCH_SIZE = 200
+MEDICAL_RECORD_HOOK_OUTCOMES = (
+	"processed",
+	"skipped_flags",
+	"skipped_not_configured",
+	"skipped_module",
+)
 
 
 class PatientHistorySettings(Document):
@@ -19,6 +28,9 @@ class PatientHistorySettings(Document):
 		self.validate_submittable_doctypes()
 		self.validate_date_fieldnames()
 
+	def on_update(self):
+		clear_patient_history_config_map()
+
 	def validate_submittable_doctypes(self):
 		for entry in self.custom_doctypes:
 			if not cint(frappe.db.get_value("DocType", entry.document_type, "is_submittable")):
@@ -77,7 +89,7 @@ class PatientHistorySettings(Document):
 
 def create_medical_record(doc, method=None):
 	medical_record_required = validate_medical_record_required(doc)
-	if not medical_record_required:
+	if not medical_record_required or queue_medical_record(doc):
 		return
 
 	reference = doc.name
@@ -105,7 +117,7 @@ def create_medical_record(doc, method=None):
 
 def update_medical_record(doc, method=None, reference=None):
 	medical_record_required = validate_medical_record_required(doc)
-	if not medical_record_required:
+	if not medical_record_required or queue_medical_record(doc):
 		return
 
 	medical_record_id = frappe.db.exists(
@@ -122,7 +134,7 @@ def update_medical_record(doc, method=None, reference=None):
 
 def delete_medical_record(doc, method=None):
 	medical_record_required = validate_medical_record_required(doc)
-	if not medical_record_required:
+	if not medical_record_required or queue_medical_record(doc):
 		return
 
 	record = frappe.db.exists("Patient Medical Record", {"reference_name": doc.name})
@@ -130,6 +142,121 @@ def delete_medical_record(doc, method=None):
 		frappe.delete_doc("Patient Medical Record", record, force=1)
 
 
+def queue_medical_record(doc):
+	"""
+	Leave the medical record of `doc` to the background job when enabled in settings,
+	returns True if it was queued
+	"""
+	if frappe.flags.in_medical_record_job or not cint(
+		frappe.db.get_single_value("Patient History Settings", "update_medical_records_in_background")
+	):
+		return False
+
+	event = json.dumps([doc.doctype, doc.name])
+	frappe.db.after_commit.add(lambda: frappe.cache().rpush(MEDICAL_RECORD_QUEUE_KEY, event))
+	frappe.enqueue(
+		"healthcare.healthcare.doctype.patient_history_settings.patient_history_settings.process_medical_record_queue",
+		queue="short",
+		job_id="process_medical_record_queue",
+		deduplicate=True,
+		enqueue_after_commit=True,
+	)
+	return True
+
+
+def process_medical_record_queue(batch_size=MEDICAL_RECORD_BATCH_SIZE):
+	"""Render and save the queued medical records, committing after each batch"""
+	while True:
+		references = []
+		while len(references) < batch_size:
+			event = frappe.cache().lpop(MEDICAL_RECORD_QUEUE_KEY)
+			if not event:
+				break
+			references.append(tuple(json.loads(event)))
+
+		if not references:
+			break
+
+		sync_medical_records(references)
+		frappe.db.commit()
+
+
+def sync_medical_records(references):
+	"""
+	Bring the medical records of (doctype, name) `references` in line with their documents,
+	repeated events of one document are handled once
+	"""
+	frappe.flags.in_medical_record_job = True
+	try:
+		for doctype, name in dict.fromkeys(references):
+			sync_medical_record(doctype, name)
+	finally:
+		frappe.flags.in_medical_record_job = False
+
+
+def sync_medical_record(doctype, name):
+	try:
+		doc = frappe.get_doc(doctype, name)
+		if doc.docstatus == 1:
+			reference = doc.get("parent_observation") if doctype == "Observation" else None
+			update_medical_record(doc, reference=reference or doc.name)
+		elif doc.docstatus == 2:
+			delete_medical_record(doc)
+	except frappe.DoesNotExistError:
+		frappe.db.delete(
+			"Patient Medical Record", {"reference_doctype": doctype, "reference_name": name}
+		)
+	except Exception:
+		# left for the next reconcile
+		frappe.log_error(
+			title=_("Patient Medical Record update failed for {0} {1}").format(doctype, name)
+		)
+
+
+def reconcile_medical_records(days=2):
+	"""
+	Queue documents changed in the last `days` whose medical record is missing or was not
+	removed on cancel, then process the queue
+	"""
+	if not cint(
+		frappe.db.get_single_value("Patient History Settings", "update_medical_records_in_background")
+	):
+		return
+
+	since = add_days(now_datetime(), -cint(days))
+	for doctype in get_patient_history_config_map():
+		if not frappe.db.exists("DocType", doctype):
+			continue
+
+		fields = ["name", "docstatus"]
+		if doctype == "Observation":
+			fields.append("parent_observation")
+		docs = frappe.get_all(
+			doctype, filters={"docstatus": ("in", [1, 2]), "modified": (">=", since)}, fields=fields
+		)
+		if not docs:
+			continue
+
+		for doc in docs:
+			doc.reference = doc.get("parent_observation") or doc.name
+		recorded = set(
+			frappe.get_all(
+				"Patient Medical Record",
+				filters={
+					"reference_doctype": doctype,
+					"reference_name": ("in", list({doc.reference for doc in docs})),
+				},
+				pluck="reference_name",
+			)
+		)
+
+		for doc in docs:
+			if (doc.docstatus == 1) != (doc.reference in recorded):
+				frappe.cache().rpush(MEDICAL_RECORD_QUEUE_KEY, json.dumps([doctype, doc.name]))
+
+	process_medical_record_queue()
+
+
 def set_subject_field(doc):
 	meta = frappe.get_meta(doc.doctype)
 	subject = ""
@@ -155,19 +282,48 @@ def set_subject_field(doc):
 
 
 def get_date_field(doctype):
-	dt = get_patient_history_config_dt(doctype)
-
-	return frappe.db.get_value(dt, {"document_type": doctype}, "date_fieldname")
+	return get_patient_history_config_map().get(doctype, {}).get("date_field")
 
 
 def get_patient_history_fields(doc):
-	dt = get_patient_history_config_dt(doc.doctype)
-	patient_history_fields = frappe.db.get_value(
-		dt, {"document_type": doc.doctype}, "selected_fields"
-	)
+	return get_patient_history_config_map().get(doc.doctype, {}).get("selected_fields")
+
+
+def get_patient_history_config_map():
+	"""
+	Return {document type: {date_field, selected_fields, config_doctype}} of the document types
+	configured in Patient History Settings, cached for the site until the settings are saved
+	"""
+	config_map = frappe.cache().get_value(PATIENT_HISTORY_CONFIG_KEY)
+	if config_map is None:
+		config_map = {}
+		for config_doctype, parentfield in (
+			("Patient History Standard Document Type", "standard_doctypes"),
+			("Patient History Custom Document Type", "custom_doctypes"),
+		):
+			for entry in frappe.get_all(
+				config_doctype,
+				filters={"parent": "Patient History Settings", "parentfield": parentfield},
+				fields=["document_type", "date_fieldname", "selected_fields"],
+				order_by="idx asc",
+			):
+				config_map.setdefault(
+					entry.document_type,
+					{
+						"date_field": entry.date_fieldname,
+						"selected_fields": json.loads(entry.selected_fields)
+						if entry.selected_fields
+						else None,
+						"config_doctype": config_doctype,
+					},
+				)
+		frappe.cache().set_value(PATIENT_HISTORY_CONFIG_KEY, config_map)
+
+	return config_map
 
-	if patient_history_fields:
-		return json.loads(patient_history_fields)
+
+def clear_patient_history_config_map():
+	frappe.cache().delete_value(PATIENT_HISTORY_CONFIG_KEY)
 
 
 def get_formatted_value_for_table_field(items, df):
@@ -198,6 +354,10 @@ def get_formatted_value_for_table_field(items, df):
 
 
 def get_patient_history_config_dt(doctype):
+	config = get_patient_history_config_map().get(doctype)
+	if config:
+		return config["config_doctype"]
+
 	if frappe.db.get_value("DocType", doctype, "custom"):
 		return "Patient History Custom Document Type"
 	else:
@@ -205,20 +365,47 @@ def get_patient_history_config_dt(doctype):
 
 
 def validate_medical_record_required(doc):
-	if (
-		frappe.flags.in_patch
-		or frappe.flags.in_install
-		or frappe.flags.in_setup_wizard
-		or get_module(doc) != "Healthcare"
-	):
+	# runs for every submit on the site through the "*" doc_events, so documents that are
+	# not configured are turned away with the cached config before touching their meta
+	if frappe.flags.in_patch or frappe.flags.in_install or frappe.flags.in_setup_wizard:
+		count_medical_record_hook("skipped_flags")
+		return False
+
+	if doc.doctype not in get_patient_history_config_map():
+		count_medical_record_hook("skipped_not_configured")
 		return False
 
-	if doc.doctype not in get_patient_history_doctypes():
+	if get_module(doc) != "Healthcare":
+		count_medical_record_hook("skipped_module")
 		return False
 
+	count_medical_record_hook("processed")
 	return True
 
 
+def count_medical_record_hook(outcome):
+	frappe.cache().incr(get_medical_record_hook_stats_key(outcome))
+
+
+def get_medical_record_hook_stats(reset=False):
+	"""
+	Return how many medical record hook invocations were processed or short-circuited, e.g.
+	bench execute healthcare.healthcare.doctype.patient_history_settings.patient_history_settings.get_medical_record_hook_stats
+	"""
+	stats = {}
+	for outcome in MEDICAL_RECORD_HOOK_OUTCOMES:
+		key = get_medical_record_hook_stats_key(outcome)
+		stats[outcome] = cint(frappe.cache().get(key))
+		if reset:
+			frappe.cache().delete(key)
+
+	return stats
+
+
+def get_medical_record_hook_stats_key(outcome):
+	return frappe.cache().make_key(f"{MEDICAL_RECORD_HOOK_STATS_KEY}:{outcome}")
+
+
 def get_module(doc):
 	module = doc.meta.module
 	if not module:
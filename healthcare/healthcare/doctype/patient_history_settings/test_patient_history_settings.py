@@ -12,6 +12,12 @@ from frappe.utils import getdate, strip_html
 from healthcare.healthcare.doctype.patient_appointment.test_patient_appointment import (
 	create_patient,
 )
+from healthcare.healthcare.doctype.patient_history_settings.patient_history_settings import (
+	get_medical_record_hook_stats,
+	get_patient_history_config_map,
+	sync_medical_records,
+	validate_medical_record_required,
+)
 
 
 class TestPatientHistorySettings(FrappeTestCase):
@@ -52,6 +58,43 @@ class TestPatientHistorySettings(FrappeTestCase):
 		self.assertEqual(medical_rec.patient, patient)
 		self.assertEqual(medical_rec.communication_date, getdate())
 
+	def test_patient_history_config_is_cached_until_settings_change(self):
+		config_map = get_patient_history_config_map()
+		self.assertEqual(config_map["Test Patient Feedback"]["date_field"], "date")
+		self.assertEqual(
+			config_map["Test Patient Feedback"]["config_doctype"], "Patient History Custom Document Type"
+		)
+
+		# documents that are not configured are skipped without a query
+		skipped = get_medical_record_hook_stats()["skipped_not_configured"]
+		todo = frappe.get_doc({"doctype": "ToDo", "description": "_Test Patient History Hook"})
+		with self.assertQueryCount(0):
+			self.assertFalse(validate_medical_record_required(todo))
+		self.assertEqual(get_medical_record_hook_stats()["skipped_not_configured"], skipped + 1)
+
+		settings = frappe.get_single("Patient History Settings")
+		settings.custom_doctypes = []
+		settings.save()
+		self.assertNotIn("Test Patient Feedback", get_patient_history_config_map())
+
+	def test_medical_record_in_background(self):
+		frappe.db.set_single_value("Patient History Settings", "update_medical_records_in_background", 1)
+		patient = create_patient()
+		doc = create_doc(patient)
+		# the submit only queues the medical record
+		self.assertFalse(frappe.db.exists("Patient Medical Record", {"reference_name": doc.name}))
+
+		sync_medical_records([(doc.doctype, doc.name), (doc.doctype, doc.name)])
+		sync_medical_records([(doc.doctype, doc.name)])
+		self.assertEqual(
+			frappe.db.count("Patient Medical Record", {"reference_name": doc.name}), 1
+		)
+
+		doc.cancel()
+		sync_medical_records([(doc.doctype, doc.name)])
+		self.assertFalse(frappe.db.exists("Patient Medical Record", {"reference_name": doc.name}))
+		frappe.db.set_single_value("Patient History Settings", "update_medical_records_in_background", 0)
+
 
 def create_custom_doctype():
 	if not frappe.db.exists("DocType", "Test Patient Feedback"):
@@ -11,3 +11,9 @@ class PatientMedicalRecord(Document):
 	def after_insert(self):
 		if self.reference_doctype == "Patient Medical Record":
 			frappe.db.set_value("Patient Medical Record", self.name, "reference_name", self.name)
+
+
+def on_doctype_update():
+	frappe.db.add_index(
+		"Patient Medical Record", ["patient", "communication_date", "reference_doctype"]
+	)
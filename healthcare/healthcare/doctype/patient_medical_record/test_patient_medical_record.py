@@ -15,6 +15,7 @@ from healthcare.healthcare.doctype.patient_appointment.test_patient_appointment
 	create_healthcare_docs,
 	create_medical_department,
 )
+from healthcare.healthcare.page.patient_history.patient_history import get_feed_page
 
 
 class TestPatientMedicalRecord(FrappeTestCase):
@@ -62,6 +63,45 @@ class TestPatientMedicalRecord(FrappeTestCase):
 		)
 		self.assertTrue(medical_rec)
 
+	def test_patient_history_feed_pages(self):
+		patient = create_healthcare_docs(id=41)[0]
+		for days in (0, 0, 0, -1, -1, -3, -7, None, None):
+			frappe.get_doc(
+				{
+					"doctype": "Patient Medical Record",
+					"patient": patient,
+					"status": "Open",
+					"subject": "Feed record",
+					"communication_date": add_days(nowdate(), days) if days is not None else None,
+					"reference_doctype": "Patient Medical Record",
+				}
+			).insert()
+
+		# records without a date come last, after the ones of every page
+		expected = frappe.get_all(
+			"Patient Medical Record",
+			filters={"patient": patient},
+			order_by="ifnull(communication_date, '0001-01-01') desc, name desc",
+			pluck="name",
+		)
+
+		records, cursor = [], None
+		while True:
+			page = get_feed_page(patient, cursor=cursor, page_length=2, with_subject=0)
+			self.assertLessEqual(len(page["records"]), 2)
+			self.assertFalse(any("subject" in record for record in page["records"]))
+			records += [record.name for record in page["records"]]
+			cursor = page["cursor"]
+			if not cursor:
+				break
+
+		self.assertEqual(records, expected)
+
+		page = get_feed_page(patient, date_range=f'["{add_days(nowdate(), -1)}", "{nowdate()}"]')
+		self.assertEqual(len(page["records"]), 5)
+		self.assertIsNone(page["cursor"])
+		self.assertTrue(all(record.subject for record in page["records"]))
+
 
 def create_procedure(appointment):
 	if appointment:
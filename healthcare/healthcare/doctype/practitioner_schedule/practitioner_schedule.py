@@ -7,6 +7,10 @@ from frappe import _
 from frappe.model.document import Document
 from frappe.utils import time_diff
 
+from healthcare.healthcare.doctype.practitioner_slot_availability.practitioner_slot_availability import (
+	clear_slot_index,
+)
+
 
 class PractitionerSchedule(Document):
 	def autoname(self):
@@ -25,3 +29,6 @@ class PractitionerSchedule(Document):
 							maximum_apps, slots.get("idx")
 						)
 						frappe.throw(msg)
+
+	def on_update(self):
+		clear_slot_index(practitioner_schedule=self.name)
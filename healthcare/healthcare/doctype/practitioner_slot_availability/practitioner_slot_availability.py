@@ -0,0 +1,341 @@
+# Copyright (c) 2026, earthians Health Informatics Pvt. Ltd. and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe import _
+from frappe.model.document import Document
+from frappe.utils import add_days, cint, date_diff, flt, getdate, now, today
+
+from healthcare.healthcare.doctype.patient_appointment.appointment_overlap import (
+	get_interval,
+	get_seconds,
+	is_unavailability,
+)
+
+
+class PractitionerSlotAvailability(Document):
+	pass
+
+
+SLOT_INDEX_FIELDS = [
+	"name",
+	"practitioner",
+	"service_unit",
+	"practitioner_schedule",
+	"appointment_date",
+	"from_time",
+	"to_time",
+	"duration",
+	"maximum_appointments",
+	"allow_overlap",
+	"tele_conf",
+	"capacity",
+	"occupied",
+	"free",
+	"unavailable",
+]
+
+
+def get_slot_index(practitioner, date):
+	"""
+	Return the indexed slots of `practitioner` on `date`, building them on first access
+	:param practitioner: Name of the practitioner
+	:param date: Date to check in schedule
+	:return: list of slots with capacity, occupied and free counts
+	"""
+	date = getdate(date)
+	slots = get_indexed_slots(practitioner, date)
+	if not slots:
+		build_slot_index(practitioner, [date])
+		slots = get_indexed_slots(practitioner, date)
+
+	return slots
+
+
+def get_indexed_slots(practitioner, date):
+	return frappe.get_all(
+		"Practitioner Slot Availability",
+		filters={"practitioner": practitioner, "appointment_date": date},
+		fields=SLOT_INDEX_FIELDS,
+		order_by="idx asc",
+	)
+
+
+def build_slot_index(practitioner, dates):
+	"""Materialize the schedule slots of `practitioner` for each of `dates` and count their occupancy"""
+	schedules = get_practitioner_schedules(practitioner)
+	fields = ["name", "creation", "modified", "owner", "modified_by", "idx"] + SLOT_INDEX_FIELDS[1:]
+	timestamp, user = now(), frappe.session.user
+	values = []
+
+	for date in dates:
+		weekday = getdate(date).strftime("%A")
+		idx = 0
+		for schedule in schedules:
+			for slot in schedule.time_slots:
+				if slot.day != weekday:
+					continue
+
+				idx += 1
+				if cint(slot.maximum_appointments):
+					capacity = cint(slot.maximum_appointments)
+				elif schedule.allow_overlap:
+					capacity = cint(schedule.service_unit_capacity) or 1
+				else:
+					capacity = 1
+
+				values.append(
+					(
+						frappe.generate_hash(length=10),
+						timestamp,
+						timestamp,
+						user,
+						user,
+						idx,
+						practitioner,
+						schedule.service_unit,
+						schedule.schedule,
+						date,
+						slot.from_time,
+						slot.to_time,
+						flt(slot.duration),
+						cint(slot.maximum_appointments),
+						schedule.allow_overlap,
+						schedule.tele_conf,
+						capacity,
+						0,
+						capacity,
+						0,
+					)
+				)
+
+	if not values:
+		return
+
+	# slots are unique per practitioner, schedule, date and start time, so a concurrent
+	# build of the same day is silently skipped
+	frappe.db.bulk_insert(
+		"Practitioner Slot Availability", fields, values, ignore_duplicates=True
+	)
+
+	for date in dates:
+		update_slot_index(date, practitioner=practitioner)
+
+
+def get_practitioner_schedules(practitioner):
+	"""Return the enabled schedules of `practitioner` with their service unit settings and time slots"""
+	from healthcare.healthcare.doctype.patient_appointment.patient_appointment import (
+		validate_practitioner_schedules,
+	)
+
+	schedule_entries = frappe.get_all(
+		"Practitioner Service Unit Schedule",
+		filters={"parent": practitioner, "parenttype": "Healthcare Practitioner"},
+		fields=["schedule", "service_unit"],
+		order_by="idx asc",
+	)
+	if not schedule_entries:
+		frappe.throw(
+			_(
+				"{0} does not have a Healthcare Practitioner Schedule. Add it in Healthcare Practitioner master"
+			).format(practitioner),
+			title=_("Practitioner Schedule Not Found"),
+		)
+
+	for entry in schedule_entries:
+		validate_practitioner_schedules(entry, practitioner)
+
+	schedule_names = list({entry.schedule for entry in schedule_entries})
+	schedules = {
+		schedule.name: schedule
+		for schedule in frappe.get_all(
+			"Practitioner Schedule",
+			filters={"name": ("in", schedule_names), "disabled": 0},
+			fields=["name", "allow_video_conferencing"],
+		)
+	}
+
+	time_slots = {}
+	for slot in frappe.get_all(
+		"Healthcare Schedule Time Slot",
+		filters={"parent": ("in", schedule_names), "parenttype": "Practitioner Schedule"},
+		fields=["parent", "day", "from_time", "to_time", "maximum_appointments", "duration"],
+		order_by="idx asc",
+	):
+		time_slots.setdefault(slot.parent, []).append(slot)
+
+	service_units = {
+		service_unit.name: service_unit
+		for service_unit in frappe.get_all(
+			"Healthcare Service Unit",
+			filters={"name": ("in", list({entry.service_unit for entry in schedule_entries}))},
+			fields=["name", "overlap_appointments", "service_unit_capacity"],
+		)
+	}
+
+	practitioner_schedules = []
+	for entry in schedule_entries:
+		if entry.schedule not in schedules:
+			continue
+
+		service_unit = service_units.get(entry.service_unit) or frappe._dict()
+		practitioner_schedules.append(
+			frappe._dict(
+				{
+					"schedule": entry.schedule,
+					"service_unit": entry.service_unit,
+					"allow_overlap": cint(service_unit.overlap_appointments),
+					"service_unit_capacity": cint(service_unit.service_unit_capacity),
+					"tele_conf": cint(schedules[entry.schedule].allow_video_conferencing),
+					"time_slots": time_slots.get(entry.schedule, []),
+				}
+			)
+		)
+
+	return practitioner_schedules
+
+
+def update_slot_index(date, practitioner=None, service_unit=None):
+	"""
+	Recount occupancy of the indexed slots on `date` that can be affected by an appointment
+	of `practitioner` in `service_unit`. Days that are not indexed yet are left alone,
+	they are built with current counts on first access.
+	"""
+	if not date or not (practitioner or service_unit):
+		return
+
+	or_filters = {}
+	if practitioner:
+		or_filters["practitioner"] = practitioner
+	if service_unit:
+		or_filters["service_unit"] = service_unit
+
+	slots = frappe.get_all(
+		"Practitioner Slot Availability",
+		filters={"appointment_date": getdate(date)},
+		or_filters=or_filters,
+		fields=SLOT_INDEX_FIELDS,
+	)
+	if not slots:
+		return
+
+	or_filters = {"practitioner": ("in", list({slot.practitioner for slot in slots}))}
+	service_units = list({slot.service_unit for slot in slots if slot.service_unit})
+	if service_units:
+		or_filters["service_unit"] = ("in", service_units)
+
+	appointments = frappe.get_all(
+		"Patient Appointment",
+		filters={"appointment_date": getdate(date), "status": ("!=", "Cancelled")},
+		or_filters=or_filters,
+		fields=[
+			"name",
+			"practitioner",
+			"service_unit",
+			"appointment_time",
+			"duration",
+			"end_time",
+			"status",
+			"appointment_type",
+		],
+	)
+
+	for slot in slots:
+		occupancy = get_slot_occupancy(slot, appointments)
+		if any(cint(slot.get(key)) != value for key, value in occupancy.items()):
+			frappe.db.set_value(
+				"Practitioner Slot Availability", slot.name, occupancy, update_modified=False
+			)
+
+
+def get_slot_occupancy(slot, appointments):
+	"""Count the appointments occupying `slot`, mirroring the checks of the booking dialog"""
+	slot_start, slot_end = get_seconds(slot.from_time), get_seconds(slot.to_time)
+	occupied = unavailable = 0
+
+	for appointment in appointments:
+		# without overlap, every appointment in the service unit blocks the slot
+		if appointment.practitioner != slot.practitioner and (
+			slot.allow_overlap or appointment.service_unit != slot.service_unit
+		):
+			continue
+
+		start, end = get_interval(
+			appointment.appointment_time, appointment.duration, appointment.end_time
+		)
+		overlaps = start < slot_end and end > slot_start
+
+		if is_unavailability(appointment):
+			if appointment.practitioner == slot.practitioner and overlaps:
+				unavailable = 1
+			continue
+
+		if cint(slot.maximum_appointments):
+			# count based schedules only count the appointments booked in the slot's service unit
+			if appointment.service_unit == slot.service_unit:
+				occupied += 1
+		elif overlaps:
+			occupied += 1
+
+	capacity = cint(slot.capacity)
+	return {
+		"occupied": occupied,
+		"free": 0 if unavailable else max(capacity - occupied, 0),
+		"unavailable": unavailable,
+	}
+
+
+def clear_slot_index(**filters):
+	"""Drop indexed slots matching `filters` from today on, they are rebuilt on next access"""
+	filters["appointment_date"] = (">=", today())
+	frappe.db.delete("Practitioner Slot Availability", filters)
+
+
+def delete_expired_slot_index():
+	# remove slots of past days daily, the booking dialog never reads them
+	frappe.db.delete("Practitioner Slot Availability", {"appointment_date": ("<", today())})
+
+
+@frappe.whitelist()
+def rebuild_slot_index(practitioner=None, from_date=None, to_date=None):
+	"""
+	Rebuild the slot index from schedules and booked appointments (backfill), e.g.
+	bench execute healthcare.healthcare.doctype.practitioner_slot_availability.practitioner_slot_availability.rebuild_slot_index --kwargs "{'to_date': '2026-12-31'}"
+	:param practitioner: Rebuild only for this practitioner, all scheduled practitioners if not set
+	:param from_date: First date to index, defaults to today
+	:param to_date: Last date to index, defaults to 30 days after `from_date`
+	:return: number of practitioners indexed
+	"""
+	frappe.only_for(["System Manager", "Healthcare Administrator"])
+
+	from_date = getdate(from_date or today())
+	to_date = getdate(to_date or add_days(from_date, 30))
+	dates = [add_days(from_date, days) for days in range(date_diff(to_date, from_date) + 1)]
+
+	if practitioner:
+		practitioners = [practitioner]
+	else:
+		practitioners = frappe.get_all(
+			"Practitioner Service Unit Schedule",
+			filters={"parenttype": "Healthcare Practitioner"},
+			pluck="parent",
+			distinct=True,
+		)
+
+	for name in practitioners:
+		frappe.db.delete(
+			"Practitioner Slot Availability",
+			{"practitioner": name, "appointment_date": ("between", [from_date, to_date])},
+		)
+		build_slot_index(name, dates)
+
+	return len(practitioners)
+
+
+def on_doctype_update():
+	frappe.db.add_unique(
+		"Practitioner Slot Availability",
+		["practitioner", "appointment_date", "practitioner_schedule", "from_time"],
+		constraint_name="unique_practitioner_slot",
+	)
+	frappe.db.add_index("Practitioner Slot Availability", ["appointment_date", "service_unit"])
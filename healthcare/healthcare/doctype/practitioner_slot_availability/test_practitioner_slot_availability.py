@@ -0,0 +1,113 @@
+# Copyright (c) 2026, earthians Health Informatics Pvt. Ltd. and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_days, nowdate
+
+from healthcare.healthcare.doctype.patient_appointment.patient_appointment import update_status
+from healthcare.healthcare.doctype.patient_appointment.test_patient_appointment import (
+	create_appointment,
+	create_healthcare_docs,
+	create_service_unit,
+)
+from healthcare.healthcare.doctype.practitioner_slot_availability.practitioner_slot_availability import (
+	get_slot_index,
+	get_slot_occupancy,
+	rebuild_slot_index,
+)
+
+
+class TestPractitionerSlotAvailability(FrappeTestCase):
+	def setUp(self):
+		frappe.db.sql("""delete from `tabPatient Appointment`""")
+		frappe.db.sql("""delete from `tabPractitioner Slot Availability`""")
+		frappe.db.set_single_value("Healthcare Settings", "show_payment_popup", 0)
+
+	def test_slot_index_is_updated_on_booking_and_cancel(self):
+		patient, practitioner = create_healthcare_docs(id=5)
+		service_unit = create_service_unit(id=5)
+		add_practitioner_schedule(practitioner, service_unit)
+		date = add_days(nowdate(), 1)
+
+		slots = get_slot_index(practitioner, date)
+		self.assertEqual(len(slots), 4)
+		self.assertTrue(all(slot.free == 1 and not slot.occupied for slot in slots))
+
+		appointment = create_appointment(
+			patient, practitioner, date, service_unit=service_unit, appointment_time="09:00"
+		)
+		slot = get_slot_index(practitioner, date)[0]
+		self.assertEqual(slot.occupied, 1)
+		self.assertEqual(slot.free, 0)
+
+		update_status(appointment.name, "Cancelled")
+		slot = get_slot_index(practitioner, date)[0]
+		self.assertEqual(slot.occupied, 0)
+		self.assertEqual(slot.free, 1)
+
+	def test_rebuild_slot_index(self):
+		patient, practitioner = create_healthcare_docs(id=6)
+		service_unit = create_service_unit(id=6)
+		add_practitioner_schedule(practitioner, service_unit)
+		date = add_days(nowdate(), 2)
+		create_appointment(
+			patient, practitioner, date, service_unit=service_unit, appointment_time="09:15"
+		)
+
+		rebuild_slot_index(practitioner, from_date=date, to_date=date)
+		slots = frappe.get_all(
+			"Practitioner Slot Availability",
+			filters={"practitioner": practitioner, "appointment_date": date},
+			fields=["from_time", "occupied"],
+			order_by="idx asc",
+		)
+		self.assertEqual([slot.occupied for slot in slots], [0, 1, 0, 0])
+
+	def test_count_based_slot_occupancy(self):
+		slot = frappe._dict(
+			practitioner="_Test Practitioner",
+			service_unit="_Test Unit A",
+			from_time="09:00:00",
+			to_time="12:00:00",
+			maximum_appointments=1,
+			capacity=3,
+		)
+		appointments = [
+			frappe._dict(
+				practitioner="_Test Practitioner",
+				service_unit=service_unit,
+				appointment_time="10:00:00",
+				duration=15,
+				status="Scheduled",
+			)
+			for service_unit in ("_Test Unit A", "_Test Unit A", "_Test Unit B")
+		]
+
+		# the appointment of the practitioner in another service unit does not use the slot
+		self.assertEqual(
+			get_slot_occupancy(slot, appointments), {"occupied": 2, "free": 1, "unavailable": 0}
+		)
+
+
+def add_practitioner_schedule(practitioner, service_unit):
+	schedule_name = f"_Test Schedule {practitioner}"
+	if not frappe.db.exists("Practitioner Schedule", schedule_name):
+		schedule = frappe.new_doc("Practitioner Schedule")
+		schedule.schedule_name = schedule_name
+		for day in ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]:
+			for from_time, to_time in [
+				("09:00:00", "09:15:00"),
+				("09:15:00", "09:30:00"),
+				("09:30:00", "09:45:00"),
+				("09:45:00", "10:00:00"),
+			]:
+				schedule.append("time_slots", {"day": day, "from_time": from_time, "to_time": to_time})
+		schedule.save(ignore_permissions=True)
+
+	practitioner_doc = frappe.get_doc("Healthcare Practitioner", practitioner)
+	practitioner_doc.practitioner_schedules = []
+	practitioner_doc.append(
+		"practitioner_schedules", {"schedule": schedule_name, "service_unit": service_unit}
+	)
+	practitioner_doc.save(ignore_permissions=True)
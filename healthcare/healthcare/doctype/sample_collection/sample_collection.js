@@ -4,9 +4,18 @@
 frappe.ui.form.on('Sample Collection', {
 	onload: function(frm) {
 		frappe.realtime.on("observation_creation_progress", (status) => {
-			if (status == "Completed") {
+			if (status.current) {
+				frappe.show_progress(__("Marking Collected"), status.current, status.total);
+			} else if (status.status == "Completed") {
+				frappe.hide_progress();
 				frm.reload_doc();
 				frappe.dom.unfreeze();
+				if (status.failed && status.failed.length) {
+					frappe.show_alert({
+						message: __("Could not mark {0} as Collected, please retry", [status.failed.join(", ")]),
+						indicator: "orange",
+					});
+				}
 			}
 		})
 	},
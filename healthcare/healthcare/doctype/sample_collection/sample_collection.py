@@ -4,10 +4,12 @@
 
 
 import json
+import time
 
 import frappe
+from frappe import _
 from frappe.model.document import Document
-from frappe.utils import now_datetime
+from frappe.utils import flt, now_datetime
 
 from healthcare.healthcare.doctype.observation.observation import add_observation
 from healthcare.healthcare.doctype.observation_template.observation_template import (
@@ -77,6 +79,9 @@ class SampleCollection(Document):
 def create_observation(selected, sample_collection, component_observations=None, child_name=None):
 	frappe.enqueue(
 		"healthcare.healthcare.doctype.sample_collection.sample_collection.insert_observation",
+		job_id=f"insert_observation::{sample_collection}::{child_name or ''}",
+		deduplicate=True,
+		enqueue_after_commit=True,
 		selected=selected,
 		sample_collection=sample_collection,
 		component_observations=component_observations,
@@ -85,128 +90,205 @@ def create_observation(selected, sample_collection, component_observations=None,
 
 
 def insert_observation(selected, sample_collection, component_observations=None, child_name=None):
-	try:
-		sample_col_doc = frappe.db.get_value(
-			"Sample Collection",
-			sample_collection,
-			["reference_name", "patient", "referring_practitioner"],
-			as_dict=1,
+	"""Create specimens and observations of the selected samples, committing after each sample.
+	Samples already collected are skipped so that a failed or repeated job resumes safely."""
+	start = time.monotonic()
+	sample_col_doc = frappe.db.get_value(
+		"Sample Collection",
+		sample_collection,
+		["reference_name", "patient", "referring_practitioner"],
+		as_dict=1,
+	)
+	selected = json.loads(selected)
+	parent_observation = None
+	if child_name:
+		# resume from the saved state of the components, not the one the form was loaded with
+		parent_observation, component_observations = frappe.db.get_value(
+			"Observation Sample Collection",
+			child_name,
+			["component_observation_parent", "component_observations"],
 		)
-		selected = json.loads(selected)
-		if component_observations and len(component_observations) > 0:
-			component_observations = json.loads(component_observations)
-		comp_obs_ref = create_specimen(sample_col_doc.get("patient"), selected, component_observations)
-		for i, obs in enumerate(selected):
-			parent_observation = obs.get("component_observation_parent")
-
-			if child_name:
-				parent_observation = frappe.db.get_value(
-					"Observation Sample Collection", child_name, "component_observation_parent"
-				)
-
-			if obs.get("status") == "Open":
-				# non has_component templates
-				if not obs.get("has_component") or obs.get("has_component") == 0:
-					observation = add_observation(
-						patient=sample_col_doc.get("patient"),
-						template=obs.get("observation_template"),
-						doc="Sample Collection",
-						docname=sample_collection,
-						parent=parent_observation,
-						specimen=comp_obs_ref.get(obs.get("name"))
-						or comp_obs_ref.get(i + 1)
-						or comp_obs_ref.get(obs.get("idx")),
-						invoice=sample_col_doc.get("reference_name"),
-						practitioner=sample_col_doc.get("referring_practitioner"),
-						child=obs.get("reference_child") if obs.get("reference_child") else "",
-						service_request=obs.get("service_request"),
-					)
-					if observation:
-						frappe.db.set_value(
-							"Observation Sample Collection",
-							obs.get("name"),
-							{
-								"status": "Collected",
-								"collection_date_time": now_datetime(),
-								"specimen": comp_obs_ref.get(obs.get("name")),
-							},
-						)
-				else:
-					# to deal the component template checked from main table and collected
-					if obs.get("component_observations"):
-						component_observations = json.loads(obs.get("component_observations"))
-						for j, comp in enumerate(component_observations):
-							observation = add_observation(
-								patient=sample_col_doc.get("patient"),
-								template=comp.get("observation_template"),
-								doc="Sample Collection",
-								docname=sample_collection,
-								parent=obs.get("component_observation_parent"),
-								specimen=comp_obs_ref.get(j + 1) or comp_obs_ref.get(obs.get("name")),
-								invoice=sample_col_doc.get("reference_name"),
-								practitioner=sample_col_doc.get("referring_practitioner"),
-								child=obs.get("reference_child") if obs.get("reference_child") else "",
-								service_request=obs.get("service_request"),
-							)
-							if observation:
-								comp["status"] = "Collected"
-								comp["collection_date_time"] = now_datetime()
-								comp["specimen"] = comp_obs_ref.get(j + 1) or comp_obs_ref.get(obs.get("name"))
+	if component_observations and len(component_observations) > 0:
+		component_observations = json.loads(component_observations)
 
-						frappe.db.set_value(
-							"Observation Sample Collection",
-							obs.get("name"),
-							{
-								"collection_date_time": now_datetime(),
-								"component_observations": json.dumps(component_observations, default=str),
-								"status": "Collected",
-								"specimen": comp_obs_ref.get(j + 1) or comp_obs_ref.get(obs.get("name")),
-							},
-						)
-			# to deal individually checked from component dialog
-			if component_observations:
-				for j, comp in enumerate(component_observations):
-					if comp.get("observation_template") == obs.get("observation_template"):
-						comp["status"] = "Collected"
-						comp["collection_date_time"] = now_datetime()
-						comp["specimen"] = comp_obs_ref.get(j + 1)
-
-		child_db_set_dict = {"component_observations": json.dumps(component_observations, default=str)}
-		# to set child table status Collected if all childs are Collected
-		if component_observations and not any(
-			(comp["status"] == "Open") for comp in component_observations
-		):
-			child_db_set_dict["status"] = "Collected"
+	pending = get_pending_samples(selected, sample_collection, component_observations)
+	groups = get_specimen_groups([obs for i, obs in pending], component_observations)
+	specimens, comp_obs_ref = {}, {}
 
-		if child_name:
-			frappe.db.set_value(
-				"Observation Sample Collection",
-				child_name,
-				child_db_set_dict,
+	collected, failed = 0, []
+	for i, obs in pending:
+		# specimens are created with the first sample using them, a failed sample rolls them back
+		created = []
+		try:
+			created = create_specimen(
+				sample_col_doc.get("patient"),
+				groups,
+				specimens,
+				comp_obs_ref,
+				component_observations,
+				sample=obs,
 			)
-		if sample_collection:
-			non_collected_samples = frappe.db.get_all(
-				"Observation Sample Collection", {"parent": sample_collection, "status": ["!=", "Collected"]}
+			collect_sample(
+				obs,
+				i,
+				sample_col_doc,
+				sample_collection,
+				comp_obs_ref,
+				component_observations,
+				parent_observation or obs.get("component_observation_parent"),
+			)
+			if child_name and component_observations:
+				set_component_observations_status(child_name, component_observations)
+			frappe.db.commit()
+			collected += 1
+		except Exception:
+			frappe.db.rollback()
+			forget_specimens(groups, created, specimens, comp_obs_ref, component_observations)
+			failed.append(obs.get("observation_template"))
+			frappe.log_error(
+				title=_("Failed to mark Collected!"),
+				reference_doctype="Sample Collection",
+				reference_name=sample_collection,
 			)
-			if non_collected_samples and len(non_collected_samples) > 0:
-				set_status = "Partly Collected"
-			else:
-				set_status = "Collected"
 
-			frappe.db.set_value("Sample Collection", sample_collection, "status", set_status)
+		frappe.publish_realtime(
+			event="observation_creation_progress",
+			message={"current": collected + len(failed), "total": len(pending)},
+			doctype="Sample Collection",
+			docname=sample_collection,
+		)
 
-	except Exception as e:
-		frappe.log_error(message=e, title="Failed to mark Collected!")
+	non_collected_samples = frappe.db.get_all(
+		"Observation Sample Collection", {"parent": sample_collection, "status": ["!=", "Collected"]}
+	)
+	set_status = "Partly Collected" if non_collected_samples else "Collected"
+	frappe.db.set_value("Sample Collection", sample_collection, "status", set_status)
 
+	seconds = time.monotonic() - start
+	frappe.logger("healthcare").info(
+		f"Sample Collection {sample_collection}: {collected} samples collected, {len(failed)} failed"
+		f" in {seconds:.2f}s ({collected / seconds if seconds else collected:.1f} samples/s)"
+	)
 	frappe.publish_realtime(
 		event="observation_creation_progress",
-		message="Completed",
+		message={
+			"status": "Completed",
+			"collected": collected,
+			"failed": failed,
+			"seconds": flt(seconds, 2),
+		},
 		doctype="Sample Collection",
 		docname=sample_collection,
 	)
 
 
-def create_specimen(patient, selected, component_observations):
+def get_pending_samples(selected, sample_collection, component_observations=None):
+	"""Selected samples that are still Open, checked against the saved statuses, [(idx, sample)]"""
+	if component_observations:
+		collected = {
+			comp.get("observation_template")
+			for comp in component_observations
+			if comp.get("status") == "Collected"
+		}
+		return [
+			(i, obs)
+			for i, obs in enumerate(selected)
+			if obs.get("status") == "Open" and obs.get("observation_template") not in collected
+		]
+
+	collected = frappe.get_all(
+		"Observation Sample Collection",
+		{"parent": sample_collection, "status": "Collected"},
+		pluck="name",
+	)
+	return [
+		(i, obs)
+		for i, obs in enumerate(selected)
+		if obs.get("status") == "Open" and obs.get("name") not in collected
+	]
+
+
+def collect_sample(
+	obs, i, sample_col_doc, sample_collection, comp_obs_ref, component_observations, parent_observation
+):
+	# non has_component templates
+	if not obs.get("has_component") or obs.get("has_component") == 0:
+		observation = add_observation(
+			patient=sample_col_doc.get("patient"),
+			template=obs.get("observation_template"),
+			doc="Sample Collection",
+			docname=sample_collection,
+			parent=parent_observation,
+			specimen=comp_obs_ref.get(obs.get("name"))
+			or comp_obs_ref.get(i + 1)
+			or comp_obs_ref.get(obs.get("idx")),
+			invoice=sample_col_doc.get("reference_name"),
+			practitioner=sample_col_doc.get("referring_practitioner"),
+			child=obs.get("reference_child") if obs.get("reference_child") else "",
+			service_request=obs.get("service_request"),
+		)
+		if observation and not component_observations:
+			frappe.db.set_value(
+				"Observation Sample Collection",
+				obs.get("name"),
+				{
+					"status": "Collected",
+					"collection_date_time": now_datetime(),
+					"specimen": comp_obs_ref.get(obs.get("name")),
+				},
+			)
+	# to deal the component template checked from main table and collected
+	elif obs.get("component_observations"):
+		row_components = json.loads(obs.get("component_observations"))
+		for j, comp in enumerate(row_components):
+			observation = add_observation(
+				patient=sample_col_doc.get("patient"),
+				template=comp.get("observation_template"),
+				doc="Sample Collection",
+				docname=sample_collection,
+				parent=obs.get("component_observation_parent"),
+				specimen=comp_obs_ref.get(j + 1) or comp_obs_ref.get(obs.get("name")),
+				invoice=sample_col_doc.get("reference_name"),
+				practitioner=sample_col_doc.get("referring_practitioner"),
+				child=obs.get("reference_child") if obs.get("reference_child") else "",
+				service_request=obs.get("service_request"),
+			)
+			if observation:
+				comp["status"] = "Collected"
+				comp["collection_date_time"] = now_datetime()
+				comp["specimen"] = comp_obs_ref.get(j + 1) or comp_obs_ref.get(obs.get("name"))
+
+		frappe.db.set_value(
+			"Observation Sample Collection",
+			obs.get("name"),
+			{
+				"collection_date_time": now_datetime(),
+				"component_observations": json.dumps(row_components, default=str),
+				"status": "Collected",
+				"specimen": comp_obs_ref.get(j + 1) or comp_obs_ref.get(obs.get("name")),
+			},
+		)
+
+	# to deal individually checked from component dialog
+	if component_observations:
+		for j, comp in enumerate(component_observations):
+			if comp.get("observation_template") == obs.get("observation_template"):
+				comp["status"] = "Collected"
+				comp["collection_date_time"] = now_datetime()
+				comp["specimen"] = comp_obs_ref.get(j + 1)
+
+
+def set_component_observations_status(child_name, component_observations):
+	child_db_set_dict = {"component_observations": json.dumps(component_observations, default=str)}
+	# to set child table status Collected if all childs are Collected
+	if not any((comp["status"] == "Open") for comp in component_observations):
+		child_db_set_dict["status"] = "Collected"
+
+	frappe.db.set_value("Observation Sample Collection", child_name, child_db_set_dict)
+
+
+def get_specimen_groups(selected, component_observations):
+	"""Samples sharing a specimen, {(medical_department, sample, container_closure_color): samples}"""
 	groups = {}
 	# to group by
 	for sel in selected:
@@ -230,20 +312,45 @@ def create_specimen(patient, selected, component_observations):
 						groups[key].append(comp)
 					else:
 						groups[key] = [comp]
-	obs_ref = {}
-	for gr in groups:
+	return groups
+
+
+def create_specimen(patient, groups, specimens, obs_ref, component_observations, sample=None):
+	"""Create the specimens of the groups of `sample` (of all groups if not set) not created yet,
+	filling `specimens` by group and `obs_ref` by sample, returns the groups created"""
+	created = []
+	for gr, members in groups.items():
+		if gr in specimens:
+			continue
+		if sample is not None and not any(
+			member is sample or (sample.get("name") and member.get("name") == sample.get("name"))
+			for member in members
+		):
+			continue
+
 		specimen = frappe.new_doc("Specimen")
 		specimen.received_time = now_datetime()
 		specimen.patient = patient
-		specimen.specimen_type = groups[gr][0].get("sample_type")
+		specimen.specimen_type = members[0].get("sample_type")
 		specimen.save()
+		specimens[gr] = specimen.name
+		for sub_grp in members:
+			obs_ref[get_specimen_ref_key(sub_grp, component_observations)] = specimen.name
+		created.append(gr)
+
+	return created
+
+
+def forget_specimens(groups, created, specimens, obs_ref, component_observations):
+	"""Drop specimens rolled back with a failed sample, the next sample of the group recreates them"""
+	for gr in created:
+		specimens.pop(gr, None)
 		for sub_grp in groups[gr]:
-			if component_observations:
-				obs_ref[sub_grp.get("idx")] = specimen.name
-			else:
-				obs_ref[sub_grp.get("name")] = specimen.name
+			obs_ref.pop(get_specimen_ref_key(sub_grp, component_observations), None)
+
 
-	return obs_ref
+def get_specimen_ref_key(sample, component_observations):
+	return sample.get("idx") if component_observations else sample.get("name")
 
 
 def set_component_observation_data(observation_template):
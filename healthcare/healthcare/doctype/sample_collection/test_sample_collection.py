@@ -3,10 +3,58 @@
 # See license.txt
 
 
+import frappe
 from frappe.tests.utils import FrappeTestCase
 
+from healthcare.healthcare.doctype.patient_appointment.test_patient_appointment import (
+	create_patient,
+)
+from healthcare.healthcare.doctype.sample_collection.sample_collection import (
+	create_specimen,
+	forget_specimens,
+	get_pending_samples,
+	get_specimen_groups,
+)
+
 # test_records = frappe.get_test_records('Sample Collection')
 
 
 class TestSampleCollection(FrappeTestCase):
-	pass
+	def test_pending_component_samples(self):
+		# a retried job skips the components already collected by the previous run
+		component_observations = [
+			{"observation_template": "Hemoglobin", "status": "Collected"},
+			{"observation_template": "Platelet Count", "status": "Open"},
+		]
+		selected = [
+			{"observation_template": "Hemoglobin", "status": "Open"},
+			{"observation_template": "Platelet Count", "status": "Open"},
+		]
+		self.assertEqual(
+			get_pending_samples(selected, None, component_observations), [(1, selected[1])]
+		)
+
+	def test_specimens_follow_sample_transactions(self):
+		patient = create_patient()
+		selected = [
+			{"name": "_Test Sample 1", "sample": "Blood"},
+			{"name": "_Test Sample 2", "sample": "Blood"},
+			{"name": "_Test Sample 3", "sample": "Urine"},
+		]
+		groups = get_specimen_groups(selected, None)
+		specimens, obs_ref = {}, {}
+
+		# only the specimen of the sample being collected is created, shared with its group
+		create_specimen(patient, groups, specimens, obs_ref, None, sample=selected[0])
+		self.assertEqual(obs_ref["_Test Sample 1"], obs_ref["_Test Sample 2"])
+		self.assertNotIn("_Test Sample 3", obs_ref)
+
+		# a failed sample rolls back its specimen, which is created again on the next attempt
+		frappe.db.savepoint("sample")
+		created = create_specimen(patient, groups, specimens, obs_ref, None, sample=selected[2])
+		specimen = obs_ref["_Test Sample 3"]
+		frappe.db.rollback(save_point="sample")
+		forget_specimens(groups, created, specimens, obs_ref, None)
+		self.assertFalse(frappe.db.exists("Specimen", specimen))
+		self.assertNotIn("_Test Sample 3", obs_ref)
+		self.assertEqual(len(specimens), 1)
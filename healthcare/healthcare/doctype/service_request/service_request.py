@@ -27,7 +27,7 @@ class ServiceRequest(ServiceRequestController):
 	def validate(self):
 		super().validate()
 		if self.template_dt and self.template_dn and not self.codification_table:
-			template_doc = frappe.get_doc(self.template_dt, self.template_dn)
+			template_doc = self.flags.template or frappe.get_doc(self.template_dt, self.template_dn)
 			if template_doc.get("codification_table"):
 				for mcode in template_doc.codification_table:
 					self.append("codification_table", (frappe.copy_doc(mcode)).as_dict())
@@ -44,9 +44,12 @@ class ServiceRequest(ServiceRequestController):
 			frappe.db.set_value("Service Request", self.amended_from, "status", "revoked-Request Status")
 
 		if self.template_dt == "Observation Template" and self.template_dn:
-			self.sample_collection_required = frappe.db.get_value(
-				"Observation Template", self.template_dn, "sample_collection_required"
-			)
+			if self.flags.template:
+				self.sample_collection_required = self.flags.template.get("sample_collection_required")
+			else:
+				self.sample_collection_required = frappe.db.get_value(
+					"Observation Template", self.template_dn, "sample_collection_required"
+				)
 
 	def set_order_details(self):
 		if not self.template_dt and not self.template_dn:
@@ -55,7 +58,8 @@ class ServiceRequest(ServiceRequestController):
 				title=_("Missing Mandatory Fields"),
 			)
 
-		template = frappe.get_doc(self.template_dt, self.template_dn)
+		# template prefetched by the encounter creating the order
+		template = self.flags.template or frappe.get_doc(self.template_dt, self.template_dn)
 		# set item code
 		self.item_code = template.get("item")
 
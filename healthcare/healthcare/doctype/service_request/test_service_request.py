@@ -29,6 +29,7 @@ from healthcare.healthcare.doctype.patient_appointment.test_patient_appointment
 	create_healthcare_docs,
 )
 from healthcare.healthcare.doctype.service_request.service_request import make_clinical_procedure
+from healthcare.healthcare.utils import get_service_requests_to_invoice
 
 
 class TestServiceRequest(unittest.TestCase):
@@ -102,6 +103,47 @@ class TestServiceRequest(unittest.TestCase):
 			1,
 		)
 
+	def test_orders_created_in_batch_on_encounter_submission(self):
+		patient, practitioner = create_healthcare_docs()
+		template = create_lab_test_template()
+		procedure_template = create_clinical_procedure_template()
+		encounter = create_encounter(
+			patient, practitioner, "lab_test_prescription", template, procedure_template
+		)
+		for _ in range(4):
+			encounter.append(
+				"lab_test_prescription",
+				{"lab_test_code": template.item, "lab_test_name": template.lab_test_name},
+			)
+		encounter.submit()
+
+		rows = encounter.lab_test_prescription + encounter.procedure_prescription
+		orders = frappe.get_all(
+			"Service Request",
+			{"order_group": encounter.name},
+			["name", "docstatus", "status", "template_dt", "order_description"],
+		)
+		self.assertEqual(len(orders), 6)
+		self.assertEqual({row.service_request for row in rows}, {order.name for order in orders})
+		for order in orders:
+			self.assertEqual(order.docstatus, 1)
+			self.assertEqual(order.status, "active-Request Status")
+			if order.template_dt == "Lab Test Template":
+				self.assertEqual(order.order_description, template.lab_test_description)
+
+		# billable items of the batch are synced once the orders exist
+		self.assertEqual(
+			frappe.db.count(
+				"Healthcare Billable Item",
+				{"source_doctype": "Service Request", "source_name": ("in", [o.name for o in orders])},
+			),
+			len(
+				get_service_requests_to_invoice(
+					frappe._dict(name=patient), encounter.company, names=[o.name for o in orders]
+				)
+			),
+		)
+
 	def test_mark_observation_as_invoiced(self):
 		obs_template = create_observation_template("Total Cholesterol")
 		patient, practitioner = create_healthcare_docs()
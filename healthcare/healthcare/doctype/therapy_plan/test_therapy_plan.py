@@ -16,8 +16,10 @@ from healthcare.healthcare.doctype.patient_appointment.test_patient_appointment
 from healthcare.healthcare.doctype.therapy_plan.therapy_plan import (
 	make_sales_invoice,
 	make_therapy_session,
+	reconcile_therapy_plan_totals,
 )
 from healthcare.healthcare.doctype.therapy_type.test_therapy_type import create_therapy_type
+from healthcare.healthcare.utils import update_therapy_plan
 
 
 class TestTherapyPlan(FrappeTestCase):
@@ -69,6 +71,46 @@ class TestTherapyPlan(FrappeTestCase):
 		)
 		self.assertEqual(si.items[0].amount, therapy_plan_template_amt)
 
+	def test_totals_updated_by_delta_and_reconciled(self):
+		plan = create_therapy_plan()
+		session = make_therapy_session(plan.name, plan.patient, "Basic Rehab", "_Test Company")
+		frappe.get_doc(session).submit()
+
+		def get_totals():
+			return frappe.db.get_value(
+				"Therapy Plan",
+				plan.name,
+				["total_sessions_completed", "total_invoiced_session", "invoiced_amount", "status"],
+			)
+
+		self.assertEqual(get_totals(), (1, 0, 0, "In Progress"))
+		self.assertEqual(
+			frappe.db.get_value("Therapy Plan Detail", {"parent": plan.name}, "sessions_completed"), 1
+		)
+
+		invoice = frappe._dict(
+			items=[
+				frappe._dict(reference_dt="Therapy Plan", reference_dn=plan.name, qty=2, amount=300),
+				frappe._dict(reference_dt="Patient Appointment", reference_dn="_Test", qty=1, amount=50),
+			]
+		)
+		update_therapy_plan(invoice, "on_submit")
+		self.assertEqual(get_totals(), (1, 2, 300, "In Progress"))
+		update_therapy_plan(invoice, "on_cancel")
+		self.assertEqual(get_totals(), (1, 0, 0, "In Progress"))
+
+		frappe.db.set_value(
+			"Therapy Plan",
+			plan.name,
+			{"total_sessions_completed": 2, "invoiced_amount": 10, "status": "Completed"},
+		)
+		frappe.db.set_value("Therapy Plan Detail", {"parent": plan.name}, "sessions_completed", 0)
+		reconcile_therapy_plan_totals(plan.name)
+		self.assertEqual(get_totals(), (1, 0, 0, "In Progress"))
+		self.assertEqual(
+			frappe.db.get_value("Therapy Plan Detail", {"parent": plan.name}, "sessions_completed"), 1
+		)
+
 
 def create_therapy_plan(template=None, patient=None):
 	if not patient:
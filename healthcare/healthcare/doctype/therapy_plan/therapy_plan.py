@@ -5,7 +5,9 @@
 
 import frappe
 from frappe.model.document import Document
-from frappe.utils import flt, today
+from frappe.query_builder import Case
+from frappe.query_builder.functions import Coalesce, Count, Sum
+from frappe.utils import flt, now, today
 import json
 from healthcare.healthcare.utils import validate_nursing_tasks
 from erpnext.stock.get_item_details import get_item_details, get_pos_profile
@@ -18,23 +20,14 @@ class TherapyPlan(Document):
 	def validate(self):
 		self.set_totals()
 		self.set_status()
-		
-	def after_insert(self):
-		get_invoiced_details(self)
-	
-	def on_update(self):
-		get_invoiced_details(self)
+
 	def on_submit(self):
 		validate_nursing_tasks(self)
 
 	def set_status(self):
-		if not self.total_sessions_completed:
-			self.status = "Not Started"
-		else:
-			if self.total_sessions_completed < self.total_sessions:
-				self.status = "In Progress"
-			elif self.total_sessions_completed == self.total_sessions:
-				self.status = "Completed"
+		self.status = get_therapy_plan_status(
+			self.total_sessions, self.total_sessions_completed, self.status
+		)
 
 	def set_totals(self):
 		total_sessions = 0
@@ -45,61 +38,24 @@ class TherapyPlan(Document):
 			if entry.sessions_completed:
 				total_sessions_completed += entry.sessions_completed
 
-		self.db_set("total_sessions", total_sessions)
-		self.db_set("total_sessions_completed", total_sessions_completed)
+		self.total_sessions = total_sessions
+		self.total_sessions_completed = total_sessions_completed
 
-		# for billing details
+		# for billing details, invoiced quantity and amount are counters kept by the
+		# session and invoice events, see update_sessions_completed and update_invoiced_totals
+		therapy_types = frappe.get_all(
+			"Therapy Type",
+			filters={"name": ("in", [row.therapy_type for row in self.therapy_plan_details])},
+			fields=["name", "is_billable", "rate"],
+		)
+		therapy_types = {therapy_type.name: therapy_type for therapy_type in therapy_types}
 		total_charges = 0
 		for row in self.therapy_plan_details:
-			doc = frappe.get_doc("Therapy Type", row.therapy_type)
-			if doc.is_billable:
-				no_of_sessions = row.no_of_sessions  or 0
-				total_charges += doc.rate * no_of_sessions
+			therapy_type = therapy_types.get(row.therapy_type)
+			if therapy_type and therapy_type.is_billable:
+				total_charges += flt(therapy_type.rate) * (row.no_of_sessions or 0)
 		self.total_plan_amount = total_charges
 
-		invoices = frappe.db.sql("""
-			SELECT 
-				si.name, 
-				COALESCE(SUM(sii.amount), 0) AS therapy_amount
-			FROM `tabSales Invoice` si
-			LEFT JOIN `tabSales Invoice Item` sii 
-				ON sii.parent = si.name
-			WHERE 
-				si.docstatus = 1
-				AND sii.reference_dt = 'Therapy Plan'
-				AND sii.reference_dn = %(therapy_plan)s
-			GROUP BY si.name
-		""", {"therapy_plan": self.name}, as_dict=1)
-
-		therapy_sessions = frappe.db.get_list(
-			"Therapy Session", {"therapy_plan": self.name}, pluck="name"
-		)
-
-		if therapy_sessions:
-			condition = " AND sii.reference_dn in ({})".format(
-				",".join([frappe.db.escape(l) for l in therapy_sessions])
-			)
-
-			invoices += frappe.db.sql(f"""
-				SELECT 
-					si.name, 
-					COALESCE(SUM(sii.amount), 0) AS therapy_amount
-				FROM `tabSales Invoice` si
-				LEFT JOIN `tabSales Invoice Item` sii 
-					ON sii.parent = si.name
-				WHERE 
-					si.docstatus = 1
-					AND sii.reference_dt = 'Therapy Session'
-					{condition}
-				GROUP BY si.name
-			""", as_dict=1)
-
-
-		paid_amount = 0
-		for row in invoices:
-			paid_amount += row.therapy_amount
-		self.invoiced_amount = paid_amount
-
 	@frappe.whitelist()
 	def set_therapy_details_from_template(self):
 		# Add therapy types in the child table
@@ -115,6 +71,186 @@ class TherapyPlan(Document):
 
 
 
+def get_therapy_plan_status(total_sessions, total_sessions_completed, status=None):
+	if not total_sessions_completed:
+		return "Not Started"
+	if total_sessions_completed < total_sessions:
+		return "In Progress"
+	if total_sessions_completed == total_sessions:
+		return "Completed"
+	return status
+
+
+def update_sessions_completed(therapy_plan, therapy_type, delta):
+	"""
+	Add `delta` submitted sessions of `therapy_type` to the completed counters of the plan
+	:param delta: 1 on session submit, -1 on cancel
+	"""
+	detail = frappe.qb.DocType("Therapy Plan Detail")
+	condition = (
+		(detail.parent == therapy_plan)
+		& (detail.parenttype == "Therapy Plan")
+		& (detail.therapy_type == therapy_type)
+	)
+	rows = frappe.db.count(
+		"Therapy Plan Detail",
+		{"parent": therapy_plan, "parenttype": "Therapy Plan", "therapy_type": therapy_type},
+	)
+	if not rows:
+		return
+
+	(
+		frappe.qb.update(detail)
+		.set(detail.sessions_completed, detail.sessions_completed + delta)
+		.where(condition)
+	).run()
+
+	plan = frappe.qb.DocType("Therapy Plan")
+	(
+		frappe.qb.update(plan)
+		.set(plan.total_sessions_completed, plan.total_sessions_completed + delta * rows)
+		.set(plan.modified, now())
+		.where(plan.name == therapy_plan)
+	).run()
+	update_therapy_plan_status([therapy_plan])
+
+
+def update_invoiced_totals(therapy_plan, qty, amount):
+	"""
+	Add the invoiced quantity and amount of an invoice to the counters of the plan,
+	negative values take them back on invoice cancel
+	"""
+	plan = frappe.qb.DocType("Therapy Plan")
+	(
+		frappe.qb.update(plan)
+		.set(plan.total_invoiced_session, plan.total_invoiced_session + qty)
+		.set(plan.invoiced_amount, plan.invoiced_amount + amount)
+		.set(plan.modified, now())
+		.where(plan.name == therapy_plan)
+	).run()
+
+
+def update_therapy_plan_status(therapy_plans=None):
+	plan = frappe.qb.DocType("Therapy Plan")
+	status = (
+		Case()
+		.when(plan.total_sessions_completed == 0, "Not Started")
+		.when(plan.total_sessions_completed < plan.total_sessions, "In Progress")
+		.when(plan.total_sessions_completed == plan.total_sessions, "Completed")
+		.else_(plan.status)
+	)
+	query = frappe.qb.update(plan).set(plan.status, status)
+	if therapy_plans:
+		query = query.where(plan.name.isin(therapy_plans))
+	query.run()
+
+
+@frappe.whitelist()
+def reconcile_therapy_plan_totals(therapy_plan=None):
+	"""
+	Recompute the session and invoiced counters of therapy plans from the submitted
+	sessions and invoices, e.g.
+	bench execute healthcare.healthcare.doctype.therapy_plan.therapy_plan.reconcile_therapy_plan_totals
+	:param therapy_plan: Reconcile only this plan, all plans if not set
+	"""
+	frappe.only_for(["System Manager", "Healthcare Administrator"])
+
+	session = frappe.qb.DocType("Therapy Session")
+	completed_query = (
+		frappe.qb.from_(session)
+		.select(session.therapy_plan, session.therapy_type, Count(session.name))
+		.where(session.docstatus == 1)
+		.where(Coalesce(session.therapy_plan, "") != "")
+		.groupby(session.therapy_plan, session.therapy_type)
+	)
+	if therapy_plan:
+		completed_query = completed_query.where(session.therapy_plan == therapy_plan)
+	completed = {(plan, therapy_type): count for plan, therapy_type, count in completed_query.run()}
+
+	detail_filters = {"parenttype": "Therapy Plan"}
+	plan_filters = {}
+	if therapy_plan:
+		detail_filters["parent"] = therapy_plan
+		plan_filters["name"] = therapy_plan
+
+	details, plans = {}, {}
+	for plan in frappe.get_all("Therapy Plan", filters=plan_filters, pluck="name"):
+		plans[plan] = {
+			"total_sessions": 0,
+			"total_sessions_completed": 0,
+			"total_invoiced_session": 0,
+			"invoiced_amount": 0,
+		}
+	for detail in frappe.get_all(
+		"Therapy Plan Detail",
+		filters=detail_filters,
+		fields=["name", "parent", "therapy_type", "no_of_sessions"],
+	):
+		sessions_completed = completed.get((detail.parent, detail.therapy_type), 0)
+		details[detail.name] = {"sessions_completed": sessions_completed}
+		if detail.parent in plans:
+			plans[detail.parent]["total_sessions"] += detail.no_of_sessions or 0
+			plans[detail.parent]["total_sessions_completed"] += sessions_completed
+
+	for plan, qty, amount in get_invoiced_totals(therapy_plan):
+		if plan in plans:
+			plans[plan]["total_invoiced_session"] += flt(qty)
+			plans[plan]["invoiced_amount"] += flt(amount)
+
+	bulk_update("Therapy Plan Detail", details)
+	bulk_update("Therapy Plan", plans)
+
+	update_therapy_plan_status([therapy_plan] if therapy_plan else None)
+
+
+def get_invoiced_totals(therapy_plan=None):
+	"""Invoiced (therapy_plan, qty, amount) of the plans, billed directly or through their sessions"""
+	invoice = frappe.qb.DocType("Sales Invoice")
+	invoice_item = frappe.qb.DocType("Sales Invoice Item")
+	session = frappe.qb.DocType("Therapy Session")
+
+	plan_query = (
+		frappe.qb.from_(invoice_item)
+		.inner_join(invoice)
+		.on(invoice.name == invoice_item.parent)
+		.select(invoice_item.reference_dn, Sum(invoice_item.qty), Sum(invoice_item.amount))
+		.where(invoice.docstatus == 1)
+		.where(invoice_item.reference_dt == "Therapy Plan")
+		.groupby(invoice_item.reference_dn)
+	)
+	session_query = (
+		frappe.qb.from_(invoice_item)
+		.inner_join(invoice)
+		.on(invoice.name == invoice_item.parent)
+		.inner_join(session)
+		.on(session.name == invoice_item.reference_dn)
+		.select(session.therapy_plan, Sum(invoice_item.qty), Sum(invoice_item.amount))
+		.where(invoice.docstatus == 1)
+		.where(invoice_item.reference_dt == "Therapy Session")
+		.groupby(session.therapy_plan)
+	)
+	if therapy_plan:
+		plan_query = plan_query.where(invoice_item.reference_dn == therapy_plan)
+		session_query = session_query.where(session.therapy_plan == therapy_plan)
+
+	return [*plan_query.run(), *session_query.run()]
+
+
+def bulk_update(doctype, values, chunk_size=500):
+	"""Write {name: {fieldname: value}} with one CASE update per chunk of documents"""
+	table = frappe.qb.DocType(doctype)
+	names = list(values)
+	for i in range(0, len(names), chunk_size):
+		chunk = names[i : i + chunk_size]
+		query = frappe.qb.update(table)
+		for fieldname in values[chunk[0]]:
+			case = Case()
+			for name in chunk:
+				case = case.when(table.name == name, values[name][fieldname])
+			query = query.set(table[fieldname], case)
+		query.where(table.name.isin(chunk)).run()
+
+
 @frappe.whitelist()
 def get_invoiced_details(self, on_referesh = False):
 	if on_referesh:
@@ -23,6 +23,7 @@ from healthcare.healthcare.doctype.nursing_task.nursing_task import NursingTask
 from healthcare.healthcare.doctype.service_request.service_request import (
 	update_service_request_status,
 )
+from healthcare.healthcare.doctype.therapy_plan.therapy_plan import update_sessions_completed
 from healthcare.healthcare.utils import validate_nursing_tasks
 
 
@@ -41,11 +42,17 @@ class TherapySession(Document):
 					self.invoice_separately_as_consumables = True
 
 		if(self.therapy_plan):
-			therapy_plan = frappe.get_doc("Therapy Plan", self.therapy_plan)
-			for row in therapy_plan.therapy_plan_details:
-				if row.therapy_type == self.therapy_type:
-					if row.no_of_sessions == row.sessions_completed:
-						frappe.throw("Maximum number of sessions {0} already created for this Therapy Plan.".format(row.sessions_completed))
+			for row in frappe.get_all(
+				"Therapy Plan Detail",
+				filters={
+					"parent": self.therapy_plan,
+					"parenttype": "Therapy Plan",
+					"therapy_type": self.therapy_type,
+				},
+				fields=["no_of_sessions", "sessions_completed"],
+			):
+				if row.no_of_sessions == row.sessions_completed:
+					frappe.throw("Maximum number of sessions {0} already created for this Therapy Plan.".format(row.sessions_completed))
 	def after_insert(self):
 		if self.service_request:
 			update_service_request_status(
@@ -110,9 +117,6 @@ class TherapySession(Document):
 	def on_submit(self):
 		validate_nursing_tasks(self)
 		self.update_sessions_count_in_therapy_plan()
-		if(self.therapy_plan):
-			doc = frappe.get_doc("Therapy Plan", self.therapy_plan)
-			doc.set_totals()
 		if self.service_request:
 			frappe.db.set_value("Service Request", self.service_request, "status", "Completed")
 
@@ -127,14 +131,8 @@ class TherapySession(Document):
 			)
 
 	def update_sessions_count_in_therapy_plan(self, on_cancel=False):
-		therapy_plan = frappe.get_doc("Therapy Plan", self.therapy_plan)
-		for entry in therapy_plan.therapy_plan_details:
-			if entry.therapy_type == self.therapy_type:
-				if on_cancel:
-					entry.sessions_completed -= 1
-				else:
-					entry.sessions_completed += 1
-		therapy_plan.save()
+		if self.therapy_plan:
+			update_sessions_completed(self.therapy_plan, self.therapy_type, -1 if on_cancel else 1)
 
 	def set_total_counts(self):
 		target_total = 0
@@ -17,7 +17,7 @@ class PatientHistory {
 		this.page = wrapper.page;
 		this.sidebar = this.wrapper.find('.layout-side-section');
 		this.main_section = this.wrapper.find('.layout-main-section');
-		this.start = 0;
+		this.cursor = null;
 	}
 
 	show() {
@@ -36,7 +36,7 @@ class PatientHistory {
 				change: () => {
 					me.patient_id = '';
 					if (me.patient_id != patient.get_value() && patient.get_value()) {
-						me.start = 0;
+						me.cursor = null;
 						me.patient_id = patient.get_value();
 						me.make_patient_profile();
 					}
@@ -78,7 +78,7 @@ class PatientHistory {
 					fieldname: 'document_type',
 					placeholder: __('Select Document Type'),
 					change: () => {
-						me.start = 0;
+						me.cursor = null;
 						me.page.main.find('.patient_documents_list').html('');
 						this.setup_documents(doctype_filter.get_value(), date_range_field.get_value());
 					},
@@ -104,7 +104,7 @@ class PatientHistory {
 					change: () => {
 						let selected_date_range = date_range_field.get_value();
 						if (selected_date_range && selected_date_range.length === 2) {
-							me.start = 0;
+							me.cursor = null;
 							me.page.main.find('.patient_documents_list').html('');
 							this.setup_documents(doctype_filter.get_value(), date_range_field.get_value());
 						}
@@ -117,9 +117,12 @@ class PatientHistory {
 	}
 
 	setup_documents(document_types="", selected_date_range="") {
+		this.document_types = document_types;
+		this.selected_date_range = selected_date_range;
+
 		let filters = {
 			name: this.patient_id,
-			start: this.start,
+			cursor: this.cursor,
 			page_length: 20
 		};
 		if (document_types)
@@ -129,10 +132,11 @@ class PatientHistory {
 
 		let me = this;
 		frappe.call({
-			'method': 'healthcare.healthcare.page.patient_history.patient_history.get_feed',
+			'method': 'healthcare.healthcare.page.patient_history.patient_history.get_feed_page',
 			args: filters,
 			callback: function(r) {
-				let data = r.message;
+				let data = r.message.records;
+				me.cursor = r.message.cursor;
 				if (data.length) {
 					me.add_to_records(data);
 				} else {
@@ -213,9 +217,8 @@ class PatientHistory {
 		}
 
 		this.page.main.find('.patient_documents_list').append(details);
-		this.start += data.length;
 
-		if (data.length === 20) {
+		if (this.cursor) {
 			this.page.main.find(".btn-get-records").show();
 		} else {
 			this.page.main.find(".btn-get-records").hide();
@@ -355,7 +358,7 @@ class PatientHistory {
 		});
 
 		me.page.main.on('click', '.btn-get-records', function() {
-			this.setup_documents();
+			me.setup_documents(me.document_types, me.selected_date_range);
 		});
 	}
 
@@ -3,9 +3,12 @@
 # For license information, please see license.txt
 
 
+import base64
 import json
 
 import frappe
+from frappe import _
+from frappe.query_builder import Order
 from frappe.utils import cint
 
 
@@ -26,6 +29,80 @@ def get_feed(name, document_types=None, date_range=None, start=0, page_length=20
 	return result
 
 
+@frappe.whitelist()
+def get_feed_page(name, document_types=None, date_range=None, cursor=None, page_length=20, with_subject=1):
+	"""
+	Return a page of the medical records of a patient, newest first, with the cursor of the next page.
+	Pages are read by (communication_date, name) so deep pages cost as much as the first one
+	:param cursor: Continuation token of the previous page, first page if not set
+	:param with_subject: Return the subject (HTML) of the records
+	"""
+	page_length = cint(page_length) or 20
+	communication_date = record_name = None
+	if cursor:
+		communication_date, record_name = decode_feed_cursor(cursor)
+
+	fields = ["name", "owner", "communication_date", "reference_doctype", "reference_name"]
+	if cint(with_subject):
+		fields.append("subject")
+
+	record = frappe.qb.DocType("Patient Medical Record")
+	query = frappe.qb.from_(record).select(*(record[fieldname] for fieldname in fields))
+	for fieldname, value in get_filters(name, document_types, date_range).items():
+		if not isinstance(value, list):
+			query = query.where(record[fieldname] == value)
+		elif value[0].lower() == "in":
+			query = query.where(record[fieldname].isin(value[1]))
+		elif value[0].lower() == "between":
+			query = query.where(record[fieldname].between(*value[1]))
+
+	# the raw column is compared so that pages are read from the (patient, communication_date) index
+	records = []
+	if not cursor or communication_date:
+		dated = query.where(record.communication_date.isnotnull())
+		if cursor:
+			dated = dated.where(
+				(record.communication_date < communication_date)
+				| ((record.communication_date == communication_date) & (record.name < record_name))
+			)
+		records = (
+			dated.orderby(record.communication_date, order=Order.desc)
+			.orderby(record.name, order=Order.desc)
+			.limit(page_length + 1)
+		).run(as_dict=True)
+
+	# records without a date are paged after all the dated ones
+	if len(records) <= page_length:
+		undated = query.where(record.communication_date.isnull())
+		if cursor and not communication_date:
+			undated = undated.where(record.name < record_name)
+		records += (
+			undated.orderby(record.name, order=Order.desc).limit(page_length + 1 - len(records))
+		).run(as_dict=True)
+
+	next_cursor = None
+	if len(records) > page_length:
+		records = records[:page_length]
+		next_cursor = encode_feed_cursor(records[-1])
+
+	return {"records": records, "cursor": next_cursor}
+
+
+def encode_feed_cursor(record):
+	communication_date = str(record.communication_date) if record.communication_date else None
+	key = json.dumps([communication_date, record.name])
+	return base64.urlsafe_b64encode(key.encode()).decode()
+
+
+def decode_feed_cursor(cursor):
+	try:
+		communication_date, record_name = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+	except (ValueError, TypeError):
+		frappe.throw(_("Invalid patient history cursor"))
+
+	return communication_date, record_name
+
+
 def get_filters(name, document_types=None, date_range=None):
 	filters = {"patient": name}
 	if document_types:
@@ -59,13 +136,8 @@ def get_feed_for_dt(doctype, docname):
 
 @frappe.whitelist()
 def get_patient_history_doctypes():
-	document_types = []
-	settings = frappe.get_single("Patient History Settings")
-
-	for entry in settings.standard_doctypes:
-		document_types.append(entry.document_type)
-
-	for entry in settings.custom_doctypes:
-		document_types.append(entry.document_type)
+	from healthcare.healthcare.doctype.patient_history_settings.patient_history_settings import (
+		get_patient_history_config_map,
+	)
 
-	return document_types
+	return list(get_patient_history_config_map())
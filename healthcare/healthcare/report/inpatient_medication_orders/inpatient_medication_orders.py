@@ -4,10 +4,6 @@
 
 import frappe
 
-from healthcare.healthcare.doctype.inpatient_medication_entry.inpatient_medication_entry import (
-	get_current_healthcare_service_unit,
-)
-
 
 def execute(filters=None):
 	columns = get_columns()
@@ -85,27 +81,51 @@ def get_columns():
 def get_data(filters):
 	conditions, values = get_conditions(filters)
 
-	data = frappe.db.sql(
-		"""
-		SELECT
-			parent.patient, parent.inpatient_record, parent.practitioner,
-			child.drug, child.drug_name, child.dosage, child.dosage_form,
-			child.date, child.time, child.is_completed, child.name
-		FROM `tabInpatient Medication Order` parent
-		INNER JOIN `tabInpatient Medication Order Entry` child
-		ON child.parent = parent.name
-		WHERE
-			parent.docstatus = 1
-			{conditions}
-		ORDER BY date, time
-	""".format(
-			conditions=conditions
-		),
-		values,
-		as_dict=1,
-	)
-
-	data = get_inpatient_details(data, filters.get("service_unit"))
+	# the current service unit is the last occupancy of an admitted inpatient record and the
+	# entry is the submitted Inpatient Medication Entry that completed the order
+	data = []
+	with frappe.db.unbuffered_cursor():
+		for entry in frappe.db.sql(
+			"""
+			SELECT
+				parent.patient, parent.inpatient_record, parent.practitioner,
+				child.drug, child.drug_name, child.dosage, child.dosage_form,
+				child.date, child.time, child.is_completed,
+				occupancy.service_unit AS healthcare_service_unit,
+				(
+					SELECT MAX(detail.parent)
+					FROM `tabInpatient Medication Entry Detail` detail
+					WHERE detail.against_imoe = child.name AND detail.docstatus = 1
+				) AS inpatient_medication_entry
+			FROM `tabInpatient Medication Order` parent
+			INNER JOIN `tabInpatient Medication Order Entry` child
+			ON child.parent = parent.name
+			LEFT JOIN `tabInpatient Record` ip_record
+			ON ip_record.name = parent.inpatient_record
+				AND ip_record.status IN ('Admitted', 'Discharge Scheduled')
+			LEFT JOIN `tabInpatient Occupancy` occupancy
+			ON occupancy.parent = ip_record.name
+				AND occupancy.parenttype = 'Inpatient Record'
+				AND occupancy.idx = (
+					SELECT MAX(last_occupancy.idx)
+					FROM `tabInpatient Occupancy` last_occupancy
+					WHERE last_occupancy.parent = ip_record.name
+						AND last_occupancy.parenttype = 'Inpatient Record'
+				)
+			WHERE
+				parent.docstatus = 1
+				{conditions}
+			ORDER BY child.date, child.time
+		""".format(
+				conditions=conditions
+			),
+			values,
+			as_dict=1,
+			as_iterator=True,
+		):
+			if not entry.is_completed:
+				entry.pop("inpatient_medication_entry", None)
+			data.append(entry)
 
 	return data
 
@@ -130,34 +150,14 @@ def get_conditions(filters):
 	if not filters.get("show_completed_orders"):
 		conditions += " AND child.is_completed = 0"
 
-	return conditions, values
+	if filters.get("service_unit"):
+		# orders of patients not currently admitted to any service unit are kept
+		conditions += (
+			" AND (occupancy.service_unit IS NULL OR occupancy.service_unit = %(service_unit)s)"
+		)
+		values["service_unit"] = filters.get("service_unit")
 
-
-def get_inpatient_details(data, service_unit):
-	service_unit_filtered_data = []
-
-	for entry in data:
-		entry["healthcare_service_unit"] = get_current_healthcare_service_unit(entry.inpatient_record)
-		if entry.is_completed:
-			entry["inpatient_medication_entry"] = get_inpatient_medication_entry(entry.name)
-
-		if (
-			service_unit and entry.healthcare_service_unit and service_unit != entry.healthcare_service_unit
-		):
-			service_unit_filtered_data.append(entry)
-
-		entry.pop("name", None)
-
-	for entry in service_unit_filtered_data:
-		data.remove(entry)
-
-	return data
-
-
-def get_inpatient_medication_entry(order_entry):
-	return frappe.db.get_value(
-		"Inpatient Medication Entry Detail", {"against_imoe": order_entry}, "parent"
-	)
+	return conditions, values
 
 
 def get_chart_data(data):
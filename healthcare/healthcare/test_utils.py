@@ -1,5 +1,7 @@
 import frappe
 from frappe import DuplicateEntryError
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import now, nowdate
 
 
 def create_encounter(patient, practitioner, submit=False):
@@ -10,3 +12,217 @@ def create_encounter(patient, practitioner, submit=False):
 	if submit:
 		encounter.submit()
 	return encounter
+
+
+class TestHealthcareServicesToInvoice(FrappeTestCase):
+	def test_services_to_invoice_with_thousands_of_unbilled_records(self):
+		from healthcare.healthcare.doctype.healthcare_billable_item.healthcare_billable_item import (
+			rebuild_billable_items,
+		)
+		from healthcare.healthcare.doctype.lab_test.test_lab_test import create_lab_test_template
+		from healthcare.healthcare.doctype.patient_appointment.test_patient_appointment import (
+			create_appointment,
+			create_healthcare_docs,
+		)
+		from healthcare.healthcare.utils import get_healthcare_services_to_invoice
+
+		frappe.db.set_single_value("Healthcare Settings", "show_payment_popup", 0)
+		frappe.db.set_single_value("Healthcare Settings", "enable_free_follow_ups", 0)
+		patient, practitioner = create_healthcare_docs(id=21)
+		appointment = create_appointment(patient, practitioner, nowdate())
+		template = create_lab_test_template()
+		insert_unbilled_records(appointment, template.name, count=2000)
+
+		# lookups are shared across rows, so the number of queries does not grow with the records
+		with self.assertQueryCount(80):
+			rebuild_billable_items(patient)
+
+		items = get_healthcare_services_to_invoice(patient, None, "_Test Company")
+
+		appointments = [item for item in items if item["reference_type"] == "Patient Appointment"]
+		lab_tests = [item for item in items if item["reference_type"] == "Lab Test"]
+		self.assertEqual(len(appointments), 2001)
+		self.assertEqual(len(lab_tests), 2000)
+		self.assertTrue(all(item["rate"] == 500 for item in appointments))
+		self.assertTrue(all(item["service"] == template.item for item in lab_tests))
+
+
+class TestTherapySessionsToInvoice(FrappeTestCase):
+	def test_therapy_sessions_to_invoice_with_thousands_of_template_plans(self):
+		from healthcare.healthcare.doctype.patient_appointment.test_patient_appointment import (
+			create_healthcare_docs,
+		)
+		from healthcare.healthcare.doctype.therapy_type.test_therapy_type import create_therapy_type
+		from healthcare.healthcare.utils import get_therapy_sessions_to_invoice
+
+		patient, _ = create_healthcare_docs(id=22)
+		therapy_type = create_therapy_type()
+		# template plans of other patients must not be scanned when billing this patient
+		insert_therapy_plans([("_Test Other Patient", "_Test Therapy Plan Template")] * 20000)
+		plan, template_plan = insert_therapy_plans(
+			[(patient, None), (patient, "_Test Therapy Plan Template")]
+		)
+		billable = insert_therapy_sessions(patient, therapy_type.name, plan, count=3)
+		# sessions of template plans are billed with the plan
+		insert_therapy_sessions(patient, therapy_type.name, template_plan, count=3)
+		# sessions ordered through a service request are billed with the request
+		insert_therapy_sessions(
+			patient, therapy_type.name, plan, count=2, service_request="_Test Service Request"
+		)
+
+		with self.assertQueryCount(1):
+			items = get_therapy_sessions_to_invoice(frappe._dict(name=patient), "_Test Company")
+
+		self.assertEqual({item["reference_name"] for item in items}, set(billable))
+		self.assertTrue(all(item["reference_type"] == "Therapy Session" for item in items))
+		self.assertTrue(all(item["service"] == therapy_type.item for item in items))
+
+
+def insert_therapy_plans(plans):
+	"""Insert Therapy Plans from (patient, therapy_plan_template) pairs, return their names"""
+	timestamp, user = now(), frappe.session.user
+	names = [frappe.generate_hash(length=10) for _ in plans]
+	frappe.db.bulk_insert(
+		"Therapy Plan",
+		[
+			"name",
+			"creation",
+			"modified",
+			"owner",
+			"modified_by",
+			"patient",
+			"company",
+			"start_date",
+			"therapy_plan_template",
+		],
+		[
+			(name, timestamp, timestamp, user, user, patient, "_Test Company", nowdate(), template)
+			for name, (patient, template) in zip(names, plans)
+		],
+	)
+	return names
+
+
+def insert_therapy_sessions(patient, therapy_type, therapy_plan, count, service_request=None):
+	timestamp, user = now(), frappe.session.user
+	names = [frappe.generate_hash(length=10) for _ in range(count)]
+	frappe.db.bulk_insert(
+		"Therapy Session",
+		[
+			"name",
+			"creation",
+			"modified",
+			"owner",
+			"modified_by",
+			"docstatus",
+			"patient",
+			"company",
+			"therapy_type",
+			"therapy_plan",
+			"start_date",
+			"duration",
+			"invoiced",
+			"service_request",
+		],
+		[
+			(
+				name,
+				timestamp,
+				timestamp,
+				user,
+				user,
+				1,
+				patient,
+				"_Test Company",
+				therapy_type,
+				therapy_plan,
+				nowdate(),
+				30,
+				0,
+				service_request,
+			)
+			for name in names
+		],
+	)
+	return names
+
+
+def insert_unbilled_records(appointment, lab_test_template, count):
+	timestamp, user = now(), frappe.session.user
+	appointments, lab_tests = [], []
+	for _ in range(count):
+		appointments.append(
+			(
+				frappe.generate_hash(length=10),
+				timestamp,
+				timestamp,
+				user,
+				user,
+				appointment.patient,
+				appointment.practitioner,
+				appointment.department,
+				appointment.appointment_type,
+				appointment.company,
+				appointment.appointment_date,
+				appointment.appointment_time,
+				appointment.duration,
+				"Scheduled",
+				0,
+			)
+		)
+		lab_tests.append(
+			(
+				frappe.generate_hash(length=10),
+				timestamp,
+				timestamp,
+				user,
+				user,
+				1,
+				appointment.patient,
+				"Female",
+				lab_test_template,
+				appointment.company,
+				appointment.appointment_date,
+				0,
+			)
+		)
+
+	frappe.db.bulk_insert(
+		"Patient Appointment",
+		[
+			"name",
+			"creation",
+			"modified",
+			"owner",
+			"modified_by",
+			"patient",
+			"practitioner",
+			"department",
+			"appointment_type",
+			"company",
+			"appointment_date",
+			"appointment_time",
+			"duration",
+			"status",
+			"invoiced",
+		],
+		appointments,
+	)
+	frappe.db.bulk_insert(
+		"Lab Test",
+		[
+			"name",
+			"creation",
+			"modified",
+			"owner",
+			"modified_by",
+			"docstatus",
+			"patient",
+			"patient_sex",
+			"template",
+			"company",
+			"date",
+			"invoiced",
+		],
+		lab_tests,
+	)
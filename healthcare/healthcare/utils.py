@@ -9,15 +9,22 @@ import math
 
 import frappe
 from frappe import _
+from frappe.query_builder import Case, Order
+from frappe.query_builder.functions import Coalesce, Count, Sum
 from frappe.utils import cint, cstr, flt, get_link_to_form, rounded, time_diff_in_hours
 from frappe.utils.formatters import format_value
 
 from erpnext.setup.utils import insert_record
 
+from healthcare.healthcare.doctype.healthcare_billable_item.healthcare_billable_item import (
+	get_billable_items_to_invoice,
+	set_billable_item_status,
+	update_billable_items,
+)
 from healthcare.healthcare.doctype.healthcare_settings.healthcare_settings import (
 	get_income_account,
 )
-from healthcare.healthcare.doctype.lab_test.lab_test import create_multiple
+from healthcare.healthcare.doctype.lab_test.lab_test import create_lab_tests_from_invoice_submit
 from healthcare.healthcare.doctype.observation.observation import add_observation
 from healthcare.healthcare.doctype.observation_template.observation_template import (
 	get_observation_template_details,
@@ -30,23 +37,76 @@ def get_healthcare_services_to_invoice(patient, customer, company, link_customer
 	patient = frappe.get_doc("Patient", patient)
 	if not customer:
 		customer = patient.customer
-	items_to_invoice = []
 	if patient:
-		# Customer validated, build a list of billable services
-		items_to_invoice += get_appointments_to_invoice(patient, company)
-		items_to_invoice += get_encounters_to_invoice(patient, company)
-		items_to_invoice += get_lab_tests_to_invoice(patient, company)
-		items_to_invoice += get_clinical_procedures_to_invoice(patient, company)
-		items_to_invoice += get_inpatient_services_to_invoice(patient, company)
-		items_to_invoice += get_therapy_plans_to_invoice(patient, company)
-		items_to_invoice += get_therapy_sessions_to_invoice(patient, company)
-		items_to_invoice += get_service_requests_to_invoice(patient, company)
-		items_to_invoice += get_observations_to_invoice(patient, company)
-		items_to_invoice += get_package_subscriptions_to_invoice(patient, company)
+		# billable services are kept in the Healthcare Billable Item ledger by the
+		# collectors below as their documents are submitted, updated or cancelled
+		items_to_invoice = get_billable_items_to_invoice(patient.name, company)
 		validate_customer_created(patient, customer, link_customer)
 		return items_to_invoice
 
 
+class BillingLookups:
+	"""
+	Lookup maps shared by the unbilled services collectors of one ledger sync.
+	Templates, items and billing details are fetched with one query per doctype
+	for all rows of a source instead of one query per row.
+	"""
+
+	def __init__(self):
+		self.settings = frappe.get_cached_doc("Healthcare Settings")
+		self.records = {}
+		self.billing_details = {}
+		self.income_accounts = {}
+
+	def load(self, doctype, names, fields):
+		"""Fetch `fields` of all `names` of `doctype` not loaded yet in a single query"""
+		records = self.records.setdefault(doctype, {})
+		missing = list({name for name in names if name and name not in records})
+		if missing:
+			for record in frappe.get_all(
+				doctype, filters={"name": ("in", missing)}, fields=["name", *fields]
+			):
+				records[record.name] = record
+
+	def get(self, doctype, name):
+		return self.records.get(doctype, {}).get(name) or frappe._dict()
+
+	def get_item_name(self, item_code):
+		self.load("Item", [item_code], ["item_name"])
+		return self.get("Item", item_code).item_name
+
+	def get_billing_item_and_rate(self, doc):
+		"""Return the billing details of `doc`, None if its billing is not configured"""
+		# billing details only depend on these fields, see get_appointment_billing_item_and_rate
+		key = (
+			doc.get("doctype"),
+			doc.get("practitioner"),
+			doc.get("appointment_type"),
+			doc.get("department"),
+			doc.get("medical_department"),
+			doc.get("service_unit"),
+			bool(doc.get("inpatient_record")),
+		)
+		if key not in self.billing_details:
+			try:
+				self.billing_details[key] = get_appointment_billing_item_and_rate(doc)
+			except frappe.ValidationError:
+				# the service is not billable until the configuration is completed
+				frappe.clear_last_message()
+				frappe.log_error(
+					title=_("Missing Configuration"),
+					reference_doctype=doc.get("doctype"),
+					reference_name=doc.get("name"),
+				)
+				self.billing_details[key] = None
+		return self.billing_details[key]
+
+	def get_income_account(self, practitioner, company):
+		if (practitioner, company) not in self.income_accounts:
+			self.income_accounts[(practitioner, company)] = get_income_account(practitioner, company)
+		return self.income_accounts[(practitioner, company)]
+
+
 def validate_customer_created(patient, customer, link_customer):
 	message = ""
 	if link_customer:
@@ -61,26 +121,53 @@ def validate_customer_created(patient, customer, link_customer):
 		frappe.msgprint(message, alert=True)
 
 
-def get_appointments_to_invoice(patient, company):
+def get_appointments_to_invoice(patient, company, lookups=None, names=None):
+	lookups = lookups or BillingLookups()
 	appointments_to_invoice = []
-	patient_appointments = frappe.get_list(
+	filters = {
+		"patient": patient.name,
+		"company": company,
+		"invoiced": 0,
+		"status": ["!=", "Cancelled"],
+	}
+	if names:
+		filters["name"] = ("in", names)
+	patient_appointments = frappe.get_all(
 		"Patient Appointment",
-		fields="*",
-		filters={
-			"patient": patient.name,
-			"company": company,
-			"invoiced": 0,
-			"status": ["!=", "Cancelled"],
-		},
+		fields=[
+			"name",
+			"procedure_template",
+			"practitioner",
+			"appointment_date",
+			"appointment_type",
+			"department",
+			"service_unit",
+			"inpatient_record",
+			"company",
+		],
+		filters=filters,
 		order_by="appointment_date desc",
 	)
 
+	lookups.load(
+		"Clinical Procedure Template",
+		[appointment.procedure_template for appointment in patient_appointments],
+		["is_billable"],
+	)
+	free_follow_ups = set()
+	if lookups.settings.enable_free_follow_ups and patient_appointments:
+		free_follow_ups = set(
+			frappe.get_all(
+				"Fee Validity Reference",
+				filters={"appointment": ("in", [appointment.name for appointment in patient_appointments])},
+				pluck="appointment",
+			)
+		)
+
 	for appointment in patient_appointments:
 		# Procedure Appointments
 		if appointment.procedure_template:
-			if frappe.db.get_value(
-				"Clinical Procedure Template", appointment.procedure_template, "is_billable"
-			):
+			if lookups.get("Clinical Procedure Template", appointment.procedure_template).is_billable:
 				appointments_to_invoice.append(
 					{
 						"reference_type": "Patient Appointment",
@@ -92,28 +179,23 @@ def get_appointments_to_invoice(patient, company):
 				)
 		# Consultation Appointments, should check fee validity
 		else:
-			if frappe.db.get_single_value(
-				"Healthcare Settings", "enable_free_follow_ups"
-			) and frappe.db.exists("Fee Validity Reference", {"appointment": appointment.name}):
+			if appointment.name in free_follow_ups:
 				continue  # Skip invoicing, fee validty present
-			practitioner_charge = 0
-			income_account = None
 			service_item = None
 			service_name=None
 			if appointment.practitioner:
-				details = get_appointment_billing_item_and_rate(appointment)
+				details = lookups.get_billing_item_and_rate(appointment)
+				if not details:
+					continue
 				service_item = details.get("service_item")
-				service_name=frappe.db.get_value("Item",service_item,"item_name")
-				practitioner_charge = details.get("practitioner_charge")
-				income_account = get_income_account(appointment.practitioner, appointment.company)
+				service_name = lookups.get_item_name(service_item)
+			# the charge is set at invoice time, see set_consultation_charges
 			appointments_to_invoice.append(
 				{
 					"reference_type": "Patient Appointment",
 					"reference_name": appointment.name,
 					"service": service_item,
 					"service_name":service_name,
-					"rate": practitioner_charge,
-					"income_account": income_account,
 					"practitioner": appointment.practitioner,
 					"date": appointment.appointment_date
 				}
@@ -121,71 +203,151 @@ def get_appointments_to_invoice(patient, company):
 
 	return appointments_to_invoice
 
-def get_package_subscriptions_to_invoice(patient, company):
+
+# fields of the consultations their charge depends on, see get_appointment_billing_item_and_rate
+CONSULTATION_FIELDS = {
+	"Patient Appointment": [
+		"procedure_template",
+		"practitioner",
+		"appointment_type",
+		"department",
+		"service_unit",
+		"inpatient_record",
+		"company",
+	],
+	"Patient Encounter": [
+		"practitioner",
+		"appointment_type",
+		"medical_department",
+		"inpatient_record",
+		"company",
+	],
+}
+
+
+def set_consultation_charges(items, lookups=None):
+	"""
+	Set the rate and income account of the consultations in `items` from the billing
+	configuration in effect now, the ledger only records which consultations are due
+	"""
+	lookups = lookups or BillingLookups()
+	for doctype, fields in CONSULTATION_FIELDS.items():
+		lookups.load(
+			doctype,
+			[item["reference_name"] for item in items if item["reference_type"] == doctype],
+			fields,
+		)
+
+	for item in items:
+		if item["reference_type"] not in CONSULTATION_FIELDS:
+			continue
+		consultation = lookups.get(item["reference_type"], item["reference_name"])
+		if not consultation.practitioner or consultation.get("procedure_template"):
+			continue
+		details = lookups.get_billing_item_and_rate(consultation)
+		if details:
+			item["rate"] = details.get("practitioner_charge")
+			item["income_account"] = lookups.get_income_account(
+				consultation.practitioner, consultation.company
+			)
+
+def get_package_subscriptions_to_invoice(patient, company, lookups=None, names=None):
+	lookups = lookups or BillingLookups()
 	subscriptions_to_invoice = []
+	filters = {
+		"patient": patient.name,
+		"company": company,
+		"invoiced": False,
+		"docstatus": 1,
+	}
+	if names:
+		filters["name"] = ("in", names)
 	subscriptions = frappe.db.get_all(
 		"Package Subscription",
 		fields=["name", "healthcare_package", "valid_to"],
-		filters={
-			"patient": patient.name,
-			"company": company,
-			"invoiced": False,
-			"docstatus": 1,
-		},
+		filters=filters,
 		order_by="valid_to desc",
 	)
+	lookups.load(
+		"Healthcare Package",
+		[sub.healthcare_package for sub in subscriptions],
+		["item", "item_wise_invoicing"],
+	)
+
+	package_details = {}
+	item_wise_subscriptions = [
+		sub.name
+		for sub in subscriptions
+		if lookups.get("Healthcare Package", sub.healthcare_package).item_wise_invoicing
+	]
+	if item_wise_subscriptions:
+		for item in frappe.get_all(
+			"Healthcare Package Item",
+			filters={
+				"parent": ("in", item_wise_subscriptions),
+				"parenttype": "Package Subscription",
+				"invoiced": 0,
+			},
+			fields=["name", "parent", "item_code"],
+			order_by="idx asc",
+		):
+			package_details.setdefault(item.parent, []).append(item)
+
 	for sub in subscriptions:
-		subscription_doc = frappe.get_doc("Package Subscription", sub.name)
-		item, item_wise_invoicing = frappe.get_cached_value(
-			"Healthcare Package", sub.healthcare_package, ["item", "item_wise_invoicing"]
-		)
-		if not item_wise_invoicing:
+		package = lookups.get("Healthcare Package", sub.healthcare_package)
+		if not package.item_wise_invoicing:
 			subscriptions_to_invoice.append(
-				{"reference_type": "Package Subscription", "reference_name": sub.name, "service": item, "date" : sub.valid_to}
+				{"reference_type": "Package Subscription", "reference_name": sub.name, "service": package.item, "date" : sub.valid_to}
 			)
 		else:
-			for item in subscription_doc.package_details:
-				if not item.invoiced:
-					subscriptions_to_invoice.append(
-						{"reference_type": item.doctype, "reference_name": item.name, "service": item.item_code , "date": sub.valid_to}
-					)
+			for item in package_details.get(sub.name, []):
+				subscriptions_to_invoice.append(
+					{"reference_type": "Healthcare Package Item", "reference_name": item.name, "service": item.item_code , "date": sub.valid_to}
+				)
 
 	return subscriptions_to_invoice
 
-def get_encounters_to_invoice(patient, company):
+def get_encounters_to_invoice(patient, company, lookups=None, names=None):
 	if not isinstance(patient, str):
 		patient = patient.name
+	lookups = lookups or BillingLookups()
 	encounters_to_invoice = []
-	encounters = frappe.get_list(
+	filters = {"patient": patient, "company": company, "invoiced": False, "docstatus": 1}
+	if names:
+		filters["name"] = ("in", names)
+	encounters = frappe.get_all(
 		"Patient Encounter",
-		fields=["*"],
-		filters={"patient": patient, "company": company, "invoiced": False, "docstatus": 1},
+		fields=[
+			"name",
+			"appointment",
+			"practitioner",
+			"inpatient_record",
+			"appointment_type",
+			"medical_department",
+			"encounter_date",
+			"company",
+		],
+		filters=filters,
 		order_by="encounter_date desc",
 	)
 	if encounters:
 		for encounter in encounters:
 			if not encounter.appointment:
-				practitioner_charge = 0
-				income_account = None
 				service_item = None
 				if encounter.practitioner:
-					if encounter.inpatient_record and frappe.db.get_single_value(
-						"Healthcare Settings", "do_not_bill_inpatient_encounters"
-					):
+					if encounter.inpatient_record and lookups.settings.do_not_bill_inpatient_encounters:
 						continue
 
-					details = get_appointment_billing_item_and_rate(encounter)
+					details = lookups.get_billing_item_and_rate(encounter)
+					if not details:
+						continue
 					service_item = details.get("service_item")
-					practitioner_charge = details.get("practitioner_charge")
-					income_account = get_income_account(encounter.practitioner, encounter.company)
 
 				encounters_to_invoice.append(
 					{
 						"reference_type": "Patient Encounter",
 						"reference_name": encounter.name,
 						"service": service_item,
-						"rate": practitioner_charge,
-						"income_account": income_account,
 						"date" : encounter.encounter_date
 					}
 				)
@@ -193,80 +355,110 @@ def get_encounters_to_invoice(patient, company):
 	return encounters_to_invoice
 
 
-def get_lab_tests_to_invoice(patient, company):
+def get_lab_tests_to_invoice(patient, company, lookups=None, names=None):
+	lookups = lookups or BillingLookups()
 	lab_tests_to_invoice = []
-	lab_tests = frappe.get_list(
+	filters = {
+		"patient": patient.name,
+		"company": company,
+		"invoiced": False,
+		"docstatus": 1,
+		"service_request": "",
+	}
+	if names:
+		filters["name"] = ("in", names)
+	lab_tests = frappe.get_all(
 		"Lab Test",
 		fields=["name", "template", "date"],
-		filters={
-			"patient": patient.name,
-			"company": company,
-			"invoiced": False,
-			"docstatus": 1,
-			"service_request": "",
-		},
+		filters=filters,
 		order_by="date desc",
 	)
+	lookups.load(
+		"Lab Test Template", [lab_test.template for lab_test in lab_tests], ["item", "is_billable"]
+	)
 	for lab_test in lab_tests:
-		item, is_billable = frappe.get_cached_value(
-			"Lab Test Template", lab_test.template, ["item", "is_billable"]
-		)
-		if is_billable:
+		template = lookups.get("Lab Test Template", lab_test.template)
+		if template.is_billable:
 			lab_tests_to_invoice.append(
-				{"reference_type": "Lab Test", "reference_name": lab_test.name, "service": item, "date":lab_test.date}
+				{"reference_type": "Lab Test", "reference_name": lab_test.name, "service": template.item, "date":lab_test.date}
 			)
 
 	return lab_tests_to_invoice
 
 
-def get_observations_to_invoice(patient, company):
+def get_observations_to_invoice(patient, company, lookups=None, names=None):
+	lookups = lookups or BillingLookups()
 	observations_to_invoice = []
-	observations = frappe.get_list(
+	filters = {
+		"patient": patient.name,
+		"company": company,
+		"invoiced": False,
+		"docstatus": 1,
+		"service_request": "",
+	}
+	if names:
+		filters["name"] = ("in", names)
+	observations = frappe.get_all(
 		"Observation",
 		fields=["name", "observation_template", "posting_date"],
-		filters={
-			"patient": patient.name,
-			"company": company,
-			"invoiced": False,
-			"docstatus": 1,
-			"service_request": "",
-		},
+		filters=filters,
 		order_by="posting_date desc",
 	)
+	lookups.load(
+		"Observation Template",
+		[observation.observation_template for observation in observations],
+		["item", "is_billable"],
+	)
 	for observation in observations:
-		item, is_billable = frappe.get_cached_value(
-			"Observation Template", observation.observation_template, ["item", "is_billable"]
-		)
-		if is_billable:
+		template = lookups.get("Observation Template", observation.observation_template)
+		if template.is_billable:
 			observations_to_invoice.append(
-				{"reference_type": "Observation", "reference_name": observation.name, "service": item, "date" : observation.posting_date}
+				{"reference_type": "Observation", "reference_name": observation.name, "service": template.item, "date" : observation.posting_date}
 			)
 
 	return observations_to_invoice
 
 
-def get_clinical_procedures_to_invoice(patient, company):
+def get_clinical_procedures_to_invoice(patient, company, lookups=None, names=None):
+	lookups = lookups or BillingLookups()
 	clinical_procedures_to_invoice = []
-	procedures = frappe.get_list(
+	filters = {
+		"patient": patient.name,
+		"company": company,
+		"invoiced": False,
+		"docstatus": 1,
+		"service_request": "",
+	}
+	if names:
+		filters["name"] = ("in", names)
+	procedures = frappe.get_all(
 		"Clinical Procedure",
-		fields="*",
-		filters={
-			"patient": patient.name,
-			"company": company,
-			"invoiced": False,
-			"docstatus": 1,
-			"service_request": "",
-		},
+		fields=[
+			"name",
+			"appointment",
+			"procedure_template",
+			"start_date",
+			"invoice_separately_as_consumables",
+			"consume_stock",
+			"status",
+			"consumption_invoiced",
+			"consumable_total_amount",
+			"consumption_details",
+		],
+		filters=filters,
 		order_by="start_date desc"
 	)
+	lookups.load(
+		"Clinical Procedure Template",
+		[procedure.procedure_template for procedure in procedures if not procedure.appointment],
+		["item", "is_billable"],
+	)
 	for procedure in procedures:
 		if not procedure.appointment:
-			item, is_billable = frappe.get_cached_value(
-				"Clinical Procedure Template", procedure.procedure_template, ["item", "is_billable"]
-			)
-			if procedure.procedure_template and is_billable:
+			template = lookups.get("Clinical Procedure Template", procedure.procedure_template)
+			if procedure.procedure_template and template.is_billable:
 				clinical_procedures_to_invoice.append(
-					{"reference_type": "Clinical Procedure", "reference_name": procedure.name, "service": item, "date" : procedure.start_date}
+					{"reference_type": "Clinical Procedure", "reference_name": procedure.name, "service": template.item, "date" : procedure.start_date}
 				)
 
 		# consumables
@@ -276,15 +468,18 @@ def get_clinical_procedures_to_invoice(patient, company):
 			and procedure.status == "Completed"
 			and not procedure.consumption_invoiced
 		):
-			service_item = frappe.db.get_single_value(
-				"Healthcare Settings", "clinical_procedure_consumable_item"
-			)
+			service_item = lookups.settings.clinical_procedure_consumable_item
 			if not service_item:
-				msg = _("Please Configure Clinical Procedure Consumable Item in {0}").format(
-					get_link_to_form("Healthcare Settings", "Healthcare Settings")
+				# billable once the Clinical Procedure Consumable Item is set in Healthcare Settings
+				frappe.log_error(
+					title=_("Missing Configuration"),
+					message=_("Please Configure Clinical Procedure Consumable Item in {0}").format(
+						"Healthcare Settings"
+					),
+					reference_doctype="Clinical Procedure",
+					reference_name=procedure.name,
 				)
-
-				frappe.throw(msg, title=_("Missing Configuration"))
+				continue
 
 			clinical_procedures_to_invoice.append(
 				{
@@ -299,32 +494,42 @@ def get_clinical_procedures_to_invoice(patient, company):
 	return clinical_procedures_to_invoice
 
 
-def get_inpatient_services_to_invoice(patient, company):
+def get_inpatient_services_to_invoice(patient, company, lookups=None, names=None):
+	"""`names` restricts the occupancies to those of the given Inpatient Records"""
+	lookups = lookups or BillingLookups()
 	services_to_invoice = []
 	inpatient_services = frappe.db.sql(
 		"""
 			SELECT
-				io.*, ip.scheduled_date
+				io.*, ip.scheduled_date, hsu.service_unit_type
 			FROM
-				`tabInpatient Record` ip, `tabInpatient Occupancy` io
+				`tabInpatient Record` ip
+				INNER JOIN `tabInpatient Occupancy` io ON io.parent=ip.name
+				LEFT JOIN `tabHealthcare Service Unit` hsu ON hsu.name=io.service_unit
 			WHERE
-				ip.patient=%s
-				and ip.company=%s
-				and io.parent=ip.name
+				ip.patient=%(patient)s
+				and ip.company=%(company)s
 				and io.left=1
 				and io.invoiced=0
-			Order By 
+				{names_condition}
+			Order By
 				ip.scheduled_date DESC
-		""",
-		(patient.name, company),
+		""".format(
+			names_condition="and ip.name in %(names)s" if names else ""
+		),
+		{"patient": patient.name, "company": company, "names": tuple(names or [])},
 		as_dict=1,
 	)
+	lookups.load(
+		"Healthcare Service Unit Type",
+		[inpatient_occupancy.service_unit_type for inpatient_occupancy in inpatient_services],
+		["item", "is_billable", "no_of_hours"],
+	)
 
 	for inpatient_occupancy in inpatient_services:
-		service_unit_type = frappe.db.get_value(
-			"Healthcare Service Unit", inpatient_occupancy.service_unit, "service_unit_type"
+		service_unit_type = lookups.get(
+			"Healthcare Service Unit Type", inpatient_occupancy.service_unit_type
 		)
-		service_unit_type = frappe.get_cached_doc("Healthcare Service Unit Type", service_unit_type)
 		if service_unit_type and service_unit_type.is_billable:
 			hours_occupied = flt(
 				time_diff_in_hours(inpatient_occupancy.check_out, inpatient_occupancy.check_in), 2
@@ -353,28 +558,35 @@ def get_inpatient_services_to_invoice(patient, company):
 	return services_to_invoice
 
 
-def get_therapy_plans_to_invoice(patient, company):
+def get_therapy_plans_to_invoice(patient, company, lookups=None, names=None):
+	lookups = lookups or BillingLookups()
 	therapy_plans_to_invoice = []
-	therapy_plans = frappe.get_list(
+	filters = {
+		"patient": patient.name,
+		"invoiced": 0,
+		"company": company,
+		"therapy_plan_template": ("!=", ""),
+		"docstatus": 1,
+	}
+	if names:
+		filters["name"] = ("in", names)
+	therapy_plans = frappe.get_all(
 		"Therapy Plan",
 		fields=["therapy_plan_template", "name", "start_date"],
-		filters={
-			"patient": patient.name,
-			"invoiced": 0,
-			"company": company,
-			"therapy_plan_template": ("!=", ""),
-			"docstatus": 1,
-		},
+		filters=filters,
 		order_by="start_date desc"
 	)
+	lookups.load(
+		"Therapy Plan Template",
+		[plan.therapy_plan_template for plan in therapy_plans],
+		["linked_item"],
+	)
 	for plan in therapy_plans:
 		therapy_plans_to_invoice.append(
 			{
 				"reference_type": "Therapy Plan",
 				"reference_name": plan.name,
-				"service": frappe.db.get_value(
-					"Therapy Plan Template", plan.therapy_plan_template, "linked_item"
-				),
+				"service": lookups.get("Therapy Plan Template", plan.therapy_plan_template).linked_item,
 				"date" : plan.start_date
 			}
 		)
@@ -382,79 +594,78 @@ def get_therapy_plans_to_invoice(patient, company):
 	return therapy_plans_to_invoice
 
 
-def get_therapy_sessions_to_invoice(patient, company):
-	therapy_sessions_to_invoice = []
-	therapy_plans = frappe.db.get_all("Therapy Plan", {"therapy_plan_template": ("!=", "")})
-	therapy_plans_created_from_template = []
-	for entry in therapy_plans:
-		therapy_plans_created_from_template.append(entry.name)
-
-	therapy_sessions = frappe.get_list(
-		"Therapy Session",
-		fields="*",
-		filters={
-			"patient": patient.name,
-			"invoiced": 0,
-			"company": company,
-			"therapy_plan": ("not in", therapy_plans_created_from_template),
-			"docstatus": 1,
-			"service_request": "",
-		},
-		order_by="start_date desc"
+def get_therapy_sessions_to_invoice(patient, company, lookups=None, names=None):
+	"""
+	Return the billable therapy sessions of `patient` with their service item resolved in one query.
+	Sessions of plans created from a template are billed with the plan instead.
+	"""
+	session = frappe.qb.DocType("Therapy Session")
+	therapy_plan = frappe.qb.DocType("Therapy Plan")
+	therapy_type = frappe.qb.DocType("Therapy Type")
+	query = (
+		frappe.qb.from_(session)
+		.inner_join(therapy_type)
+		.on(therapy_type.name == session.therapy_type)
+		.left_join(therapy_plan)
+		.on(
+			(therapy_plan.name == session.therapy_plan)
+			& (Coalesce(therapy_plan.therapy_plan_template, "") != "")
+		)
+		.select(
+			session.name.as_("reference_name"),
+			therapy_type.item.as_("service"),
+			session.start_date.as_("date"),
+		)
+		.where(session.patient == patient.name)
+		.where(session.company == company)
+		.where(session.invoiced == 0)
+		.where(session.docstatus == 1)
+		.where(Coalesce(session.service_request, "") == "")
+		.where(Coalesce(session.appointment, "") == "")
+		.where(therapy_type.is_billable == 1)
+		.where(therapy_plan.name.isnull())
+		.orderby(session.start_date, order=Order.desc)
 	)
-	for therapy in therapy_sessions:
-		if not therapy.appointment:
-			if therapy.therapy_type and frappe.db.get_value(
-				"Therapy Type", therapy.therapy_type, "is_billable"
-			):
-				therapy_sessions_to_invoice.append(
-					{
-						"reference_type": "Therapy Session",
-						"reference_name": therapy.name,
-						"service": frappe.db.get_value("Therapy Type", therapy.therapy_type, "item"),
-						"date" : therapy.start_date
-					}
-				)
+	if names:
+		query = query.where(session.name.isin(names))
 
-	return therapy_sessions_to_invoice
+	return [{"reference_type": "Therapy Session", **row} for row in query.run(as_dict=True)]
 
 
-def get_service_requests_to_invoice(patient, company):
+def get_service_requests_to_invoice(patient, company, lookups=None, names=None):
+	lookups = lookups or BillingLookups()
 	orders_to_invoice = []
-	service_requests = frappe.get_list(
+	filters = {
+		"patient": patient.name,
+		"company": company,
+		"billing_status": ["!=", "Invoiced"],
+		"docstatus": 1,
+	}
+	if names:
+		filters["name"] = ("in", names)
+	service_requests = frappe.get_all(
 		"Service Request",
-		fields=["*"],
-		filters={
-			"patient": patient.name,
-			"company": company,
-			"billing_status": ["!=", "Invoiced"],
-			"docstatus": 1,
-		},
+		fields=["name", "template_dt", "template_dn", "quantity", "order_date"],
+		filters=filters,
 		order_by= "order_date desc"
 	)
+	templates = {}
 	for service_request in service_requests:
-		item, is_billable = frappe.get_cached_value(
-			service_request.template_dt, service_request.template_dn, ["item", "is_billable"]
-		)
-		price_list, price_list_currency = frappe.db.get_values(
-			"Price List", {"selling": 1}, ["name", "currency"]
-		)[0]
-		args = {
-			"doctype": "Sales Invoice",
-			"item_code": item,
-			"company": service_request.get("company"),
-			"customer": frappe.db.get_value("Patient", service_request.get("patient"), "customer"),
-			"plc_conversion_rate": 1.0,
-			"conversion_rate": 1.0,
-		}
-		if is_billable:
+		templates.setdefault(service_request.template_dt, []).append(service_request.template_dn)
+	for template_dt, template_names in templates.items():
+		if template_dt:
+			lookups.load(template_dt, template_names, ["item", "is_billable"])
+
+	for service_request in service_requests:
+		template = lookups.get(service_request.template_dt, service_request.template_dn)
+		if template.is_billable:
 			orders_to_invoice.append(
 				{
 					"reference_type": "Service Request",
 					"reference_name": service_request.name,
-					"service": item,
+					"service": template.item,
 					"qty": service_request.quantity if service_request.quantity else 1,
-					"date": service_request.order_date 
+					"date": service_request.order_date
 				}
 			)
 	return orders_to_invoice
@@ -609,7 +820,7 @@ def manage_invoice_submit_cancel(doc, method):
 
 	if method == "on_submit":
 		if frappe.db.get_single_value("Healthcare Settings", "create_lab_test_on_si_submit"):
-			create_multiple("Sales Invoice", doc.name)
+			create_lab_tests_from_invoice_submit(doc.name)
 
 		if (
 			not frappe.db.get_single_value("Healthcare Settings", "show_payment_popup")
@@ -640,34 +851,42 @@ def manage_invoice_submit_cancel(doc, method):
 					)
 
 def update_therapy_plan(self, method):
-	from healthcare.healthcare.doctype.therapy_plan.therapy_plan import get_invoiced_details
+	"""Add the therapy quantity and amount of the invoice to the invoiced totals of the
+	therapy plans, or take them back on cancel"""
+	from healthcare.healthcare.doctype.therapy_plan.therapy_plan import update_invoiced_totals
+
+	sessions = [
+		row.reference_dn
+		for row in self.items
+		if row.reference_dt == "Therapy Session" and row.reference_dn
+	]
+	session_plans = {}
+	if sessions:
+		session_plans = dict(
+			frappe.get_all(
+				"Therapy Session",
+				filters={"name": ("in", sessions)},
+				fields=["name", "therapy_plan"],
+				as_list=True,
+			)
+		)
+
+	totals = {}
 	for row in self.items:
 		if row.reference_dt == "Therapy Plan":
-			doc = frappe.get_doc(row.reference_dt, row.reference_dn)
-			data = get_invoiced_details(doc)
-			# doc.set_totals()
-			# doc.flags.ignore_permissions = True
-			# doc.save()
-			total_paid_amount = data.get("paid_amount") or data.get("grand_total")
-			no_of_session = data.get("no_of_session") 
-
-			frappe.db.set_value("Therapy Plan", row.reference_dn, "invoiced_amount", total_paid_amount)
-			frappe.db.set_value("Therapy Plan", row.reference_dn, "invoice_json", data.get("data"))
-			frappe.db.set_value("Therapy Plan", row.reference_dn, "total_invoiced_session", no_of_session)
-		if row.reference_dt == "Therapy Session":
-			if therapy_plan := frappe.db.get_value("Therapy Session", row.reference_dn, "therapy_plan"):
-				doc = frappe.get_doc("Therapy Plan", therapy_plan)
-				doc.set_totals()
-				doc.flags.ignore_permissions = True
-				doc.save()
-				data = get_invoiced_details(doc)
-				no_of_session = data.get("no_of_session")
-
-				total_paid_amount = data.get("grand_total")
-				no_of_session = data.get("no_of_session") 
-
-				frappe.db.set_value("Therapy Plan", therapy_plan, "invoice_json", data.get("data"))
-				frappe.db.set_value("Therapy Plan", therapy_plan, "total_invoiced_session", no_of_session)
+			therapy_plan = row.reference_dn
+		elif row.reference_dt == "Therapy Session":
+			therapy_plan = session_plans.get(row.reference_dn)
+		else:
+			continue
+
+		if therapy_plan:
+			qty, amount = totals.get(therapy_plan, (0, 0))
+			totals[therapy_plan] = (qty + flt(row.qty), amount + flt(row.amount))
+
+	sign = -1 if method == "on_cancel" else 1
+	for therapy_plan, (qty, amount) in totals.items():
+		update_invoiced_totals(therapy_plan, sign * qty, sign * amount)
 
 
 def set_invoiced(item, method, ref_invoice=None):
@@ -676,18 +895,25 @@ def set_invoiced(item, method, ref_invoice=None):
 		validate_invoiced_on_submit(item)
 		invoiced = True
 
+	billable_service = None
 	if item.reference_dt == "Clinical Procedure":
 		service_item = frappe.db.get_single_value(
 			"Healthcare Settings", "clinical_procedure_consumable_item"
 		)
 		if service_item == item.item_code:
 			frappe.db.set_value(item.reference_dt, item.reference_dn, "consumption_invoiced", invoiced)
+			billable_service = service_item
 		else:
 			frappe.db.set_value(item.reference_dt, item.reference_dn, "invoiced", invoiced)
+			billable_service = ("!=", service_item or "")
 	else:
 		if item.reference_dt not in ["Service Request", "Medication Request"]:
 			frappe.db.set_value(item.reference_dt, item.reference_dn, "invoiced", invoiced)
 
+	set_billable_item_status(
+		item.reference_dt, item.reference_dn, invoiced, ref_invoice, service=billable_service
+	)
+
 	if item.reference_dt == "Patient Appointment":
 		if frappe.db.get_value("Patient Appointment", item.reference_dn, "procedure_template"):
 			dt_from_appointment = "Clinical Procedure"
@@ -711,6 +937,8 @@ def set_invoiced(item, method, ref_invoice=None):
 			hso.update_invoice_details(item.qty)
 		else:
 			hso.update_invoice_details(item.qty * -1)
+		# partly invoiced orders stay billable
+		update_billable_items(hso)
 
 		# service transaction linking to HSO
 		if item.reference_dt == "Service Request":
@@ -750,6 +978,8 @@ def manage_prescriptions(invoiced, ref_dt, ref_dn, dt, created_check_field):
 		# Fetch the doc created for the prescription
 		doc_created = frappe.db.get_value(dt, {"prescription": ref_dn})
 		frappe.db.set_value(dt, doc_created, "invoiced", invoiced)
+		if doc_created:
+			update_billable_items(frappe.get_doc(dt, doc_created))
 
 
 def manage_doc_for_appointment(dt_from_appointment, appointment, invoiced):
@@ -839,30 +1069,70 @@ def get_children(doctype, parent=None, company=None, is_root=False):
 		fields += [parent_fieldname + " as parent"]
 
 	service_units = frappe.get_list(doctype, fields=fields, filters=filters)
-	for each in service_units:
-		if each["expandable"] != 1 or each["value"].startswith("All Healthcare Service Units"):
-			continue
+	if doctype != "Healthcare Service Unit":
+		return service_units
 
-		available_count = frappe.db.count(
-			"Healthcare Service Unit",
-			filters={"parent_healthcare_service_unit": each["value"], "inpatient_occupancy": 1},
-		)
+	if not is_root:
+		set_bed_details(service_units)
 
+	groups = [
+		each
+		for each in service_units
+		if each["expandable"] == 1 and not each["value"].startswith("All Healthcare Service Units")
+	]
+	occupancy = get_group_occupancy([each["value"] for each in groups]) if groups else {}
+	for each in groups:
+		available_count, occupied_count = occupancy.get(each["value"], (0, 0))
 		if available_count > 0:
-			occupied_count = frappe.db.count(
-				"Healthcare Service Unit",
-				filters={
-					"parent_healthcare_service_unit": each["value"],
-					"inpatient_occupancy": 1,
-					"occupancy_status": "Occupied",
-				},
-			)
-			# set occupancy status of group node
-			each["occupied_of_available"] = f"{str(occupied_count)} Occupied of {str(available_count)}"
+			# set occupancy status of group node, counters are kept current by the bed board deltas
+			each["available"], each["occupied"] = available_count, occupied_count
+			each["occupied_of_available"] = f"{occupied_count} Occupied of {available_count}"
 
 	return service_units
 
 
+def set_bed_details(service_units):
+	"""Set the occupancy and patient of the beds from the bed board, for users who can see them"""
+	from healthcare.healthcare.doctype.healthcare_service_unit.bed_board import get_bed_board
+
+	beds = [each for each in service_units if each.get("inpatient_occupancy")]
+	if not beds or not frappe.has_permission("Inpatient Record"):
+		return
+
+	company = frappe.get_cached_value("Healthcare Service Unit", beds[0]["value"], "company")
+	if not frappe.has_permission("Company", doc=company):
+		return
+
+	board = get_bed_board(company)
+	for each in beds:
+		bed = board.get(each["value"])
+		if bed:
+			each["occupancy_status"] = bed.status
+			each["patient"] = bed.patient
+
+
+def get_group_occupancy(group_units):
+	"""Return {group: (available, occupied)} counting the inpatient beds nested under each group"""
+	group = frappe.qb.DocType("Healthcare Service Unit").as_("group_unit")
+	bed = frappe.qb.DocType("Healthcare Service Unit").as_("bed")
+	rows = (
+		frappe.qb.from_(group)
+		.join(bed)
+		.on((bed.lft > group.lft) & (bed.rgt < group.rgt))
+		.select(
+			group.name,
+			Count(bed.name),
+			Sum(Case().when(bed.occupancy_status == "Occupied", 1).else_(0)),
+		)
+		.where(group.name.isin(group_units))
+		.where(bed.is_group == 0)
+		.where(bed.inpatient_occupancy == 1)
+		.groupby(group.name)
+	).run()
+
+	return {name: (available, cint(occupied)) for name, available, occupied in rows}
+
+
 @frappe.whitelist()
 def get_patient_vitals(patient, from_date=None, to_date=None):
 	if not patient:
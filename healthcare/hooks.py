@@ -130,6 +130,64 @@ doc_events = {
 		"on_submit": "healthcare.healthcare.custom_doctype.payment_entry.set_paid_amount_in_healthcare_docs",
 		"on_cancel": "healthcare.healthcare.custom_doctype.payment_entry.set_paid_amount_in_healthcare_docs",
 	},
+	"Patient Appointment": {
+		"on_update": "healthcare.healthcare.doctype.healthcare_billable_item.healthcare_billable_item.update_billable_items",
+		"on_trash": "healthcare.healthcare.doctype.healthcare_billable_item.healthcare_billable_item.update_billable_items",
+	},
+	"Inpatient Record": {
+		"on_update": "healthcare.healthcare.doctype.healthcare_billable_item.healthcare_billable_item.update_billable_items",
+		"on_trash": "healthcare.healthcare.doctype.healthcare_billable_item.healthcare_billable_item.update_billable_items",
+	},
+	"Therapy Plan": {
+		"on_update": "healthcare.healthcare.doctype.healthcare_billable_item.healthcare_billable_item.update_billable_items",
+		"on_trash": "healthcare.healthcare.doctype.healthcare_billable_item.healthcare_billable_item.update_billable_items",
+	},
+	"Patient Encounter": {
+		"on_submit": "healthcare.healthcare.doctype.healthcare_billable_item.healthcare_billable_item.update_billable_items",
+		"on_cancel": "healthcare.healthcare.doctype.healthcare_billable_item.healthcare_billable_item.update_billable_items",
+		"on_update_after_submit": "healthcare.healthcare.doctype.healthcare_billable_item.healthcare_billable_item.update_billable_items",
+	},
+	"Lab Test": {
+		"on_submit": "healthcare.healthcare.doctype.healthcare_billable_item.healthcare_billable_item.update_billable_items",
+		"on_cancel": "healthcare.healthcare.doctype.healthcare_billable_item.healthcare_billable_item.update_billable_items",
+		"on_update_after_submit": "healthcare.healthcare.doctype.healthcare_billable_item.healthcare_billable_item.update_billable_items",
+	},
+	"Observation": {
+		"on_submit": "healthcare.healthcare.doctype.healthcare_billable_item.healthcare_billable_item.update_billable_items",
+		"on_cancel": "healthcare.healthcare.doctype.healthcare_billable_item.healthcare_billable_item.update_billable_items",
+		"on_update_after_submit": "healthcare.healthcare.doctype.healthcare_billable_item.healthcare_billable_item.update_billable_items",
+	},
+	"Clinical Procedure": {
+		"on_submit": "healthcare.healthcare.doctype.healthcare_billable_item.healthcare_billable_item.update_billable_items",
+		"on_cancel": "healthcare.healthcare.doctype.healthcare_billable_item.healthcare_billable_item.update_billable_items",
+		"on_update_after_submit": "healthcare.healthcare.doctype.healthcare_billable_item.healthcare_billable_item.update_billable_items",
+	},
+	"Therapy Session": {
+		"on_submit": "healthcare.healthcare.doctype.healthcare_billable_item.healthcare_billable_item.update_billable_items",
+		"on_cancel": "healthcare.healthcare.doctype.healthcare_billable_item.healthcare_billable_item.update_billable_items",
+		"on_update_after_submit": "healthcare.healthcare.doctype.healthcare_billable_item.healthcare_billable_item.update_billable_items",
+	},
+	"Service Request": {
+		"on_submit": "healthcare.healthcare.doctype.healthcare_billable_item.healthcare_billable_item.update_billable_items",
+		"on_cancel": "healthcare.healthcare.doctype.healthcare_billable_item.healthcare_billable_item.update_billable_items",
+		"on_update_after_submit": "healthcare.healthcare.doctype.healthcare_billable_item.healthcare_billable_item.update_billable_items",
+	},
+	"Medication": {
+		"on_update": "healthcare.healthcare.doctype.patient_encounter.patient_encounter.clear_medication_search_cache",
+		"on_trash": "healthcare.healthcare.doctype.patient_encounter.patient_encounter.clear_medication_search_cache",
+	},
+	"Item": {
+		"on_update": "healthcare.healthcare.doctype.patient_encounter.patient_encounter.clear_medication_search_cache",
+	},
+	"Stock Ledger Entry": {
+		"on_submit": "healthcare.healthcare.doctype.patient_encounter.patient_encounter.clear_medication_search_cache",
+		"on_cancel": "healthcare.healthcare.doctype.patient_encounter.patient_encounter.clear_medication_search_cache",
+	},
+	"Package Subscription": {
+		"on_submit": "healthcare.healthcare.doctype.healthcare_billable_item.healthcare_billable_item.update_billable_items",
+		"on_cancel": "healthcare.healthcare.doctype.healthcare_billable_item.healthcare_billable_item.update_billable_items",
+		"on_update_after_submit": "healthcare.healthcare.doctype.healthcare_billable_item.healthcare_billable_item.update_billable_items",
+	},
 }
 
 scheduler_events = {
@@ -139,6 +197,8 @@ scheduler_events = {
 	"daily": [
 		"healthcare.healthcare.doctype.patient_appointment.patient_appointment.update_appointment_status",
 		"healthcare.healthcare.doctype.fee_validity.fee_validity.update_validity_status",
+		"healthcare.healthcare.doctype.practitioner_slot_availability.practitioner_slot_availability.delete_expired_slot_index",
+		"healthcare.healthcare.doctype.patient_history_settings.patient_history_settings.reconcile_medical_records",
 	],
 }
 
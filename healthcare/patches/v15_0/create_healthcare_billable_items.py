@@ -0,0 +1,7 @@
+from healthcare.healthcare.doctype.healthcare_billable_item.healthcare_billable_item import (
+	rebuild_billable_items,
+)
+
+
+def execute():
+	rebuild_billable_items()
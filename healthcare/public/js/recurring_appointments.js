@@ -296,8 +296,13 @@ function open_repeat_dialog(doc) {
             setTimeout(() => {
                 frappe.dom.freeze("Creating Appointments...");
                 
+                frappe.realtime.off("recurring_appointments_booked");
+                frappe.realtime.on("recurring_appointments_booked", (message) => {
+                    frappe.realtime.off("recurring_appointments_booked");
+                    show_booking_results(message.results);
+                });
                 frappe.call({
-                    method: "healthcare.healthcare.doctype.patient_appointment.recuring_appointment_handler.create_recurring_appointments",
+                    method: "healthcare.healthcare.doctype.patient_appointment.recuring_appointment_handler.book_appointments",
                     args: { data },
                     callback: function (r) {
                         frappe.dom.unfreeze();
@@ -487,4 +492,23 @@ function validate_data(data){
     if (inputDateTime < now) {
         frappe.throw(`Oops! The selected date and time <b>${data.from_date} ${data.from_time}</b> is in the past. Please pick a future slot.`)
     }
-}
\ No newline at end of file
+}
+
+function show_booking_results(results) {
+    const failed = results.filter(row => row.status == "Failed");
+    const rows = results.map(row => `
+        <tr>
+            <td>${frappe.datetime.str_to_user(row.date)}</td>
+            <td>${__(row.status)}</td>
+            <td>${row.appointment || row.message || ""}</td>
+        </tr>`).join("");
+
+    frappe.msgprint({
+        title: failed.length ? __("Appointments Not Booked") : __("Appointments Booked"),
+        indicator: failed.length ? "red" : "green",
+        message: `<table class="table table-bordered">
+            <thead><tr><th>${__("Date")}</th><th>${__("Status")}</th><th>${__("Details")}</th></tr></thead>
+            <tbody>${rows}</tbody>
+        </table>`,
+    });
+}